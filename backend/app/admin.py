@@ -1,3 +1,9 @@
 from django.contrib import admin
 
+from app.models import City, Topic, Comment, Analysis
+
 # Register your models here.
+admin.site.register(City)
+admin.site.register(Topic)
+admin.site.register(Comment)
+admin.site.register(Analysis)
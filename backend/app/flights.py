@@ -0,0 +1,76 @@
+import os
+import json
+import time
+import hashlib
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from app.models import Flight
+
+# Set SINGLE_FLIGHT_DATABASE=1 when several worker processes serve the API so that
+# identical requests are coalesced across them, not only within each process
+SINGLE_FLIGHT_DATABASE = os.getenv('SINGLE_FLIGHT_DATABASE', '').lower() in ('1', 'true', 'yes')
+
+# A flight not finished after this many seconds is taken over by the next request
+SINGLE_FLIGHT_LEASE = float(os.getenv('SINGLE_FLIGHT_LEASE', 300))
+
+# Seconds between two checks of a flight running in another process
+SINGLE_FLIGHT_POLL_INTERVAL = float(os.getenv('SINGLE_FLIGHT_POLL_INTERVAL', 0.2))
+
+
+def _hash(key):
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class DatabaseFlights:
+    """Shared backend of src.single_flight.SingleFlight keeping one Flight row per key.
+
+    The row is created by the process that runs the request and holds its result once
+    finished, until the next request for the key replaces it.
+    """
+
+    def __init__(self, lease=SINGLE_FLIGHT_LEASE, poll_interval=SINGLE_FLIGHT_POLL_INTERVAL):
+        self.lease = lease
+        self.poll_interval = poll_interval
+
+    def _expired_before(self):
+        return timezone.now() - timedelta(seconds=self.lease)
+
+    # Function to take the key unless another process is running it; finished and
+    # expired flights are replaced
+    def claim(self, key, owner):
+        key = _hash(key)
+        try:
+            with transaction.atomic():
+                (Flight.objects
+                 .filter(key=key)
+                 .filter(Q(finished_at__isnull=False) | Q(started_at__lt=self._expired_before()))
+                 .delete())
+                Flight.objects.create(key=key, owner=owner)
+            return True
+        except IntegrityError:
+            return False
+
+    def finish(self, key, owner, result=None, error=None):
+        (Flight.objects
+         .filter(key=_hash(key), owner=owner)
+         .update(finished_at=timezone.now(),
+                 result=None if error else json.dumps(result, default=str),
+                 error=error or ''))
+
+    # Function to wait for the flight running for key. Returns {"result", "error"} once
+    # it finished, or None when it expired or disappeared and the key should be claimed.
+    def wait(self, key, timeout=None):
+        key = _hash(key)
+        deadline = time.monotonic() + (self.lease if timeout is None else timeout)
+        while time.monotonic() < deadline:
+            flight = Flight.objects.filter(key=key).values('started_at', 'finished_at', 'result', 'error').first()
+            if flight is None or flight['started_at'] < self._expired_before():
+                return None
+            if flight['finished_at'] is not None:
+                return {"result": json.loads(flight['result']) if flight['result'] is not None else None,
+                        "error": flight['error']}
+            time.sleep(self.poll_interval)
+        return None
@@ -0,0 +1,107 @@
+import os
+import json
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+
+# Set RESPONSE_CACHE_ENABLED=1 to keep each fetch-news and fetch-comments response in
+# memory until its max-age runs out, so repeat requests skip the pipeline entirely
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', '').lower() in ('1', 'true', 'yes')
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 256))
+
+
+# Function to compute the strong ETag of a response body; equal data gives equal tags
+def compute_etag(data):
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return quote_etag(hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32])
+
+
+# Function to compute a weak ETag naming a version of a result, e.g. the fingerprint
+# of the input it was made from; responses with the same version share the tag even
+# when incidental fields such as timings differ
+def version_etag(*parts):
+    return "W/" + quote_etag(hashlib.sha256(":".join(parts).encode("utf-8")).hexdigest()[:32])
+
+
+class ResponseCache:
+    """Per-view response cache keyed by the normalized query, with a max-age per entry.
+
+    Each entry keeps the response data with its ETag, computed from the data unless
+    the caller passes a version ETag. When disabled nothing is kept, but set() still
+    returns the entry so the caller can send the headers.
+    """
+
+    def __init__(self, enabled=RESPONSE_CACHE_ENABLED, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires_at"] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, data, max_age, etag=None):
+        entry = {"data": data, "etag": etag or compute_etag(data), "expires_at": time.time() + max(0, max_age)}
+        if self.enabled and max_age > 0:
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+# Function to tell whether the client already holds this version: a GET or HEAD whose
+# If-None-Match lists the ETag (weak comparison, as RFC 9110 specifies for it)
+def client_has(request, etag):
+    if request.method not in ("GET", "HEAD"):
+        return False
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if not header:
+        return False
+    tags = parse_etags(header)
+    return "*" in tags or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
+
+
+def add_cache_headers(response, etag, max_age):
+    response["ETag"] = etag
+    if max_age > 0:
+        patch_cache_control(response, max_age=math.ceil(max_age))
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def not_modified(etag, max_age):
+    return add_cache_headers(HttpResponseNotModified(), etag, max_age)
+
+
+# Function to answer with a cache entry: 304 when the client's copy is current,
+# otherwise respond(data) with the ETag and Cache-Control headers added
+def conditional_response(request, entry, respond):
+    max_age = max(0, entry["expires_at"] - time.time())
+    if client_has(request, entry["etag"]):
+        return not_modified(entry["etag"], max_age)
+    return add_cache_headers(respond(entry["data"]), entry["etag"], max_age)
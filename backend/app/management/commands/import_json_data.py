@@ -0,0 +1,74 @@
+import os
+import json
+from glob import glob
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app import store
+
+DEFAULT_DATA_DIR = os.path.join(settings.BASE_DIR, 'src', 'data')
+
+# Files in the data directory that are not named after a city. Any other file that
+# does not hold a list of titles is skipped as well.
+NON_CITY_FILES = {'topics.json', 'watchlist.json', 'city_subreddits.json'}
+
+
+class Command(BaseCommand):
+    help = "One-off import of the topic, reddit comment and analysis JSON files in src/data into the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="directory written by the batch scripts")
+        parser.add_argument('--default-city', default='unknown',
+                            help="city for topics that are not listed in any data/<city>.json file")
+
+    def handle(self, *args, **options):
+        data_dir = options['data_dir']
+        default_city = options['default_city']
+
+        # data/<city>.json files written by fetch_news_topic.py map topics to cities
+        topic_cities = {}
+        for path in sorted(glob(os.path.join(data_dir, '*.json'))):
+            if os.path.basename(path) in NON_CITY_FILES:
+                continue
+            city_name = os.path.basename(path)[:-len('.json')].replace('_', ' ')
+            titles = self._load(path)
+            if not isinstance(titles, list) or not all(isinstance(title, str) for title in titles):
+                self.stderr.write(f"Skipping {path}: not a list of topics")
+                continue
+            store.save_topics(city_name, titles)
+            for title in titles:
+                topic_cities.setdefault(title, city_name)
+        for path in glob(os.path.join(data_dir, 'topics.json')):
+            for title in self._load(path):
+                topic_cities.setdefault(title, default_city)
+
+        # File names only replace spaces with underscores, so they map back to titles
+        titles_by_file_key = {title.replace(" ", "_"): title for title in topic_cities}
+
+        imported_comments = 0
+        for path in sorted(glob(os.path.join(data_dir, 'reddit', '*_comments.csv'))):
+            comments = self._load(path)
+            key = os.path.basename(path)[:-len('_comments.csv')]
+            title = titles_by_file_key.get(key) or next((c['newsTopic'] for c in comments if c.get('newsTopic')), key.replace('_', ' '))
+            store.save_comments(topic_cities.get(title, default_city), title, comments)
+            imported_comments += len(comments)
+
+        imported_analyses = 0
+        for path in sorted(glob(os.path.join(data_dir, 'analysis', '*_analysis.json'))):
+            analysis = self._load(path)
+            title = analysis.get('topic') or titles_by_file_key.get(os.path.basename(path)[:-len('_analysis.json')])
+            if not title:
+                self.stderr.write(f"Skipping {path}: no topic")
+                continue
+            store.save_analysis(topic_cities.get(title, default_city), title,
+                                analysis.get('summary'), analysis.get('sentiment'), analysis.get('actionable_needs'))
+            imported_analyses += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {len(topic_cities)} topics, {imported_comments} comments and {imported_analyses} analyses"
+        ))
+
+    def _load(self, path):
+        with open(path) as f:
+            return json.load(f)
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app import store
+from src.analyze_gathered_info import ANALYSIS_MODES
+from src.scheduler import set_default_priority, BATCH
+from src.warmer import CityWarmer, UpstreamBudget, load_watchlist, WATCHLIST_FILE, WARM_WORKERS, DEFAULT_WARM_INTERVAL
+
+
+# Function to parse the --budget values, e.g. ["openrouter=40", "reddit=100"]
+def parse_budgets(values):
+    budgets = {}
+    for value in values:
+        upstream, _, limit = value.partition('=')
+        try:
+            budgets[upstream.strip()] = int(limit)
+        except ValueError:
+            raise CommandError(f"Invalid budget '{value}', expected <upstream>=<requests>")
+    return budgets
+
+
+class Command(BaseCommand):
+    help = ("Warm the headlines, reddit comments and analyses of a watchlist of cities, "
+            "once or in a loop refreshing each city when its interval has passed")
+
+    def add_arguments(self, parser):
+        parser.add_argument('cities', nargs='*', help="cities to warm instead of the watchlist")
+        parser.add_argument('--watchlist', default=WATCHLIST_FILE,
+                            help="JSON list of cities, or of {\"city\", \"interval\"} objects")
+        parser.add_argument('--interval', type=float, default=DEFAULT_WARM_INTERVAL,
+                            help="seconds between refreshes of a city that sets no interval")
+        parser.add_argument('--workers', type=int, default=WARM_WORKERS, help="number of topics warmed in parallel")
+        parser.add_argument('--mode', choices=ANALYSIS_MODES, default="concurrent", help="how the three analyses are requested")
+        parser.add_argument('--budget', action='append', default=[], metavar='UPSTREAM=N',
+                            help="most requests granted to an upstream per cycle, e.g. openrouter=40 (repeatable)")
+        parser.add_argument('--loop', action='store_true', help="keep running, refreshing each city when it is due")
+
+    def handle(self, *args, **options):
+        if options['cities']:
+            watchlist = {city: options['interval'] for city in options['cities']}
+        else:
+            try:
+                watchlist = load_watchlist(options['watchlist'], options['interval'])
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                raise CommandError(f"Could not read the watchlist {options['watchlist']}: {e}")
+        if not watchlist:
+            raise CommandError("No cities to warm")
+
+        # Dashboard requests go first when the API runs in the same process
+        set_default_priority(BATCH)
+        warmer = CityWarmer(watchlist, store.save_topics, store.save_topic_report, mode=options['mode'],
+                            max_workers=options['workers'], budget=UpstreamBudget(parse_budgets(options['budget'])))
+
+        if options['loop']:
+            warmer.run_forever(report=self._report)
+        else:
+            for summary in warmer.run_cycle():
+                self._report(summary)
+
+    def _report(self, summary):
+        message = (f"{summary['city']}: {summary['warmed']} of {summary['topics']} topics warmed, "
+                   f"{summary['degraded']} degraded, {summary['skipped']} skipped, {summary['failed']} failed")
+        if summary['failed'] or summary['skipped']:
+            self.stdout.write(self.style.WARNING(message))
+            for error in summary['errors']:
+                self.stderr.write(f"  {error}")
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+        self.stdout.flush()
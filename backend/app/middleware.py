@@ -0,0 +1,46 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from src.metrics import metrics, collect_request_timings, write_timing_log
+
+
+class MetricsMiddleware:
+    """Counts and times every API request by view, and writes the per-request
+    stage timings to the timing log when TIMING_LOG_FILE is set.
+
+    For streaming responses the time is measured until the stream starts. Supports
+    both sync and async chains so that under ASGI the async views stay on the loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with collect_request_timings() as timings:
+            response = self.get_response(request)
+        return self._record(request, response, time.perf_counter() - started, timings)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with collect_request_timings() as timings:
+            response = await self.get_response(request)
+        return self._record(request, response, time.perf_counter() - started, timings)
+
+    def _record(self, request, response, seconds, timings):
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else "unmatched"
+        metrics.inc("http_requests_total", view=view, status=response.status_code)
+        metrics.observe("http_request_duration_seconds", seconds, view=view)
+
+        if timings is not None:
+            write_timing_log({"time": time.time(), "method": request.method, "path": request.path, "view": view,
+                              "status": response.status_code, "seconds": round(seconds, 6), "stages": timings})
+        return response
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='City',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('slug', models.CharField(max_length=200, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Topic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=500)),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='topics', to='app.city')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Comment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('comment_id', models.CharField(blank=True, default='', max_length=20)),
+                ('post_id', models.CharField(blank=True, default='', max_length=20)),
+                ('news_topic', models.CharField(blank=True, default='', max_length=500)),
+                ('subreddit', models.CharField(max_length=100)),
+                ('post_title', models.TextField()),
+                ('body', models.TextField()),
+                ('author', models.CharField(max_length=100)),
+                ('score', models.IntegerField(default=0)),
+                ('post_age_days', models.IntegerField(default=0)),
+                ('comment_age_days', models.IntegerField(default=0)),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='app.topic')),
+            ],
+            options={
+                'ordering': ['-score'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Analysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('summary', models.TextField(blank=True, null=True)),
+                ('sentiment', models.TextField(blank=True, null=True)),
+                ('actionable_needs', models.TextField(blank=True, null=True)),
+                ('mode', models.CharField(blank=True, default='', max_length=20)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('topic', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='analysis', to='app.topic')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['city', 'fetched_at'], name='topic_city_fetched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['title'], name='topic_title_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='topic',
+            constraint=models.UniqueConstraint(fields=('city', 'title'), name='unique_topic_per_city'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['topic', '-score'], name='comment_topic_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analysis',
+            index=models.Index(fields=['updated_at'], name='analysis_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_analysis_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Flight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40, unique=True)),
+                ('owner', models.CharField(max_length=32)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('result', models.TextField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+            ],
+        ),
+    ]
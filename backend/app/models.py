@@ -1,3 +1,110 @@
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
+
+
+class City(models.Model):
+    name = models.CharField(max_length=200)
+    # normalize_city_name(name), shared with the file and cache keys
+    slug = models.CharField(max_length=200, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class Topic(models.Model):
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='topics')
+    title = models.CharField(max_length=500)
+    fetched_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['city', 'title'], name='unique_topic_per_city'),
+        ]
+        indexes = [
+            models.Index(fields=['city', 'fetched_at'], name='topic_city_fetched_idx'),
+            models.Index(fields=['title'], name='topic_title_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class Comment(models.Model):
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='comments')
+    # Reddit ids; blank for comments imported from files that did not record them
+    comment_id = models.CharField(max_length=20, blank=True, default='')
+    post_id = models.CharField(max_length=20, blank=True, default='')
+    news_topic = models.CharField(max_length=500, blank=True, default='')
+    subreddit = models.CharField(max_length=100)
+    post_title = models.TextField()
+    body = models.TextField()
+    author = models.CharField(max_length=100)
+    score = models.IntegerField(default=0)
+    post_age_days = models.IntegerField(default=0)
+    comment_age_days = models.IntegerField(default=0)
+    fetched_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-score']
+        indexes = [
+            models.Index(fields=['topic', '-score'], name='comment_topic_score_idx'),
+        ]
+
+    # Same dict schema as fetch_comments_for_topic returns
+    def to_dict(self):
+        data = {
+            'newsTopic': self.news_topic,
+            'Subreddit': self.subreddit,
+            'PostTitle': self.post_title,
+            'CommentBody': self.body,
+            'Author': self.author,
+            'Score': self.score,
+            'PostAge': self.post_age_days,
+            'CommentAge': self.comment_age_days,
+        }
+        if self.comment_id:
+            data['CommentId'] = self.comment_id
+        if self.post_id:
+            data['PostId'] = self.post_id
+        return data
+
+
+class Analysis(models.Model):
+    topic = models.OneToOneField(Topic, on_delete=models.CASCADE, related_name='analysis')
+    summary = models.TextField(null=True, blank=True)
+    sentiment = models.TextField(null=True, blank=True)
+    actionable_needs = models.TextField(null=True, blank=True)
+    mode = models.CharField(max_length=20, blank=True, default='')
+    # compute_fingerprint() of the comments the analysis was made from
+    fingerprint = models.CharField(max_length=64, blank=True, default='')
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], name='analysis_updated_idx'),
+        ]
+
+    def to_dict(self):
+        return {
+            'topic': self.topic.title,
+            'summary': self.summary,
+            'sentiment': self.sentiment,
+            'actionable_needs': self.actionable_needs,
+            'updated_at': self.updated_at.isoformat(),
+        }
+
+
+# A request being served by one worker process that the other processes wait for,
+# see app.flights.DatabaseFlights
+class Flight(models.Model):
+    # sha1 of the flight name and request key
+    key = models.CharField(max_length=40, unique=True)
+    owner = models.CharField(max_length=32)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # JSON encoded result, or the error message when the request failed
+    result = models.TextField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
@@ -0,0 +1,132 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+
+from app.models import City, Topic, Comment, Analysis
+from src.fetch_news_topic import normalize_city_name, HEADLINES_LIMIT
+from src.analyze_gathered_info import analysis_fingerprint
+
+# Read and write helpers used by the views, the batch scripts and the importer so
+# pipeline results live in the database instead of flat files.
+
+
+def get_or_create_city(city_name):
+    city, _ = City.objects.get_or_create(slug=normalize_city_name(city_name), defaults={'name': city_name.strip()})
+    return city
+
+
+# Topics first stored with their comments or analysis were never part of a headline
+# fetch, so they are dated before every batch that save_topics writes
+NOT_FETCHED = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def get_or_create_topic(city_name, title):
+    topic, _ = Topic.objects.get_or_create(city=get_or_create_city(city_name), title=title,
+                                           defaults={'fetched_at': NOT_FETCHED})
+    return topic
+
+
+# Upserts the city's headlines, refreshing fetched_at for the ones already stored
+def save_topics(city_name, titles):
+    city = get_or_create_city(city_name)
+    now = timezone.now()
+    Topic.objects.bulk_create(
+        [Topic(city=city, title=title, fetched_at=now) for title in dict.fromkeys(titles)],
+        update_conflicts=True,
+        unique_fields=['city', 'title'],
+        update_fields=['fetched_at'],
+    )
+
+
+# Returns the city's latest headline batch: the topics saved with the newest fetched_at
+def load_topics(city_name, limit=HEADLINES_LIMIT):
+    topics = Topic.objects.filter(city__slug=normalize_city_name(city_name))
+    latest = topics.order_by('-fetched_at').values_list('fetched_at', flat=True).first()
+    if latest is None:
+        return []
+    return list(topics.filter(fetched_at=latest).order_by('id').values_list('title', flat=True)[:limit])
+
+
+def _comment_from_dict(topic, comment, fetched_at):
+    return Comment(
+        topic=topic,
+        comment_id=comment.get('CommentId', ''),
+        post_id=comment.get('PostId', ''),
+        news_topic=comment.get('newsTopic', ''),
+        subreddit=comment.get('Subreddit', ''),
+        post_title=comment.get('PostTitle', ''),
+        body=comment.get('CommentBody', ''),
+        author=comment.get('Author', 'Unknown'),
+        score=comment.get('Score', 0),
+        post_age_days=comment.get('PostAge', 0),
+        comment_age_days=comment.get('CommentAge', 0),
+        fetched_at=fetched_at,
+    )
+
+
+# Replaces the stored comment set of a topic with `comments` in one bulk insert
+def save_comments(city_name, title, comments):
+    now = timezone.now()
+    with transaction.atomic():
+        topic = get_or_create_topic(city_name, title)
+        topic.comments.all().delete()
+        Comment.objects.bulk_create([_comment_from_dict(topic, comment, now) for comment in comments])
+    return topic
+
+
+def load_comments(city_name, title):
+    return [comment.to_dict() for comment in
+            Comment.objects.filter(topic__city__slug=normalize_city_name(city_name), topic__title=title)]
+
+
+def save_analysis(city_name, title, summary, sentiment, actionable_needs, mode='', fingerprint=''):
+    topic = get_or_create_topic(city_name, title)
+    analysis, _ = Analysis.objects.update_or_create(
+        topic=topic,
+        defaults={
+            'summary': summary,
+            'sentiment': sentiment,
+            'actionable_needs': actionable_needs,
+            'mode': mode,
+            'fingerprint': fingerprint,
+            'updated_at': timezone.now(),
+        },
+    )
+    return analysis
+
+
+def load_analysis_fingerprint(city_name, title):
+    return (Analysis.objects
+            .filter(topic__city__slug=normalize_city_name(city_name), topic__title=title)
+            .values_list('fingerprint', flat=True)
+            .first()) or None
+
+
+# Fingerprint, mode and fields of the analysis stored for a topic, or None; the
+# fingerprint is empty for analyses with locally computed fields
+def load_analysis_version(city_name, title):
+    return (Analysis.objects
+            .filter(topic__city__slug=normalize_city_name(city_name), topic__title=title)
+            .values('fingerprint', 'mode', 'summary', 'sentiment', 'actionable_needs')
+            .first())
+
+
+# Stores the payload returned by run_topic_pipeline. Reports with locally computed
+# (degraded) fields are stored without a fingerprint so the batch analysis redoes them.
+def save_topic_report(city_name, title, report, mode=''):
+    comments = report.get('comments') or []
+    fingerprint = analysis_fingerprint(comments, report.get('summary'), report.get('sentiment'),
+                                       report.get('actionable_needs'), report.get('degraded'))
+    with transaction.atomic():
+        save_comments(city_name, title, comments)
+        save_analysis(city_name, title, report.get('summary'), report.get('sentiment'), report.get('actionable_needs'),
+                      mode, fingerprint)
+
+
+def recent_analyses(city_name, limit=20):
+    analyses = (Analysis.objects
+                .filter(topic__city__slug=normalize_city_name(city_name))
+                .select_related('topic')
+                .order_by('-updated_at')[:limit])
+    return [analysis.to_dict() for analysis in analyses]
@@ -1,3 +1,520 @@
+import os
+import json
+import tempfile
+from io import StringIO
+from unittest.mock import patch, AsyncMock
+from django.core.management import call_command, CommandError
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse
 from django.test import TestCase
 
-# Create your tests here.
+from app import store
+from app.flights import DatabaseFlights
+from app.http_cache import ResponseCache
+from app.middleware import MetricsMiddleware
+from app.models import City, Topic, Comment, Analysis
+from src.ingestion_state import IngestionStore
+from src.analyze_gathered_info import analyze_topic, compute_fingerprint, RECOMPUTED, SKIPPED, MISSING
+
+
+class FetchNewsAsyncViewTests(TestCase):
+
+    def test_city_required(self):
+        response = self.client.get('/async/fetch-news/')
+        self.assertEqual(response.status_code, 400)
+
+    @patch('app.views.afetch_top_news_topic_cached', new_callable=AsyncMock, return_value=['Headline 1'])
+    def test_returns_top_news(self, mock_fetch):
+        response = self.client.get('/async/fetch-news/', {'city': 'Kathmandu'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"top_news": ['Headline 1']})
+        mock_fetch.assert_awaited_once_with('Kathmandu')
+
+
+class FetchCommentsAsyncViewTests(TestCase):
+
+    def post(self, payload):
+        return self.client.post('/async/fetch-comments/', data=json.dumps(payload), content_type='application/json')
+
+    def test_topic_and_mode_validated(self):
+        self.assertEqual(self.post({'city': 'Kathmandu'}).status_code, 400)
+        self.assertEqual(self.post({'topic': 'T', 'city': 'Kathmandu', 'mode': 'bogus'}).status_code, 400)
+
+    @patch('app.views.agetAnalyzedReport', new_callable=AsyncMock, return_value=("Summary", "Positive", "Needs"))
+    @patch('app.views.afetch_comments_for_topic', new_callable=AsyncMock)
+    def test_returns_comments_and_analysis(self, mock_fetch_comments, mock_report):
+        mock_fetch_comments.return_value = [{'newsTopic': 'T', 'PostTitle': 'P', 'CommentBody': 'C', 'Score': 1}]
+
+        response = self.post({'topic': 'T', 'city': 'Kathmandu'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['summary'], "Summary")
+        self.assertEqual(response.json()['comments'][0]['CommentBody'], 'C')
+        # Same schema as the sync view, which shares its cached responses
+        self.assertEqual(set(response.json()), {"comments", "summary", "sentiment", "local_sentiment", "actionable_needs",
+                                                "degraded", "compaction", "sources"})
+        self.assertIn("sources", mock_fetch_comments.await_args.kwargs)
+        mock_report.assert_awaited_once()
+
+
+class FetchCommentsJobTests(TestCase):
+
+    @patch('app.views.job_queue')
+    def test_background_request_returns_job_id(self, mock_queue):
+        mock_queue.submit.return_value = {"id": "abc", "status": "queued"}
+
+        response = self.client.post('/fetch-comments/', data=json.dumps({'topic': 'T', 'city': 'Kathmandu', 'background': True}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {"job_id": "abc", "status": "queued"})
+        mock_queue.submit.assert_called_once_with('T', 'Kathmandu', 'concurrent')
+
+    @patch('app.views.job_queue')
+    def test_job_status(self, mock_queue):
+        mock_queue.get.side_effect = lambda job_id: {"id": job_id, "status": "succeeded"} if job_id == "abc" else None
+
+        self.assertEqual(self.client.get('/jobs/abc/').json()["status"], "succeeded")
+        self.assertEqual(self.client.get('/jobs/missing/').status_code, 404)
+
+
+class FetchCommentsStreamTests(TestCase):
+
+    @patch('app.views.stream_analyzed_report')
+    @patch('app.views.fetch_comments_for_topic')
+    def test_events_streamed_in_order(self, mock_fetch_comments, mock_stream_report):
+        mock_fetch_comments.return_value = [{'newsTopic': 'T', 'PostTitle': 'P', 'CommentBody': 'C', 'Score': 1}]
+        mock_stream_report.return_value = iter([
+            ("token", {"field": "summary", "text": "S"}),
+            ("summary", {"field": "summary", "value": "S"}),
+        ])
+
+        response = self.client.get('/stream/fetch-comments/', {'topic': 'T', 'city': 'Kathmandu'})
+        body = b"".join(response.streaming_content).decode()
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = [line.split(": ", 1)[1] for line in body.splitlines() if line.startswith("event: ")]
+        self.assertEqual(events, ["comments", "compaction", "token", "summary", "done"])
+
+    def test_topic_required(self):
+        self.assertEqual(self.client.get('/stream/fetch-comments/', {'city': 'Kathmandu'}).status_code, 400)
+
+
+class CityReportViewTests(TestCase):
+
+    def test_city_required(self):
+        self.assertEqual(self.client.get('/city-report/').status_code, 400)
+
+    @patch('app.views.run_city_report')
+    def test_returns_report(self, mock_report):
+        mock_report.return_value = {"city": "Kathmandu", "top_news": [], "topics": [], "timings": {}}
+
+        response = self.client.get('/city-report/', {'city': 'Kathmandu', 'mode': 'fused'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["city"], "Kathmandu")
+        mock_report.assert_called_once_with('Kathmandu', mode='fused')
+
+
+class MetricsTests(TestCase):
+
+    def test_requests_counted_in_prometheus_output(self):
+        self.client.get('/health')
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('http_requests_total{status="200",view="health-check"}', response.content.decode())
+
+    @patch('app.views.fetch_top_news_topic_cached', return_value=['Headline 1'])
+    def test_timing_log_written_per_request(self, mock_fetch):
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_file = os.path.join(log_dir, 'timings.jsonl')
+            with patch('src.metrics.TIMING_LOG_FILE', log_file):
+                self.client.get('/fetch-news/', {'city': 'Kathmandu'})
+            with open(log_file) as f:
+                entry = json.loads(f.readline())
+
+        self.assertEqual(entry['view'], 'fetch_news')
+        self.assertEqual(entry['status'], 200)
+        self.assertEqual(entry['stages'], [])
+
+
+    def test_middleware_keeps_async_chains_async(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(MetricsMiddleware(get_response)))
+        self.assertFalse(iscoroutinefunction(MetricsMiddleware(lambda request: HttpResponse())))
+
+    @patch('app.views.afetch_top_news_topic_cached', new_callable=AsyncMock, return_value=['Headline 1'])
+    async def test_async_requests_counted(self, mock_fetch):
+        await self.async_client.get('/async/fetch-news/', {'city': 'Kathmandu'})
+
+        response = await self.async_client.get('/metrics')
+        self.assertIn('http_requests_total{status="200",view="fetch_news_async"}', response.content.decode())
+
+
+class SchedulerStatusViewTests(TestCase):
+
+    def test_reports_every_upstream(self):
+        response = self.client.get('/scheduler/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['upstreams']), {"openrouter", "reddit", "newsapi"})
+        self.assertIn("queued", response.json()['upstreams']['reddit'])
+
+
+class StoreTests(TestCase):
+
+    def comment(self, body, score):
+        return {'newsTopic': 'T', 'Subreddit': 'r/Nepal', 'PostTitle': 'P', 'CommentBody': body,
+                'Author': 'A', 'Score': score, 'PostAge': 1, 'CommentAge': 1}
+
+    def test_topics_upserted_per_normalized_city(self):
+        store.save_topics('Kathmandu', ['Headline 1', 'Headline 2'])
+        store.save_topics('kathmandu ', ['Headline 2', 'Headline 3'])
+
+        self.assertEqual(City.objects.count(), 1)
+        self.assertEqual(Topic.objects.count(), 3)
+        self.assertEqual(sorted(store.load_topics('Kathmandu')), ['Headline 2', 'Headline 3'])
+
+    def test_only_latest_headline_batch_loaded(self):
+        store.save_topics('Kathmandu', [f'Old {i}' for i in range(3)])
+        store.save_topics('Kathmandu', [f'New {i}' for i in range(7)])
+        store.save_comments('Kathmandu', 'Old 1', [self.comment('c', 1)])
+        store.save_comments('Kathmandu', 'Asked about', [self.comment('c', 1)])
+
+        self.assertEqual(store.load_topics('Kathmandu'), [f'New {i}' for i in range(5)])
+        self.assertEqual(store.load_topics('Pokhara'), [])
+
+    def test_comments_replaced_and_ordered_by_score(self):
+        store.save_comments('Kathmandu', 'T', [self.comment('old', 1)])
+        store.save_comments('Kathmandu', 'T', [self.comment('low', 2), self.comment('high', 9)])
+
+        comments = store.load_comments('Kathmandu', 'T')
+        self.assertEqual([c['CommentBody'] for c in comments], ['high', 'low'])
+        self.assertEqual(comments[0]['Score'], 9)
+
+    def test_incomplete_report_saved_without_fingerprint(self):
+        comments = [self.comment('c', 1)]
+        store.save_topic_report('Kathmandu', 'T1', {'comments': comments, 'summary': 'S', 'sentiment': None,
+                                                     'actionable_needs': 'N', 'degraded': []})
+        store.save_topic_report('Kathmandu', 'T2', {'comments': comments, 'summary': 'S', 'sentiment': 'P',
+                                                     'actionable_needs': 'N', 'degraded': []})
+
+        self.assertIsNone(store.load_analysis_fingerprint('Kathmandu', 'T1'))
+        self.assertEqual(store.load_analysis_fingerprint('Kathmandu', 'T2'), compute_fingerprint(comments))
+
+    def test_recent_analyses_for_city(self):
+        store.save_topic_report('Kathmandu', 'T1', {'comments': [], 'summary': 'S1', 'sentiment': 'P', 'actionable_needs': 'N'})
+        store.save_topic_report('Kathmandu', 'T2', {'comments': [], 'summary': 'S2', 'sentiment': 'P', 'actionable_needs': 'N'})
+        store.save_analysis('Kathmandu', 'T1', 'S1 updated', 'P', 'N')
+        store.save_analysis('Pokhara', 'T3', 'S3', 'P', 'N')
+
+        response = self.client.get('/analyses/', {'city': 'Kathmandu'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([a['summary'] for a in response.json()['analyses']], ['S1 updated', 'S2'])
+        self.assertEqual(Analysis.objects.count(), 3)
+
+
+class ImportJsonDataTests(TestCase):
+
+    def test_imports_existing_files(self):
+        call_command('import_json_data', stdout=StringIO())
+
+        kathmandu = store.load_topics('kathmandu')
+        self.assertEqual(len(kathmandu), 5)
+        self.assertEqual(len(store.load_comments('kathmandu', kathmandu[0])), 5)
+        self.assertEqual(Analysis.objects.count(), 10)
+        self.assertTrue(Topic.objects.filter(city__slug='unknown', title='Can Google Make Stoplights Smarter?').exists())
+
+        # Importing again does not duplicate anything
+        call_command('import_json_data', stdout=StringIO())
+        self.assertEqual(Analysis.objects.count(), 10)
+        self.assertEqual(Comment.objects.count(), 47)
+
+    def test_skips_files_that_are_not_topic_lists(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            for name, content in [('pokhara.json', ['Headline 1']), ('settings.json', {'pokhara': ['r/Nepal']}),
+                                  ('cities.json', [{'city': 'Pokhara'}])]:
+                with open(os.path.join(data_dir, name), 'w') as f:
+                    json.dump(content, f)
+            err = StringIO()
+            call_command('import_json_data', data_dir=data_dir, stdout=StringIO(), stderr=err)
+
+        self.assertEqual(list(City.objects.values_list('slug', flat=True)), ['pokhara'])
+        self.assertEqual(err.getvalue().count('not a list of topics'), 2)
+
+
+class WarmCitiesTests(TestCase):
+
+    @patch('src.warmer.run_topic_pipeline')
+    @patch('src.warmer.fetch_top_news_topic_cached', return_value=['Road A', 'Road B'])
+    def test_warms_watchlist_into_store(self, mock_fetch_news, mock_pipeline):
+        comments = [{'newsTopic': 'Road A', 'PostTitle': 'P', 'CommentBody': 'C', 'Score': 1}]
+        mock_pipeline.return_value = {'comments': comments, 'summary': 'S', 'sentiment': 'P',
+                                      'actionable_needs': 'N', 'degraded': []}
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump([{'city': 'Kathmandu', 'interval': 600}], f)
+        self.addCleanup(os.remove, f.name)
+
+        out = StringIO()
+        call_command('warm_cities', watchlist=f.name, budget=['openrouter=100'], stdout=out)
+
+        self.assertIn('Kathmandu: 2 of 2 topics warmed', out.getvalue())
+        self.assertEqual(sorted(store.load_topics('kathmandu')), ['Road A', 'Road B'])
+        self.assertEqual(store.load_analysis_fingerprint('Kathmandu', 'Road B'), compute_fingerprint(comments))
+
+    def test_rejects_invalid_budget(self):
+        with self.assertRaises(CommandError):
+            call_command('warm_cities', 'Kathmandu', budget=['openrouter'], stdout=StringIO())
+
+
+class AnalysisFingerprintTests(TestCase):
+
+    def test_fingerprint_stored_with_report(self):
+        comments = [{'newsTopic': 'T', 'PostTitle': 'P', 'CommentBody': 'C', 'Score': 1}]
+        store.save_topic_report('Kathmandu', 'T', {'comments': comments, 'summary': 'S', 'sentiment': 'P', 'actionable_needs': 'N'})
+
+        self.assertEqual(store.load_analysis_fingerprint('Kathmandu', 'T'), compute_fingerprint(comments))
+        self.assertIsNone(store.load_analysis_fingerprint('Kathmandu', 'Other'))
+
+    def test_degraded_report_stored_without_fingerprint(self):
+        comments = [{'newsTopic': 'T', 'PostTitle': 'P', 'CommentBody': 'C', 'Score': 1}]
+        store.save_topic_report('Kathmandu', 'T', {'comments': comments, 'summary': 'S', 'sentiment': 'P',
+                                                   'actionable_needs': 'N', 'degraded': ['summary']})
+
+        self.assertIsNone(store.load_analysis_fingerprint('Kathmandu', 'T'))
+
+
+class BatchAnalysisTests(TestCase):
+
+    comments = [
+        {'newsTopic': 'T', 'PostTitle': 'P', 'CommentBody': 'First comment', 'Score': 2, 'CommentId': 'c1'},
+        {'newsTopic': 'T', 'PostTitle': 'P', 'CommentBody': 'Second comment', 'Score': 1, 'CommentId': 'c2'},
+    ]
+
+    def setUp(self):
+        store.save_comments('Kathmandu', 'Topic A', self.comments)
+
+    @patch('src.analyze_gathered_info.getAnalyzedReport', return_value=("Summary", "Positive", "Needs"))
+    def test_unchanged_topics_skipped(self, mock_report):
+        self.assertEqual(analyze_topic('Topic A', 'Kathmandu'), RECOMPUTED)
+        self.assertEqual(analyze_topic('Topic A', 'Kathmandu'), SKIPPED)
+        mock_report.assert_called_once()
+
+        # New activity or --force recomputes
+        store.save_comments('Kathmandu', 'Topic A', self.comments + [
+            {'newsTopic': 'T', 'PostTitle': 'P', 'CommentBody': 'New comment', 'Score': 5, 'CommentId': 'c3'}])
+        self.assertEqual(analyze_topic('Topic A', 'Kathmandu'), RECOMPUTED)
+        self.assertEqual(analyze_topic('Topic A', 'Kathmandu', force=True), RECOMPUTED)
+        self.assertEqual(mock_report.call_count, 3)
+        self.assertEqual(Analysis.objects.get(topic__title='Topic A').summary, "Summary")
+
+    @patch('src.analyze_gathered_info.getAnalyzedReport')
+    def test_incomplete_analysis_recomputed_next_run(self, mock_report):
+        def failed_summary(discussions, mode, local_sentiment, degraded):
+            return None, "Positive", "Needs"
+        mock_report.side_effect = failed_summary
+        self.assertEqual(analyze_topic('Topic A', 'Kathmandu'), RECOMPUTED)
+
+        def local_sentiment_used(discussions, mode, local_sentiment, degraded):
+            degraded.append("sentiment")
+            return "Summary", "Mixed. Local estimate", "Needs"
+        mock_report.side_effect = local_sentiment_used
+        self.assertEqual(analyze_topic('Topic A', 'Kathmandu'), RECOMPUTED)
+
+        mock_report.side_effect = None
+        mock_report.return_value = ("Summary", "Positive", "Needs")
+        self.assertEqual(analyze_topic('Topic A', 'Kathmandu'), RECOMPUTED)
+        self.assertEqual(analyze_topic('Topic A', 'Kathmandu'), SKIPPED)
+        self.assertEqual(mock_report.call_count, 3)
+
+    def test_missing_comments(self):
+        self.assertEqual(analyze_topic('Topic B', 'Kathmandu'), MISSING)
+
+
+class DatabaseFlightsTests(TestCase):
+
+    def test_claim_wait_and_finish(self):
+        flights = DatabaseFlights(lease=60, poll_interval=0.01)
+
+        self.assertTrue(flights.claim("fetch_news:'kathmandu'", "first"))
+        self.assertFalse(flights.claim("fetch_news:'kathmandu'", "second"))
+        self.assertIsNone(flights.wait("fetch_news:'kathmandu'", timeout=0.05))
+
+        flights.finish("fetch_news:'kathmandu'", "first", result=["Headline"])
+        self.assertEqual(flights.wait("fetch_news:'kathmandu'"), {"result": ["Headline"], "error": ""})
+        # A finished flight is replaced by the next request
+        self.assertTrue(flights.claim("fetch_news:'kathmandu'", "second"))
+
+    def test_expired_flight_taken_over(self):
+        flights = DatabaseFlights(lease=0, poll_interval=0.01)
+
+        self.assertTrue(flights.claim("key", "crashed"))
+        self.assertIsNone(flights.wait("key", timeout=1))
+        self.assertTrue(flights.claim("key", "next"))
+
+
+class SingleFlightViewTests(TestCase):
+
+    @patch('app.views.run_and_store_topic', return_value={"summary": "S"})
+    def test_fan_in_counts_reported(self, mock_run):
+        self.client.post('/fetch-comments/', data=json.dumps({'topic': 'T', 'city': 'Kathmandu'}), content_type='application/json')
+
+        flights = self.client.get('/single-flight/').json()["flights"]
+        self.assertEqual(set(flights), {"fetch_news", "fetch_comments"})
+        self.assertGreaterEqual(flights["fetch_comments"]["leader"], 1)
+        mock_run.assert_called_once_with('T', 'Kathmandu', 'concurrent')
+
+
+@patch('app.views.news_max_age', return_value=600)
+@patch('app.views.fetch_top_news_topic_cached', return_value=['Headline 1', 'Headline 2'])
+class ResponseCachingTests(TestCase):
+
+    def test_etag_and_not_modified(self, mock_fetch, mock_max_age):
+        response = self.client.get('/fetch-news/', {'city': 'Kathmandu'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'max-age=600')
+        etag = response['ETag']
+
+        repeat = self.client.get('/fetch-news/', {'city': 'Kathmandu'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat.content, b'')
+        self.assertEqual(repeat['ETag'], etag)
+
+        mock_fetch.return_value = ['Headline 3']
+        changed = self.client.get('/fetch-news/', {'city': 'Kathmandu'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_server_side_cache_keyed_by_normalized_city(self, mock_fetch, mock_max_age):
+        with patch('app.views.response_cache', ResponseCache(enabled=True)):
+            first = self.client.get('/fetch-news/', {'city': 'Kathmandu'})
+            second = self.client.get('/fetch-news/', {'city': ' kathmandu '})
+
+        self.assertEqual(mock_fetch.call_count, 1)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    @patch('app.views.comments_max_age', return_value=300)
+    @patch('app.views.run_and_store_topic')
+    def test_comments_get_and_degraded_responses(self, mock_run, mock_comments_max_age, mock_fetch, mock_max_age):
+        mock_run.return_value = {"summary": "S", "degraded": []}
+        with patch('app.views.response_cache', ResponseCache(enabled=True)):
+            response = self.client.get('/fetch-comments/', {'topic': 'T', 'city': 'Kathmandu'})
+            cached = self.client.post('/fetch-comments/', data=json.dumps({'topic': 'T ', 'city': 'KATHMANDU'}),
+                                      content_type='application/json', HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'max-age=300')
+        # POSTs are never answered with 304
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(mock_run.call_count, 1)
+
+        mock_comments_max_age.return_value = 0
+        degraded = self.client.get('/fetch-comments/', {'topic': 'T', 'city': 'Kathmandu'})
+        self.assertEqual(degraded['Cache-Control'], 'no-cache')
+
+
+class StoredVersionETagTests(TestCase):
+
+    def setUp(self):
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        self.ingestion = IngestionStore(state_dir.name)
+        patcher = patch('app.views.get_ingestion_store', return_value=self.ingestion)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.comments = [{'newsTopic': 'T', 'PostTitle': 'P', 'CommentBody': 'C', 'Score': 1, 'CommentId': 'c1'}]
+
+    # Stands in for the pipeline: the ingestion state serves self.comments, fetched now
+    def run_and_store(self, topic, city, mode):
+        state = self.ingestion.load(topic, city)
+        state.comments = []
+        state.merge(self.comments)
+        self.ingestion.save(state)
+        data = {"comments": state.top(5), "summary": "S", "sentiment": "P", "actionable_needs": "N", "degraded": []}
+        store.save_topic_report(city, topic, data, mode)
+        return data
+
+    def expire_state(self):
+        state = self.ingestion.load('T', 'Kathmandu')
+        state.last_fetched -= 24 * 3600
+        self.ingestion.save(state)
+
+    @patch('app.views.run_and_store_topic')
+    def test_poll_answered_from_stored_analysis(self, mock_run):
+        mock_run.side_effect = self.run_and_store
+        response = self.client.get('/fetch-comments/', {'topic': 'T', 'city': 'Kathmandu'})
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+
+        repeat = self.client.get('/fetch-comments/', {'topic': 'T', 'city': 'Kathmandu'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat['ETag'], etag)
+        self.assertEqual(mock_run.call_count, 1)
+
+        # Another mode, or comments due for a refresh, run the pipeline again
+        self.client.get('/fetch-comments/', {'topic': 'T', 'city': 'Kathmandu', 'mode': 'fused'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(mock_run.call_count, 2)
+        self.expire_state()
+        refreshed = self.client.get('/fetch-comments/', {'topic': 'T', 'city': 'Kathmandu'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(mock_run.call_count, 3)
+        # Same comments and analysis, same version
+        self.assertEqual(refreshed.status_code, 304)
+
+    @patch('app.views.run_and_store_topic')
+    def test_poll_runs_pipeline_when_stored_comments_changed(self, mock_run):
+        mock_run.side_effect = self.run_and_store
+        etag = self.client.get('/fetch-comments/', {'topic': 'T', 'city': 'Kathmandu'})['ETag']
+
+        # The ingestion state now serves other comments than the analysis was made from
+        state = self.ingestion.load('T', 'Kathmandu')
+        state.merge([{'CommentId': 'c2', 'CommentBody': 'New', 'Score': 9}])
+        self.ingestion.save(state)
+        self.comments.append({'newsTopic': 'T', 'PostTitle': 'P', 'CommentBody': 'New', 'Score': 9, 'CommentId': 'c2'})
+
+        changed = self.client.get('/fetch-comments/', {'topic': 'T', 'city': 'Kathmandu'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(mock_run.call_count, 2)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    @patch('app.views.run_and_store_topic')
+    def test_new_analysis_of_same_comments_gets_new_tag(self, mock_run):
+        mock_run.side_effect = self.run_and_store
+        etag = self.client.get('/fetch-comments/', {'topic': 'T', 'city': 'Kathmandu'})['ETag']
+
+        store.save_analysis('Kathmandu', 'T', 'Other summary', 'P', 'N', 'concurrent',
+                            store.load_analysis_fingerprint('Kathmandu', 'T'))
+        mock_run.side_effect = lambda topic, city, mode: dict(self.run_and_store(topic, city, mode), summary='Other summary')
+
+        self.assertEqual(self.client.get('/fetch-comments/', {'topic': 'T', 'city': 'Kathmandu'},
+                                         HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ResponseCacheTests(TestCase):
+
+    def test_entries_expire_and_are_evicted(self):
+        cache = ResponseCache(enabled=True, max_entries=2)
+
+        cache.set('a', {'n': 1}, 60)
+        cache.set('stale', {'n': 2}, 0)
+        cache.set('b', {'n': 3}, 60)
+        cache.get('a')
+        cache.set('c', {'n': 4}, 60)
+
+        self.assertIsNone(cache.get('stale'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a')['data'], {'n': 1})
+        self.assertEqual(cache.set('x', {'n': 1}, 60)['etag'], cache.get('a')['etag'])
+
+    def test_disabled_cache_keeps_nothing(self):
+        cache = ResponseCache(enabled=False)
+
+        self.assertTrue(cache.set('a', {'n': 1}, 60)['etag'].startswith('"'))
+        self.assertIsNone(cache.get('a'))
@@ -3,6 +3,16 @@ from app import views
 
 urlpatterns = [
     path('health',views.health_check, name="health-check"),
+    path('metrics', views.prometheus_metrics, name='metrics'),
     path('fetch-news/', views.fetch_news, name='fetch_news'),
     path('fetch-comments/', views.fetch_comments, name='fetch_comments'),
+    path('analyses/', views.recent_analyses, name='recent_analyses'),
+    path('city-report/', views.city_report, name='city_report'),
+    path('subreddit-report/', views.subreddit_report, name='subreddit_report'),
+    path('scheduler/', views.scheduler_status, name='scheduler_status'),
+    path('single-flight/', views.single_flight_status, name='single_flight_status'),
+    path('stream/fetch-comments/', views.fetch_comments_stream, name='fetch_comments_stream'),
+    path('jobs/<str:job_id>/', views.job_status, name='job_status'),
+    path('async/fetch-news/', views.fetch_news_async, name='fetch_news_async'),
+    path('async/fetch-comments/', views.fetch_comments_async, name='fetch_comments_async'),
 ]
@@ -2,17 +2,111 @@ from django.shortcuts import render
 
 # Create your views here.
 
+import json
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from src.fetch_news_topic import fetch_top_news_topic
-from src.fetch_reddit_discussion import fetch_comments_for_topic
-from src.analyze_gathered_info import getAnalyzedReport
+from src.fetch_news_topic import fetch_top_news_topic_cached, afetch_top_news_topic_cached, normalize_city_name, get_news_cache
+from src.fetch_reddit_discussion import fetch_comments_for_topic, afetch_comments_for_topic, subreddit_stats, COMMENTS_LIMIT
+from src.analyze_gathered_info import agetAnalyzedReport, stream_analyzed_report, compute_fingerprint, analysis_fingerprint, ANALYSIS_MODES, ANALYSIS_SLO
+from src.compaction import compact_discussions
+from src.local_sentiment import score_discussion
+from src.pipeline import run_topic_pipeline, run_city_report
+from src.job_queue import JobQueue
+from src.scheduler import get_scheduler
+from src.metrics import metrics
+from src.single_flight import SingleFlight
+from src.ingestion_state import get_ingestion_store
+from app import store
+from app.flights import DatabaseFlights, SINGLE_FLIGHT_DATABASE
+from app.http_cache import response_cache, conditional_response, client_has, not_modified, version_etag
+
+# Function to run the pipeline for one headline and store the result
+def run_and_store_topic(topic, city, mode):
+    data = run_topic_pipeline(topic, city, mode)
+    store.save_topic_report(city, topic, data, mode)
+    return data
+
+# Background jobs for fetch-comments requests sent with "background": true
+job_queue = JobQueue(run_and_store_topic)
+
+# Identical fetch-news and fetch-comments requests arriving while one is being served
+# wait for it and get the same response instead of running the pipeline again
+_shared_flights = DatabaseFlights() if SINGLE_FLIGHT_DATABASE else None
+news_flight = SingleFlight("fetch_news", shared=_shared_flights)
+comments_flight = SingleFlight("fetch_comments", shared=_shared_flights)
+
+# Function to fetch and store the headlines of a city, shared by concurrent requests
+def fetch_and_store_news(city):
+    def run():
+        top_news = fetch_top_news_topic_cached(city)
+        store.save_topics(city, top_news)
+        return top_news
+    return news_flight.do(normalize_city_name(city), run)
+
+def comments_key(topic, city, mode):
+    return normalize_city_name(city), topic.strip(), mode
+
+# Responses stay valid while the stage they come from is fresh: the cached headlines
+# for fetch-news, the stored reddit comments for fetch-comments. Degraded analyses
+# are not cached so the next request asks the model again.
+def news_max_age(city):
+    return get_news_cache().seconds_fresh(city)
+
+def comments_fresh_for(topic, city):
+    return get_ingestion_store().load(topic, city).seconds_fresh()
+
+def comments_max_age(topic, city, data):
+    if data.get("degraded"):
+        return 0
+    return comments_fresh_for(topic, city)
+
+# fetch-comments ETags name the analysis version: the fingerprint of the comments it
+# was made from, the mode and the analysis fields. They are weak since the rest of the
+# payload, e.g. the per-subreddit timings in "sources", may differ between runs.
+# Incomplete analyses have no version.
+def analysis_etag(fingerprint, mode, summary, sentiment, actionable_needs):
+    if not fingerprint:
+        return None
+    return version_etag(fingerprint, mode, summary, sentiment, actionable_needs)
+
+def comments_etag(data, mode):
+    fields = data.get("summary"), data.get("sentiment"), data.get("actionable_needs")
+    fingerprint = analysis_fingerprint(data.get("comments") or [], *fields, degraded=data.get("degraded"))
+    return analysis_etag(fingerprint, mode, *fields)
+
+# Function to answer a fetch-comments poll from the database: a 304 when the client
+# holds the stored analysis, it was made from the comments the ingestion state would
+# serve now, and those are not yet due for a refresh, so the pipeline would serve the
+# same version. None when the pipeline has to run.
+def stored_comments_not_modified(request, topic, city, mode):
+    if not request.META.get("HTTP_IF_NONE_MATCH"):
+        return None
+    version = store.load_analysis_version(city, topic)
+    if version is None or version["mode"] != mode:
+        return None
+    etag = analysis_etag(version["fingerprint"], mode, version["summary"], version["sentiment"], version["actionable_needs"])
+    if etag is None or not client_has(request, etag):
+        return None
+    state = get_ingestion_store().load(topic, city)
+    fresh_for = state.seconds_fresh()
+    if fresh_for <= 0 or compute_fingerprint(state.top(COMMENTS_LIMIT)) != version["fingerprint"]:
+        return None
+    return not_modified(etag, fresh_for)
+
+def respond_ok(data):
+    return Response(data, status=status.HTTP_200_OK)
 
 @api_view(["GET"])
 def health_check(request):
     return Response({"status": "api working successfully"})
 
+# Answers with an ETag and Cache-Control max-age; a GET whose If-None-Match matches
+# gets a 304. With RESPONSE_CACHE_ENABLED repeat requests are served from memory.
 @api_view(["GET"])
 def fetch_news(request):
     city = request.query_params.get('city')
@@ -20,16 +114,23 @@ def fetch_news(request):
         return Response({"error": "City name is required"}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        # Call the function to fetch top news topics
-        top_news = fetch_top_news_topic(city)
-        return Response({"top_news": top_news}, status=status.HTTP_200_OK)
+        key = ("fetch_news", normalize_city_name(city))
+        entry = response_cache.get(key)
+        if entry is None:
+            entry = response_cache.set(key, {"top_news": fetch_and_store_news(city)}, news_max_age(city))
+        return conditional_response(request, entry, respond_ok)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(["POST"])
+# Takes its parameters from the JSON body of a POST or the query string of a GET. GETs
+# can be revalidated with If-None-Match, answered from the stored analysis without
+# running the pipeline while its comments are fresh
+@api_view(["GET", "POST"])
 def fetch_comments(request):
-    topic = request.data.get('topic')
-    city = request.data.get('city')
+    params = request.query_params if request.method == "GET" else request.data
+    topic = params.get('topic')
+    city = params.get('city')
+    mode = params.get('mode', 'concurrent')
 
 
     if not topic:
@@ -38,14 +139,209 @@ def fetch_comments(request):
     if not city:
         return Response({"error": "city is required"}, status=status.HTTP_400_BAD_REQUEST)
 
+    if mode not in ANALYSIS_MODES:
+        return Response({"error": f"mode must be one of: {', '.join(ANALYSIS_MODES)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if params.get('background'):
+        job = job_queue.submit(topic, city, mode)
+        return Response({"job_id": job["id"], "status": job["status"]}, status=status.HTTP_202_ACCEPTED)
+
+    try:
+        key = comments_key(topic, city, mode)
+        entry = response_cache.get(("fetch_comments",) + key)
+        if entry is None:
+            unchanged = stored_comments_not_modified(request, topic, city, mode)
+            if unchanged is not None:
+                return unchanged
+            data = comments_flight.do(key, lambda: run_and_store_topic(topic, city, mode))
+            entry = response_cache.set(("fetch_comments",) + key, data, comments_max_age(topic, city, data),
+                                       etag=comments_etag(data, mode))
+        return conditional_response(request, entry, respond_ok)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(["GET"])
+def city_report(request):
+    city = request.query_params.get('city')
+    mode = request.query_params.get('mode', 'concurrent')
+    if not city:
+        return Response({"error": "City name is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if mode not in ANALYSIS_MODES:
+        return Response({"error": f"mode must be one of: {', '.join(ANALYSIS_MODES)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        report = run_city_report(city, mode=mode)
+        store.save_topics(city, report["top_news"])
+        for topic_report in report["topics"]:
+            if topic_report["error"] is None:
+                store.save_topic_report(city, topic_report["topic"], topic_report, mode)
+        return Response(report, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(["GET"])
+def recent_analyses(request):
+    city = request.query_params.get('city')
+    if not city:
+        return Response({"error": "City name is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limit = int(request.query_params.get('limit', 20))
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({"city": city, "analyses": store.recent_analyses(city, limit=max(1, min(limit, 100)))}, status=status.HTTP_200_OK)
+
+# Latency and yield of each subreddit searched since the server started
+@api_view(["GET"])
+def subreddit_report(request):
+    return Response({"subreddits": subreddit_stats.report()}, status=status.HTTP_200_OK)
+
+# Stage timings, error counts and upstream status codes in the Prometheus text format
+@require_GET
+def prometheus_metrics(request):
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Queue depth and throttling of the outbound request scheduler, per upstream
+@api_view(["GET"])
+def scheduler_status(request):
+    return Response({"upstreams": get_scheduler().stats()}, status=status.HTTP_200_OK)
+
+# Requests that ran the pipeline (leader) and those that shared a running one, per view
+@api_view(["GET"])
+def single_flight_status(request):
+    return Response({"flights": {flight.name: flight.stats() for flight in (news_flight, comments_flight)}},
+                    status=status.HTTP_200_OK)
+
+@api_view(["GET"])
+def job_status(request, job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(job, status=status.HTTP_200_OK)
+
+
+# Function to format one server-sent event
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Streaming variant of fetch_comments. Sends a "comments" event as soon as the reddit
+# discussion is fetched, a "local_sentiment" event with the instant local estimate,
+# "token" events while the analyses are generated, one "summary", "sentiment" and
+# "actionable_needs" event as each completes (with "degraded": true when it was
+# computed locally because the model missed ANALYSIS_SLO), then "done".
+# It is a GET so that the browser EventSource API can consume it.
+@require_GET
+def fetch_comments_stream(request):
+    topic = request.GET.get('topic')
+    city = request.GET.get('city')
+
+    if not topic:
+        return JsonResponse({"error": "Topic is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not city:
+        return JsonResponse({"error": "city is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    def events():
+        try:
+            comments = fetch_comments_for_topic(topic, city, incremental=True)
+            yield format_sse("comments", {"comments": comments})
+            discussions, compaction = compact_discussions(comments)
+            yield format_sse("compaction", compaction)
+            report = {"comments": comments}
+            for event, data in stream_analyzed_report(discussions, timeout=ANALYSIS_SLO, local_sentiment=score_discussion(comments),
+                                                      comments=comments):
+                if event not in ("token", "local_sentiment"):
+                    report[event] = data["value"]
+                    if data.get("degraded"):
+                        report.setdefault("degraded", []).append(event)
+                yield format_sse(event, data)
+            store.save_topic_report(city, topic, report, "stream")
+            yield format_sse("done", {})
+        except Exception as e:
+            yield format_sse("error", {"error": str(e)})
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx-style proxies from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+# Async variants of the views above. They are plain Django async views (DRF's
+# api_view is sync-only) so under ASGI a request waiting on NewsAPI, OpenRouter
+# or the Reddit thread pool does not hold a worker thread.
+
+@require_GET
+async def fetch_news_async(request):
+    city = request.GET.get('city')
+    if not city:
+        return JsonResponse({"error": "City name is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    async def run():
+        top_news = await afetch_top_news_topic_cached(city)
+        await sync_to_async(store.save_topics)(city, top_news)
+        return top_news
+
     try:
-        comments = fetch_comments_for_topic(topic, city)
-        discussions = [f"Main News Topic: {comment['newsTopic']} | Reddit-Post on this news: {comment['PostTitle']} | Comment on this post by people: {comment['CommentBody']}" for comment in comments]
-        summary,sentiment, actionable_needs = getAnalyzedReport(discussions)
+        key = ("fetch_news", normalize_city_name(city))
+        entry = response_cache.get(key)
+        if entry is None:
+            top_news = await news_flight.ado(normalize_city_name(city), run)
+            entry = response_cache.set(key, {"top_news": top_news}, news_max_age(city))
+        return conditional_response(request, entry, lambda data: JsonResponse(data, status=status.HTTP_200_OK))
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@csrf_exempt
+@require_POST
+async def fetch_comments_async(request):
+    try:
+        payload = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Request body must be JSON"}, status=status.HTTP_400_BAD_REQUEST)
+
+    topic = payload.get('topic')
+    city = payload.get('city')
+    mode = payload.get('mode', 'concurrent')
+
+    if not topic:
+        return JsonResponse({"error": "Topic is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not city:
+        return JsonResponse({"error": "city is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if mode not in ANALYSIS_MODES:
+        return JsonResponse({"error": f"mode must be one of: {', '.join(ANALYSIS_MODES)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    async def run():
+        sources = []
+        comments = await afetch_comments_for_topic(topic, city, incremental=True, sources=sources)
+        local_sentiment = score_discussion(comments)
+        discussions, compaction = compact_discussions(comments)
+        degraded = []
+        summary, sentiment, actionable_needs = await agetAnalyzedReport(discussions, mode=mode, timeout=ANALYSIS_SLO, local_sentiment=local_sentiment,
+                                                                        comments=comments, degraded=degraded)
         data = {"comments": comments,
                 "summary": summary,
                 "sentiment": sentiment,
-                "actionable_needs": actionable_needs}
-        return Response(data, status=status.HTTP_200_OK)
+                "local_sentiment": local_sentiment,
+                "actionable_needs": actionable_needs,
+                "degraded": degraded,
+                "compaction": compaction,
+                "sources": sources}
+        await sync_to_async(store.save_topic_report)(city, topic, data, mode)
+        return data
+
+    try:
+        # Shares flights and cached responses with the sync view, so the payloads must match
+        key = comments_key(topic, city, mode)
+        entry = response_cache.get(("fetch_comments",) + key)
+        if entry is None:
+            data = await comments_flight.ado(key, run)
+            entry = response_cache.set(("fetch_comments",) + key, data, await sync_to_async(comments_max_age)(topic, city, data),
+                                       etag=comments_etag(data, mode))
+        return conditional_response(request, entry, lambda data: JsonResponse(data, status=status.HTTP_200_OK))
     except Exception as e:
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
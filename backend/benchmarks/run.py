@@ -0,0 +1,216 @@
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .stubs import StubServer, StubConfig
+except ImportError:
+    from stubs import StubServer, StubConfig
+
+# Offline end-to-end benchmarks. Starts the stub upstreams, points the src modules
+# at them and reports latency percentiles and throughput for each stage and view as
+# JSON, optionally compared with a stored baseline. Run from backend/:
+#
+#     python -m benchmarks.run --iterations 50 --baseline benchmarks/baseline.json
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+TOPIC = "Road repair"
+CITY = "Kathmandu"
+
+# Relative slowdown of p95 (or drop in throughput) reported as a regression
+DEFAULT_TOLERANCE = 0.25
+
+
+# Function to compute the nearest-rank percentile of sorted values
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    return {
+        "iterations": len(latencies) + errors,
+        "errors": errors,
+        "throughput": (len(latencies) + errors) / elapsed if elapsed else None,
+        "mean": sum(ordered) / len(ordered) if ordered else None,
+        "p50": percentile(ordered, 50),
+        "p95": percentile(ordered, 95),
+        "p99": percentile(ordered, 99),
+    }
+
+
+# Function to call fn `iterations` times from `concurrency` threads, timing each call
+def measure(fn, iterations, concurrency):
+    def timed(_):
+        started = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            print(f"Benchmark call failed: {e}", file=sys.stderr)
+            return None
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        results = list(executor.map(timed, range(iterations)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [result for result in results if result is not None]
+    return summarize(latencies, len(results) - len(latencies), elapsed)
+
+
+# Environment for a cold run: caches off, state in a scratch directory and, unless
+# rate_limits is set, scheduler limits high enough not to shape the numbers
+def benchmark_environ(server, scratch_dir, rate_limits=False):
+    environ = dict(server.environ(),
+                   LLM_CACHE_DISABLED="1",
+                   NEWS_CACHE_TTL="0",
+                   NEWS_CACHE_STALE_TTL="0",
+                   NEWS_CACHE_DIR=os.path.join(scratch_dir, "news_cache"),
+                   INGESTION_STATE_DIR=os.path.join(scratch_dir, "ingestion"),
+                   REDDIT_MIN_REFRESH_INTERVAL="0")
+    if not rate_limits:
+        for upstream in ("OPENROUTER", "REDDIT", "NEWS_API"):
+            environ[f"{upstream}_RATE_LIMIT"] = "100000"
+            environ[f"{upstream}_BURST"] = "100000"
+    return environ
+
+
+def stage_benchmarks():
+    from src.fetch_news_topic import fetch_top_news_topic
+    from src.fetch_reddit_discussion import fetch_comments_for_topic
+    from src.analyze_gathered_info import getAnalyzedReport, build_discussions
+
+    discussions = build_discussions(fetch_comments_for_topic(TOPIC, CITY))
+    benchmarks = {
+        "fetch_top_news_topic": lambda: fetch_top_news_topic(CITY),
+        "fetch_comments_for_topic": lambda: fetch_comments_for_topic(TOPIC, CITY),
+    }
+    for mode in ("sequential", "concurrent", "fused"):
+        benchmarks[f"getAnalyzedReport.{mode}"] = lambda mode=mode: getAnalyzedReport(discussions, mode=mode)
+    return benchmarks
+
+
+# Function to set up Django against a throwaway test database and return the view
+# benchmarks plus a teardown callable. The database is a file in scratch_dir: the
+# default in-memory test database fails concurrent writes instead of waiting.
+def view_benchmarks(scratch_dir):
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+    import django
+    django.setup()
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    connection.settings_dict['TEST']['NAME'] = os.path.join(scratch_dir, 'benchmark.sqlite3')
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    def check(response):
+        if response.status_code != 200:
+            raise RuntimeError(f"view answered {response.status_code}: {response.content[:200]!r}")
+
+    client = Client()
+    benchmarks = {
+        "view.fetch_news": lambda: check(client.get('/fetch-news/', {'city': CITY})),
+        "view.fetch_comments": lambda: check(client.post('/fetch-comments/', data=json.dumps({'topic': TOPIC, 'city': CITY}),
+                                                         content_type='application/json')),
+    }
+
+    def teardown():
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    return benchmarks, teardown
+
+
+# Function to list the benchmarks whose p95 or throughput got worse than the baseline
+# by more than tolerance
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        if result["p95"] is not None and previous.get("p95") and result["p95"] > previous["p95"] * (1 + tolerance):
+            regressions.append({"benchmark": name, "metric": "p95", "baseline": previous["p95"], "current": result["p95"]})
+        if result["throughput"] and previous.get("throughput") and result["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append({"benchmark": name, "metric": "throughput", "baseline": previous["throughput"], "current": result["throughput"]})
+    return regressions
+
+
+def run(config, iterations, concurrency, include_views=True, rate_limits=False, only=None):
+    with StubServer(config) as server, tempfile.TemporaryDirectory() as scratch_dir:
+        os.environ.update(benchmark_environ(server, scratch_dir, rate_limits))
+
+        benchmarks = stage_benchmarks()
+        teardown = None
+        if include_views:
+            views, teardown = view_benchmarks(scratch_dir)
+            benchmarks.update(views)
+
+        try:
+            results = {name: measure(fn, iterations, concurrency)
+                       for name, fn in benchmarks.items() if not only or name in only}
+        finally:
+            if teardown:
+                teardown()
+
+    return {"config": dict(config.to_dict(), iterations=iterations, concurrency=concurrency, rate_limits=rate_limits),
+            "results": results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline and views against local stub upstreams")
+    parser.add_argument('--iterations', type=int, default=30, help="calls per benchmark")
+    parser.add_argument('--concurrency', type=int, default=1, help="calls in flight at the same time")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds each stub request takes")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of stub requests answered with a 500")
+    parser.add_argument('--payload-size', type=int, default=60, help="words in each generated comment or completion")
+    parser.add_argument('--only', nargs='*', help="run only these benchmarks")
+    parser.add_argument('--no-views', action='store_true', help="skip the Django view benchmarks")
+    parser.add_argument('--rate-limits', action='store_true', help="keep the scheduler's default upstream rate limits")
+    parser.add_argument('--output', help="write the JSON results to this file instead of stdout")
+    parser.add_argument('--baseline', help=f"compare with this results file, e.g. {os.path.relpath(DEFAULT_BASELINE, BACKEND_DIR)}")
+    parser.add_argument('--save-baseline', help="also write the results to this file as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    config = StubConfig(latency=args.latency, error_rate=args.error_rate, payload_size=args.payload_size)
+    report = run(config, args.iterations, args.concurrency, include_views=not args.no_views,
+                 rate_limits=args.rate_limits, only=args.only)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["regressions"] = compare(report["results"], baseline, args.tolerance)
+        exit_code = 1 if report["regressions"] else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({"config": report["config"], "results": report["results"]}, f, indent=2)
+            f.write("\n")
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
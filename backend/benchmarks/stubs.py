@@ -0,0 +1,201 @@
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Local stand-ins for NewsAPI, the OpenRouter chat completions API and the parts of
+# Reddit's OAuth API that PRAW uses, so the pipeline can be benchmarked offline.
+
+WORDS = ("road", "water", "traffic", "city", "council", "budget", "school", "power", "repair", "people")
+
+# Stories of the stub news feed; each is listed twice, the second time as a syndicated copy
+STORIES = ("council approves new budget", "water supply cut for two days", "schools reopen after holiday",
+           "power outage hits northern wards", "traffic rules change next month", "bridge repair work begins",
+           "festival draws record crowds", "heavy rain floods main roads")
+
+
+class StubConfig:
+    """Behaviour shared by every stub endpoint.
+
+    latency is in seconds per request, error_rate the share of requests answered
+    with a 500, and payload_size the number of words in generated text fields.
+    """
+
+    def __init__(self, latency=0.05, error_rate=0.0, payload_size=60, submissions=5, comments_per_submission=8, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.payload_size = payload_size
+        self.submissions = submissions
+        self.comments_per_submission = comments_per_submission
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def should_fail(self):
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+    def text(self, words=None):
+        with self._lock:
+            return " ".join(self.random.choice(WORDS) for _ in range(words or self.payload_size))
+
+    def to_dict(self):
+        return {"latency": self.latency, "error_rate": self.error_rate, "payload_size": self.payload_size,
+                "submissions": self.submissions, "comments_per_submission": self.comments_per_submission}
+
+
+def news_response(config, query):
+    titles = []
+    for story in STORIES:
+        titles += [f"{query}: {story}", f"{query} {story} - Stub Wire"]
+    return {"status": "ok", "totalResults": len(titles), "articles": [{"title": title} for title in titles]}
+
+
+def chat_completion_content(config, prompt):
+    if '"query"' in prompt:
+        return json.dumps({"query": config.text(3)})
+    if "return only a JSON object" in prompt:
+        return json.dumps({"summary": config.text(),
+                           "sentiment": {"label": "neutral", "reasoning": config.text(20)},
+                           "actionable_needs": [config.text(15) for _ in range(3)]})
+    if "Analyze the sentiment" in prompt:
+        return f"Neutral. {config.text()}"
+    return config.text()
+
+
+def chat_completion_response(content):
+    return {"id": "stub", "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}]}
+
+
+def submission_data(config, subreddit, index):
+    return {"id": f"{subreddit.lower()}{index}", "name": f"t3_{subreddit.lower()}{index}",
+            "title": f"Post {index} about {config.text(6)}", "subreddit": subreddit,
+            "author": f"poster{index}", "created_utc": time.time() - 3600 * (index + 1),
+            "num_comments": config.comments_per_submission, "score": 100 - index, "selftext": ""}
+
+
+def comment_data(config, submission_id, index):
+    return {"id": f"{submission_id}c{index}", "name": f"t1_{submission_id}c{index}",
+            "body": config.text(), "author": f"commenter{index}", "score": 50 - index,
+            "created_utc": time.time() - 60 * (index + 1), "replies": "",
+            "parent_id": f"t3_{submission_id}", "link_id": f"t3_{submission_id}"}
+
+
+def listing(children):
+    return {"kind": "Listing", "data": {"children": children, "after": None, "before": None}}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; Nagle would hold the body for the client's delayed ACK
+    disable_nagle_algorithm = True
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(body or b"{}")
+        except ValueError:
+            return {}
+
+    def _simulate(self):
+        time.sleep(self.config.latency)
+        if self.config.should_fail():
+            self._send_json({"error": "stub failure"}, status=500)
+            return False
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split("/") if part]
+
+        if url.path.startswith("/v2/everything"):
+            if self._simulate():
+                self._send_json(news_response(self.config, query.get("q", [""])[0]))
+        elif len(parts) >= 3 and parts[0] == "r" and parts[2] == "search":
+            if self._simulate():
+                submissions = [{"kind": "t3", "data": submission_data(self.config, parts[1], i)}
+                               for i in range(self.config.submissions)]
+                self._send_json(listing(submissions))
+        elif len(parts) >= 2 and parts[0] == "comments":
+            if self._simulate():
+                submission_id = parts[1]
+                submission = submission_data(self.config, "all", 0)
+                submission.update(id=submission_id, name=f"t3_{submission_id}")
+                comments = [{"kind": "t1", "data": comment_data(self.config, submission_id, i)}
+                            for i in range(self.config.comments_per_submission)]
+                self._send_json([listing([{"kind": "t3", "data": submission}]), listing(comments)])
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        payload = self._read_json()
+
+        if url.path.endswith("/access_token"):
+            self._send_json({"access_token": "stub-token", "token_type": "bearer", "expires_in": 3600, "scope": "*"})
+        elif url.path.endswith("/chat/completions"):
+            if self._simulate():
+                prompt = " ".join(message.get("content", "") for message in payload.get("messages", []))
+                self._send_json(chat_completion_response(chat_completion_content(self.config, prompt)))
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+
+class StubServer:
+    """All stub endpoints on one local port, served from a background thread."""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config or StubConfig()})
+        self.config = handler.config
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="stub-server", daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # Environment that points the src modules at this server; set before importing them
+    def environ(self):
+        return {
+            "NEWS_API_URL": f"{self.url}/v2/everything",
+            "NEWS_API_KEY": "stub",
+            "OPENROUTER_API_URL": f"{self.url}/api/v1/chat/completions",
+            "OPENROUTER_API_KEY": "stub",
+            "REDDIT_OAUTH_URL": self.url,
+            "REDDIT_URL": self.url,
+            "REDDIT_CLIENT_ID": "stub",
+            "REDDIT_CLIENT_SECRET": "stub",
+            "REDDIT_USER_AGENT": "city-discussion-dashboard benchmarks",
+        }
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
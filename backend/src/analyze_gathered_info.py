@@ -1,101 +1,568 @@
 import os
 import json
-import requests
+import time
+import hashlib
+import queue
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    from .openrouter_client import post_chat_completion, apost_chat_completion, stream_chat_completion
+    from .llm_cache import get_cache
+    from .db import setup_django
+    from .compaction import compact_discussions, format_discussion_line
+    from .scheduler import set_default_priority, bind_context, BATCH
+    from .metrics import stage
+    from .local_sentiment import format_sentiment, score_discussion
+    from .local_summary import local_report
+except ImportError:
+    from openrouter_client import post_chat_completion, apost_chat_completion, stream_chat_completion
+    from llm_cache import get_cache
+    from db import setup_django
+    from compaction import compact_discussions, format_discussion_line
+    from scheduler import set_default_priority, bind_context, BATCH
+    from metrics import stage
+    from local_sentiment import format_sentiment, score_discussion
+    from local_summary import local_report
+
+# Seconds to wait for each analysis call in concurrent mode before giving up on it
+ANALYSIS_TIMEOUT = float(os.getenv('ANALYSIS_TIMEOUT', 60))
+
+# Seconds the API views wait for the model before answering from the local engines;
+# the fields computed locally are listed in the response's "degraded" key
+ANALYSIS_SLO = float(os.getenv('ANALYSIS_SLO_SECONDS', 20))
+
+# Supported ways of running the three analyses, see getAnalyzedReport
+ANALYSIS_MODES = ("sequential", "concurrent", "fused")
+
+# Fields of an analysis, in the order getAnalyzedReport returns them
+ANALYSIS_FIELDS = ("summary", "sentiment", "actionable_needs")
+
+SENTIMENT_LABELS = ("positive", "neutral", "negative")
+
+# When set, the sentiment call is skipped for discussions whose local sentiment
+# estimate is at least this confident, e.g. 0.6. By default it is always made.
+SENTIMENT_LLM_MIN_CONFIDENCE = os.getenv('SENTIMENT_LLM_MIN_CONFIDENCE')
+SENTIMENT_LLM_MIN_CONFIDENCE = float(SENTIMENT_LLM_MIN_CONFIDENCE) if SENTIMENT_LLM_MIN_CONFIDENCE else None
+
+# Bump whenever a prompt or the compaction changes so stored analyses are recomputed
+PROMPT_VERSION = "1"
+
+# Outcomes of analyze_topic, summarized by the batch script
+RECOMPUTED = "recomputed"
+SKIPPED = "skipped"
+MISSING = "missing"
+
+# Number of topics analyzed at the same time by the batch script
+DEFAULT_TOPIC_WORKERS = int(os.getenv('ANALYSIS_TOPIC_WORKERS', 3))
 
 # microsoft/phi-3-mini-128k-instruct:free
 # google/gemma-7b-it:free
 
-def call_openrouter_api(prompt, top_p = 1, temperature = 0, frequency_penalty = 0, presence_penalty =0):
+def build_payload(prompt, top_p = 1, temperature = 0, frequency_penalty = 0, presence_penalty =0):
+    return {
+        "model": "microsoft/phi-3-mini-128k-instruct:free",
+        "messages": [
+            {"role": "user", "content": prompt}
+        ],
+        "top_p": top_p,
+        "temperature": temperature,
+        "frequency_penalty": frequency_penalty,
+        "presence_penalty": presence_penalty,
+    }
+
+def call_openrouter_api(prompt, top_p = 1, temperature = 0, frequency_penalty = 0, presence_penalty =0, bypass_cache=False):
+    payload = build_payload(prompt, top_p, temperature, frequency_penalty, presence_penalty)
+    try:
+        cache = get_cache()
+        content = cache.get(payload, bypass=bypass_cache)
+        if content is None:
+            response = post_chat_completion(payload)
+            content = response.json()['choices'][0]['message']['content'].strip()
+            cache.set(payload, content)
+        return content
+    except Exception as e:
+        print(f"Error fetching from openrouter: {e}")
+
+# Async counterpart of call_openrouter_api, used by the async views
+async def acall_openrouter_api(prompt, top_p = 1, temperature = 0, frequency_penalty = 0, presence_penalty =0, bypass_cache=False):
+    payload = build_payload(prompt, top_p, temperature, frequency_penalty, presence_penalty)
     try:
-        response = requests.post(
-            url="https://openrouter.ai/api/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {os.getenv('OPENROUTER_API_KEY')}",
-                "Content-Type": "application/json"
-            },
-            data=json.dumps({
-                "model": "microsoft/phi-3-mini-128k-instruct:free",
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "top_p": top_p,
-                "temperature": temperature,   
-                "frequency_penalty": frequency_penalty,
-                "presence_penalty": presence_penalty,
-            })
-        )
-        return response.json()['choices'][0]['message']['content'].strip()
+        cache = get_cache()
+        content = cache.get(payload, bypass=bypass_cache)
+        if content is None:
+            response = await apost_chat_completion(payload)
+            content = response.json()['choices'][0]['message']['content'].strip()
+            cache.set(payload, content)
+        return content
     except Exception as e:
         print(f"Error fetching from openrouter: {e}")
-        
+
+# Streaming counterpart of call_openrouter_api: on_token is called with each piece of
+# the response as it arrives (once with the whole text on a cache hit)
+def call_openrouter_api_stream(prompt, on_token, top_p = 1, temperature = 0, frequency_penalty = 0, presence_penalty =0, bypass_cache=False):
+    payload = build_payload(prompt, top_p, temperature, frequency_penalty, presence_penalty)
+    try:
+        cache = get_cache()
+        content = cache.get(payload, bypass=bypass_cache)
+        if content is not None:
+            on_token(content)
+            return content
+
+        parts = []
+        for token in stream_chat_completion(payload):
+            parts.append(token)
+            on_token(token)
+        content = "".join(parts).strip()
+        cache.set(payload, content or None)
+        return content or None
+    except Exception as e:
+        print(f"Error fetching from openrouter: {e}")
+
+# Sampling params for each analysis prompt
+SUMMARY_PARAMS = {"top_p": 0.9, "temperature": 0.5, "frequency_penalty": 0, "presence_penalty": 0}
+SENTIMENT_PARAMS = {"top_p": 1, "temperature": 0, "frequency_penalty": 0, "presence_penalty": 0}
+ACTIONABLE_NEEDS_PARAMS = {"top_p": 0.9, "temperature": 0.2, "frequency_penalty": 0.5, "presence_penalty": 0.5}
+FUSED_PARAMS = {"top_p": 1, "temperature": 0, "frequency_penalty": 0, "presence_penalty": 0}
+
+# Prompt used to summarize the overall discussion
+def summary_prompt(discussions):
+    combined_text = " ".join(discussions)
+    return (
+        "Summarize the key themes, arguments, or points from the following discussion in 2-3 sentences. Focus only on relevant and on-topic information while ignoring unrelated or humorous remarks. For example, if the discussion is about a logistics challenge, prioritize comments that discuss the challenge itself, such as 'It was difficult to transport due to narrow roads.' Ignore off-topic comments like jokes ('This reminds me of a scene from a movie!') or pop culture references ('This looks like something from Fast & Furious.'). Here's the discussion: "
+        f"{combined_text}"
+    )
+
 # Function to summarize the overall discussion
 def summarize_discussion(discussions):
+    return call_openrouter_api(summary_prompt(discussions), **SUMMARY_PARAMS)
+
+async def asummarize_discussion(discussions):
+    return await acall_openrouter_api(summary_prompt(discussions), **SUMMARY_PARAMS)
+
+# Prompt used to analyze the sentiment of the discussion
+def sentiment_prompt(discussions):
     combined_text = " ".join(discussions)
-    prompt = (
-        "Summarize the key themes, arguments, or points from the following discussion in 2-3 sentences. Focus only on relevant and on-topic information while ignoring unrelated or humorous remarks. For example, if the discussion is about a logistics challenge, prioritize comments that discuss the challenge itself, such as 'It was difficult to transport due to narrow roads.' Ignore off-topic comments like jokes ('This reminds me of a scene from a movie!') or pop culture references ('This looks like something from Fast & Furious.'). Here's the discussion: "
+    return (
+        "Analyze the sentiment of the following discussion, classifying it as positive, neutral, or negative. Focus on comments relevant to the primary topic, and provide a brief reasoning for your classification. For example, if the discussion is generally supportive, like 'This process was well executed,' the sentiment is positive. Exclude any irrelevant jokes ('This sounds like a comedy sketch') or unrelated cultural references ('This could be in a superhero movie'). Here's the discussion: "
         f"{combined_text}"
     )
-    return call_openrouter_api(prompt,top_p=0.9, temperature=0.5 , frequency_penalty=0, presence_penalty= 0)
 
 # Function to analyze the sentiment of the discussion
 def analyze_sentiment(discussions):
+    return call_openrouter_api(sentiment_prompt(discussions), **SENTIMENT_PARAMS)
+
+async def aanalyze_sentiment(discussions):
+    return await acall_openrouter_api(sentiment_prompt(discussions), **SENTIMENT_PARAMS)
+
+# Prompt used to identify actionable needs from the discussion
+def actionable_needs_prompt(discussions):
     combined_text = " ".join(discussions)
-    prompt = (
-        "Analyze the sentiment of the following discussion, classifying it as positive, neutral, or negative. Focus on comments relevant to the primary topic, and provide a brief reasoning for your classification. For example, if the discussion is generally supportive, like 'This process was well executed,' the sentiment is positive. Exclude any irrelevant jokes ('This sounds like a comedy sketch') or unrelated cultural references ('This could be in a superhero movie'). Here's the discussion: "
+    return (
+        "Review the following discussion and identify any actionable needs, concerns, or relevant suggestions. Focus on comments directly related to the topic and that point out issues or recommendations, such as 'The equipment should be tested more thoroughly next time.' Ignore irrelevant or humorous comments like jokes ('Someone should turn this into a meme!') or unrelated pop culture references ('This is straight out of a sci-fi movie.'). Here's the discussion: "
         f"{combined_text}"
     )
-    return call_openrouter_api(prompt, top_p=1, temperature=0,frequency_penalty=0, presence_penalty=0)
 
 # Function to identify actionable needs from the discussion
 def identify_actionable_needs(discussions):
+    return call_openrouter_api(actionable_needs_prompt(discussions), **ACTIONABLE_NEEDS_PARAMS)
+
+async def aidentify_actionable_needs(discussions):
+    return await acall_openrouter_api(actionable_needs_prompt(discussions), **ACTIONABLE_NEEDS_PARAMS)
+
+# Prompt asking for summary, sentiment and actionable needs as one JSON object
+def fused_prompt(discussions):
     combined_text = " ".join(discussions)
-    prompt = (
-        "Review the following discussion and identify any actionable needs, concerns, or relevant suggestions. Focus on comments directly related to the topic and that point out issues or recommendations, such as 'The equipment should be tested more thoroughly next time.' Ignore irrelevant or humorous comments like jokes ('Someone should turn this into a meme!') or unrelated pop culture references ('This is straight out of a sci-fi movie.'). Here's the discussion: "
+    return (
+        "Analyze the following discussion and return only a JSON object, without any additional text or formatting, with exactly these fields: "
+        "\"summary\": the key themes, arguments, or points of the discussion in 2-3 sentences; "
+        "\"sentiment\": an object with \"label\" (one of \"positive\", \"neutral\" or \"negative\") and \"reasoning\" (a brief reasoning for the label); "
+        "\"actionable_needs\": a list of actionable needs, concerns, or relevant suggestions raised in the discussion. "
+        "Focus only on comments relevant to the primary topic and ignore unrelated jokes or pop culture references. "
+        "The output should look exactly like this: "
+        "{\"summary\": \"...\", \"sentiment\": {\"label\": \"neutral\", \"reasoning\": \"...\"}, \"actionable_needs\": [\"...\"]}. "
+        "Here's the discussion: "
         f"{combined_text}"
     )
-    return call_openrouter_api(prompt, top_p=0.9, temperature=0.2, frequency_penalty=0.5, presence_penalty=0.5)
+
+# Function to get summary, sentiment and actionable needs in one structured request
+def analyze_discussion_fused(discussions):
+    return call_openrouter_api(fused_prompt(discussions), **FUSED_PARAMS)
+
+async def aanalyze_discussion_fused(discussions):
+    return await acall_openrouter_api(fused_prompt(discussions), **FUSED_PARAMS)
+
+# Function to validate the fused response and turn it into the (summary, sentiment, actionable_needs)
+# strings returned by the three-call path. Returns None when the response is not usable.
+def parse_fused_analysis(content):
+    if not content:
+        return None
+
+    # Models sometimes wrap the object in a markdown code fence or add text around it
+    start, end = content.find("{"), content.rfind("}")
+    if start == -1 or end < start:
+        return None
+    try:
+        result = json.loads(content[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+
+    if not isinstance(result, dict):
+        return None
+    summary = result.get("summary")
+    sentiment = result.get("sentiment")
+    actionable_needs = result.get("actionable_needs")
+
+    if not isinstance(summary, str) or not summary.strip():
+        return None
+    if not isinstance(sentiment, dict):
+        return None
+    label = sentiment.get("label")
+    reasoning = sentiment.get("reasoning")
+    if not isinstance(label, str) or label.strip().lower() not in SENTIMENT_LABELS or not isinstance(reasoning, str):
+        return None
+    if isinstance(actionable_needs, str):
+        actionable_needs = [actionable_needs]
+    if not isinstance(actionable_needs, list) or not all(isinstance(need, str) for need in actionable_needs):
+        return None
+
+    sentiment_text = f"{label.strip().capitalize()}. {reasoning.strip()}".strip()
+    return summary.strip(), sentiment_text, "\n".join(need.strip() for need in actionable_needs)
 
 # Function to get summary, sentiment and actionable needs
-def getAnalyzedReport(discussions):
-    summary = summarize_discussion(discussions)
-    sentiment = analyze_sentiment(discussions)
-    actionable_needs = identify_actionable_needs(discussions)
-    return summary, sentiment, actionable_needs
-
-# Function to save the analysis results to a JSON file
-def save_analysis_to_json(topic, summary, sentiment, actionable_needs):
-    result = {
-        "topic": topic,
-        "summary": summary,
-        "sentiment": sentiment,
-        "actionable_needs": actionable_needs
-    }
+# mode="sequential" runs the three calls one after another and lets errors propagate.
+# mode="concurrent" sends the three prompts at once; a call that fails comes back as
+# None so the other results are still returned.
+# mode="fused" asks for all three in a single JSON response and falls back to the
+# concurrent three-call path when that response cannot be parsed.
+# In every mode `timeout` is one deadline for the whole analysis: the fields not
+# returned within it come back as None. Without it only the concurrent calls are
+# bounded, each by ANALYSIS_TIMEOUT.
+# local_sentiment is the local_sentiment.score_discussion result for the comments; when
+# given it replaces a missing sentiment and, see SENTIMENT_LLM_MIN_CONFIDENCE, a
+# confident estimate saves the sentiment call. With the comments, a missing summary or
+# list of actionable needs is extracted locally. The names of the fields filled in
+# locally are appended to `degraded` when a list is given.
+def getAnalyzedReport(discussions, mode="sequential", timeout=None, local_sentiment=None, comments=None, degraded=None):
+    with stage("analysis", mode=mode):
+        report = _analyzed_report(discussions, mode, timeout, local_sentiment)
+    return with_local_fallback(report, local_sentiment, comments, degraded)
+
+# Function to tell whether the local estimate is confident enough to skip the sentiment call
+def local_sentiment_is_sufficient(local_sentiment):
+    return (local_sentiment is not None and SENTIMENT_LLM_MIN_CONFIDENCE is not None
+            and local_sentiment["confidence"] >= SENTIMENT_LLM_MIN_CONFIDENCE)
+
+# Function to compute one analysis field with the local engines; None when it cannot
+# be. `extracted` keeps the local summary and needs between calls for the same comments.
+def local_field(field, local_sentiment=None, comments=None, extracted=None):
+    if field == "sentiment":
+        return format_sentiment(local_sentiment) if local_sentiment is not None else None
+    if comments is None:
+        return None
+    if extracted is None:
+        extracted = {}
+    if not extracted:
+        extracted.update(local_report(comments))
+    return extracted[field]
+
+# Function to fill in the fields the model did not return from the local engines,
+# listing them in `degraded`
+def with_local_fallback(report, local_sentiment=None, comments=None, degraded=None):
+    report = list(report)
+    extracted = {}
+    filled = []
+    for index, field in enumerate(ANALYSIS_FIELDS):
+        if report[index] is None:
+            report[index] = local_field(field, local_sentiment, comments, extracted)
+            if report[index] is not None:
+                filled.append(field)
+    if filled:
+        print(f"Analysis incomplete, using the local {', '.join(filled)}")
+        if degraded is not None:
+            degraded.extend(filled)
+    return tuple(report)
+
+# Function to call fn(*args) on a worker thread, raising TimeoutError if it has not
+# returned by the time.monotonic() deadline; fn is not called once the deadline has
+# passed. Without a deadline fn runs in the caller.
+def _call_before(deadline, fn, *args):
+    if deadline is None:
+        return fn(*args)
+    if time.monotonic() >= deadline:
+        raise TimeoutError
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        return executor.submit(bind_context(fn), *args).result(timeout=max(0, deadline - time.monotonic()))
+    finally:
+        # Do not block the caller on a call that is still hanging
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _analyzed_report(discussions, mode, timeout, local_sentiment=None):
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"Unknown analysis mode: {mode}")
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    if mode == "fused":
+        try:
+            fused = parse_fused_analysis(_call_before(deadline, analyze_discussion_fused, discussions))
+        except TimeoutError:
+            print(f"Timed out after {timeout}s waiting for the fused analysis")
+            return None, None, None
+        if fused is not None:
+            return fused
+        print("Fused analysis returned an invalid response, falling back to separate calls")
+        # The separate calls only get what is left of the deadline
+        if deadline is not None:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                return None, None, None
+    if mode != "sequential":
+        return getAnalyzedReportConcurrently(discussions, timeout=timeout, local_sentiment=local_sentiment)
+
+    analyses = [
+        ("summary", summarize_discussion),
+        ("sentiment", analyze_sentiment),
+        ("actionable_needs", identify_actionable_needs),
+    ]
+    if local_sentiment_is_sufficient(local_sentiment):
+        analyses[1] = ("sentiment", lambda discussions: format_sentiment(local_sentiment))
+    report = []
+    for name, analysis in analyses:
+        try:
+            report.append(_call_before(deadline, analysis, discussions))
+        except TimeoutError:
+            print(f"Timed out after {timeout}s waiting for {name}")
+            report.append(None)
+    return tuple(report)
+
+def getAnalyzedReportConcurrently(discussions, timeout=None, local_sentiment=None):
+    if timeout is None:
+        timeout = ANALYSIS_TIMEOUT
+
+    analyses = [
+        ("summary", summarize_discussion),
+        ("sentiment", analyze_sentiment),
+        ("actionable_needs", identify_actionable_needs),
+    ]
+    if local_sentiment_is_sufficient(local_sentiment):
+        analyses[1] = ("sentiment", lambda discussions: format_sentiment(local_sentiment))
+    executor = ThreadPoolExecutor(max_workers=len(analyses))
+    try:
+        futures = [executor.submit(bind_context(analysis), discussions) for _, analysis in analyses]
+        # All calls start together, so one shared deadline is a per-call timeout
+        wait(futures, timeout=timeout)
+
+        results = []
+        for (name, _), future in zip(analyses, futures):
+            if not future.done():
+                print(f"Timed out after {timeout}s waiting for {name}")
+                results.append(None)
+            elif future.exception() is not None:
+                print(f"Error computing {name}: {future.exception()}")
+                results.append(None)
+            else:
+                results.append(future.result())
+        return tuple(results)
+    finally:
+        # Do not block the caller on a call that is still hanging
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# Function to stream the three analyses as they are produced. Yields (event, data) pairs:
+# ("token", {"field", "text"}) for each streamed piece of a response, then
+# (field, {"field", "value"}) once that analysis is complete; value is None when the
+# call failed or did not finish within `timeout` seconds. With local_sentiment a
+# ("local_sentiment", {"field", "value", "label", "confidence"}) event comes first and
+# the estimate stands in for a sentiment the model did not return; with the comments
+# a missing summary or list of actionable needs is extracted locally. Such final
+# events carry "degraded": True.
+def stream_analyzed_report(discussions, timeout=None, local_sentiment=None, comments=None):
+    if timeout is None:
+        timeout = ANALYSIS_TIMEOUT
+
+    analyses = [
+        ("summary", summary_prompt, SUMMARY_PARAMS),
+        ("sentiment", sentiment_prompt, SENTIMENT_PARAMS),
+        ("actionable_needs", actionable_needs_prompt, ACTIONABLE_NEEDS_PARAMS),
+    ]
+    local_text = None
+    if local_sentiment is not None:
+        local_text = format_sentiment(local_sentiment)
+        yield "local_sentiment", {"field": "sentiment", "value": local_text,
+                                  "label": local_sentiment["label"], "confidence": local_sentiment["confidence"]}
+        if local_sentiment_is_sufficient(local_sentiment):
+            analyses.pop(1)
+            yield "sentiment", {"field": "sentiment", "value": local_text}
+
+    extracted = {}
+
+    def with_fallback(event, data):
+        if event not in ANALYSIS_FIELDS or data["value"] is not None:
+            return event, data
+        value = local_field(event, local_sentiment, comments, extracted)
+        if value is None:
+            return event, data
+        print(f"Analysis incomplete, using the local {event}")
+        return event, dict(data, value=value, degraded=True)
 
-    filename = f'data/analysis/{topic.replace(" ", "_")}_analysis.json'
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-    with open(filename, 'w') as f:
-        json.dump(result, f, indent=4)
-
-def main():
-    with open('data/topics.json') as f:
-        topics = json.load(f)
-
-    for topic in topics:
-        filename = f'data/reddit/{topic.replace(" ", "_")}_comments.csv'
-        
-        if os.path.exists(filename):
-            with open(filename) as f:
-                comments = json.load(f)
-                discussions = [f"Main News Topic: {comment['newsTopic']} | Reddit-Post on this news: {comment['PostTitle']} | Comment on this post by people: {comment['CommentBody']}" for comment in comments]
-            
-            # Perform the analyses
-            summary,sentiment, actionable_needs = getAnalyzedReport(discussions)
-            
-            # Save the results
-            save_analysis_to_json(topic, summary, sentiment, actionable_needs)
-            print(f"Analysis saved for topic '{topic}'")
+    events = queue.Queue()
+
+    def run(name, prompt, params):
+        value = call_openrouter_api_stream(prompt, lambda text: events.put(("token", {"field": name, "text": text})), **params)
+        events.put((name, {"field": name, "value": value}))
+
+    executor = ThreadPoolExecutor(max_workers=len(analyses))
+    try:
+        for name, build_prompt, params in analyses:
+            executor.submit(bind_context(run), name, build_prompt(discussions), params)
+
+        pending = {name for name, _, _ in analyses}
+        deadline = time.monotonic() + timeout
+        while pending:
+            try:
+                event, data = events.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                for name, _, _ in analyses:
+                    if name in pending:
+                        print(f"Timed out after {timeout}s waiting for {name}")
+                        yield with_fallback(name, {"field": name, "value": None})
+                return
+            pending.discard(event)
+            yield with_fallback(event, data)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# Async counterpart of getAnalyzedReport; the three calls are always sent at once
+# and, as in the concurrent mode, a failed or timed out call comes back as None
+async def agetAnalyzedReport(discussions, mode="concurrent", timeout=None, local_sentiment=None, comments=None, degraded=None):
+    with stage("analysis", mode=mode):
+        report = await _aanalyzed_report(discussions, mode, timeout, local_sentiment)
+    return with_local_fallback(report, local_sentiment, comments, degraded)
+
+async def _aanalyzed_report(discussions, mode, timeout, local_sentiment=None):
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"Unknown analysis mode: {mode}")
+    if timeout is None:
+        timeout = ANALYSIS_TIMEOUT
+
+    if mode == "fused":
+        deadline = time.monotonic() + timeout
+        try:
+            fused = parse_fused_analysis(await asyncio.wait_for(aanalyze_discussion_fused(discussions), timeout))
+        except asyncio.TimeoutError:
+            print(f"Timed out after {timeout}s waiting for the fused analysis")
+            return None, None, None
+        if fused is not None:
+            return fused
+        print("Fused analysis returned an invalid response, falling back to separate calls")
+        # The separate calls only get what is left of the deadline
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            return None, None, None
+
+    analyses = [
+        ("summary", asummarize_discussion),
+        ("sentiment", aanalyze_sentiment),
+        ("actionable_needs", aidentify_actionable_needs),
+    ]
+    if local_sentiment_is_sufficient(local_sentiment):
+        async def local_estimate(discussions):
+            return format_sentiment(local_sentiment)
+        analyses[1] = ("sentiment", local_estimate)
+    results = await asyncio.gather(
+        *(asyncio.wait_for(analysis(discussions), timeout) for _, analysis in analyses),
+        return_exceptions=True
+    )
+    report = []
+    for (name, _), result in zip(analyses, results):
+        if isinstance(result, asyncio.TimeoutError):
+            print(f"Timed out after {timeout}s waiting for {name}")
+            report.append(None)
+        elif isinstance(result, Exception):
+            print(f"Error computing {name}: {result}")
+            report.append(None)
         else:
-            print(f"File not found: {filename}")
+            report.append(result)
+    return tuple(report)
+
+# Function to turn fetched comments into the discussion lines sent to the model
+def build_discussions(comments):
+    return [format_discussion_line(comment) for comment in comments]
+
+# Function to fingerprint the input of an analysis: the comment ids and bodies plus the
+# prompt version. Comment order does not matter.
+def compute_fingerprint(comments):
+    digest = hashlib.sha256(PROMPT_VERSION.encode("utf-8"))
+    for comment_id, body in sorted((str(c.get('CommentId', '')), c.get('CommentBody', '')) for c in comments):
+        digest.update(b"\0" + comment_id.encode("utf-8") + b"\0" + body.encode("utf-8"))
+    return digest.hexdigest()
+
+# Function to pick the fingerprint an analysis is saved with. An incomplete analysis
+# (degraded, or with a field missing) is saved without one so the next run redoes it
+# even though the comments are unchanged.
+def analysis_fingerprint(comments, summary, sentiment, actionable_needs, degraded=()):
+    if degraded or None in (summary, sentiment, actionable_needs):
+        return ''
+    return compute_fingerprint(comments)
+
+# Function to analyze one topic from the comments stored for it in the database, where
+# the analysis is written as well. Topics whose comments are unchanged since the last
+# analysis are skipped unless force is set. Returns RECOMPUTED, SKIPPED or MISSING.
+def analyze_topic(topic, city, mode="concurrent", force=False):
+    from app import store
+    comments = store.load_comments(city, topic)
+    if not comments:
+        print(f"No stored comments for topic '{topic}' in {city}")
+        return MISSING
+
+    fingerprint = compute_fingerprint(comments)
+    if not force and store.load_analysis_fingerprint(city, topic) == fingerprint:
+        print(f"Skipping topic '{topic}': comments unchanged since the last analysis")
+        return SKIPPED
+
+    discussions, compaction = compact_discussions(comments)
+    print(f"Compacted discussion for topic '{topic}': {compaction['tokens_saved']} of {compaction['original_tokens']} tokens saved")
+
+    # Perform the analyses
+    degraded = []
+    summary,sentiment, actionable_needs = getAnalyzedReport(discussions, mode=mode, local_sentiment=score_discussion(comments),
+                                                            degraded=degraded)
+
+    # Save the results
+    fingerprint = analysis_fingerprint(comments, summary, sentiment, actionable_needs, degraded)
+    store.save_analysis(city, topic, summary, sentiment, actionable_needs, mode, fingerprint)
+    print(f"Analysis saved for topic '{topic}'")
+    return RECOMPUTED
+
+def main(city, max_workers=DEFAULT_TOPIC_WORKERS, mode="concurrent", force=False):
+    setup_django()
+    from app import store
+    topics = store.load_topics(city)
+
+    outcomes = {RECOMPUTED: [], SKIPPED: [], MISSING: [], "failed": []}
+
+    # Analyze several topics in parallel, bounded by max_workers
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(analyze_topic, topic, city, mode, force): topic for topic in topics}
+        for future, topic in futures.items():
+            try:
+                outcomes[future.result()].append(topic)
+            except Exception as e:
+                print(f"Error analyzing topic '{topic}': {e}")
+                outcomes["failed"].append(topic)
+
+    print(f"Recomputed {len(outcomes[RECOMPUTED])}, skipped {len(outcomes[SKIPPED])} unchanged, "
+          f"{len(outcomes[MISSING])} without comments, {len(outcomes['failed'])} failed")
+    return outcomes
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Analyze the gathered reddit discussions")
+    parser.add_argument('--workers', type=int, default=DEFAULT_TOPIC_WORKERS, help="number of topics to analyze in parallel")
+    parser.add_argument('--mode', choices=ANALYSIS_MODES, default="concurrent", help="how the three analyses are requested")
+    parser.add_argument('--city', required=True, help="analyze the topics stored in the database for this city")
+    parser.add_argument('--force', action='store_true', help="re-analyze topics even when their comments are unchanged")
+    args = parser.parse_args()
+    # Dashboard requests go first when the API runs in the same process
+    set_default_priority(BATCH)
+    main(args.city, max_workers=args.workers, mode=args.mode, force=args.force)
@@ -0,0 +1,125 @@
+import os
+import re
+import math
+
+try:
+    from .metrics import stage
+except ImportError:
+    from metrics import stage
+
+# Approximate number of prompt tokens the discussion may use
+COMPACTION_TOKEN_BUDGET = int(os.getenv('COMPACTION_TOKEN_BUDGET', 3000))
+
+# Comment bodies at least this similar (Jaccard over word shingles) count as duplicates
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv('COMPACTION_NEAR_DUPLICATE_THRESHOLD', 0.8))
+
+SHINGLE_SIZE = 3
+
+REMOVED_BODIES = {"[deleted]", "[removed]", ""}
+
+URL_PATTERN = re.compile(r"https?://\S+|www\.\S+")
+MARKDOWN_LINK_PATTERN = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+# Bot footers and edit notes that carry no discussion content
+BOILERPLATE_PATTERNS = [
+    re.compile(r"\^?\*?I am a bot.*", re.IGNORECASE | re.DOTALL),
+    re.compile(r"^\s*edit\s*\d*\s*:.*\b(thanks|thank you|gold|award|typo|spelling|formatting)\b.*$", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"^\s*&gt;.*$|^\s*>.*$", re.MULTILINE),
+]
+WORD_PATTERN = re.compile(r"\w+")
+
+
+# Rough token count (about four characters per token) that needs no tokenizer
+def estimate_tokens(text):
+    return math.ceil(len(text) / 4) if text else 0
+
+
+# Uncompacted line for one comment, as sent before compaction was added
+def format_discussion_line(comment):
+    return f"Main News Topic: {comment['newsTopic']} | Reddit-Post on this news: {comment['PostTitle']} | Comment on this post by people: {comment['CommentBody']}"
+
+
+# Function to remove links, quotes, bot footers and extra whitespace from a comment body
+def strip_boilerplate(body):
+    body = MARKDOWN_LINK_PATTERN.sub(r"\1", body or "")
+    body = URL_PATTERN.sub("", body)
+    for pattern in BOILERPLATE_PATTERNS:
+        body = pattern.sub("", body)
+    return " ".join(body.split())
+
+
+def _shingles(text):
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _is_near_duplicate(shingles, kept_shingles, threshold):
+    for other in kept_shingles:
+        union = len(shingles | other)
+        if union and len(shingles & other) / union >= threshold:
+            return True
+    return False
+
+
+def _render(groups):
+    discussions = []
+    for news_topic, posts in groups.items():
+        for index, (post_title, bodies) in enumerate(posts.items()):
+            prefix = f"Main News Topic: {news_topic} | " if index == 0 else ""
+            discussions.append(f"{prefix}Reddit-Post on this news: {post_title} | Comments on this post by people: {' || '.join(bodies)}")
+    return discussions
+
+
+# Function to turn fetched comments into a compact discussion for the prompts:
+# each topic and post header appears once, boilerplate and (near-)duplicate bodies
+# are dropped and the highest scored comments are kept within token_budget.
+# Returns the discussion lines and a stats dict with the tokens saved.
+def compact_discussions(comments, token_budget=None, threshold=NEAR_DUPLICATE_THRESHOLD):
+    with stage("compaction"):
+        return _compact_discussions(comments, token_budget, threshold)
+
+def _compact_discussions(comments, token_budget, threshold):
+    if token_budget is None:
+        token_budget = COMPACTION_TOKEN_BUDGET
+
+    # Lines are joined with one space in the prompts, hence the +1 per line
+    original_tokens = sum(estimate_tokens(format_discussion_line(comment)) + 1 for comment in comments)
+
+    kept_shingles = []
+    candidates = []
+    for comment in sorted(comments, key=lambda c: c.get('Score', 0), reverse=True):
+        body = strip_boilerplate(comment.get('CommentBody'))
+        if body.lower() in REMOVED_BODIES:
+            continue
+        shingles = _shingles(body)
+        if _is_near_duplicate(shingles, kept_shingles, threshold):
+            continue
+        kept_shingles.append(shingles)
+        candidates.append((comment['newsTopic'], comment['PostTitle'], body))
+
+    groups = {}
+    used_tokens = 0
+    kept = 0
+    for news_topic, post_title, body in candidates:
+        cost = estimate_tokens(body) + 1
+        if news_topic not in groups:
+            cost += estimate_tokens(f"Main News Topic: {news_topic} | ")
+        if post_title not in groups.get(news_topic, {}):
+            cost += estimate_tokens(f"Reddit-Post on this news: {post_title} | Comments on this post by people: ")
+        if used_tokens + cost > token_budget:
+            continue
+        groups.setdefault(news_topic, {}).setdefault(post_title, []).append(body)
+        used_tokens += cost
+        kept += 1
+
+    discussions = _render(groups)
+    compacted_tokens = sum(estimate_tokens(line) + 1 for line in discussions)
+    stats = {
+        "original_tokens": original_tokens,
+        "compacted_tokens": compacted_tokens,
+        "tokens_saved": max(0, original_tokens - compacted_tokens),
+        "comments_kept": kept,
+        "comments_dropped": len(comments) - kept,
+    }
+    return discussions, stats
@@ -0,0 +1,17 @@
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Function to configure Django so the batch scripts can use the app models.
+# Safe to call more than once; does nothing when Django is already set up.
+def setup_django():
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
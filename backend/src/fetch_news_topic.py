@@ -1,44 +1,328 @@
 import requests
+import httpx
 import os
+import re
 import json
+import time
+import asyncio
+import weakref
+import threading
 from datetime import datetime, timedelta
+from concurrent.futures import Future, ThreadPoolExecutor
 
-def fetch_top_news_topic(city_name ):
+try:
+    from .db import setup_django
+    from .scheduler import get_scheduler
+    from .metrics import stage, record_upstream
+except ImportError:
+    from db import setup_django
+    from scheduler import get_scheduler
+    from metrics import stage, record_upstream
+
+# Headlines younger than this many seconds are served without contacting NewsAPI
+NEWS_CACHE_TTL = float(os.getenv('NEWS_CACHE_TTL', 30 * 60))
+
+# For this many seconds after the TTL the stale headlines are still served while a
+# background refresh runs; older entries are refetched before returning
+NEWS_CACHE_STALE_TTL = float(os.getenv('NEWS_CACHE_STALE_TTL', 6 * 60 * 60))
+
+NEWS_API_URL = os.getenv('NEWS_API_URL', "https://newsapi.org/v2/everything")
+
+NEWS_API_TIMEOUT = float(os.getenv('NEWS_API_TIMEOUT', 15))
+
+# Times a request answered with 429 is sent again once the scheduler allows it
+NEWS_API_MAX_RETRIES = int(os.getenv('NEWS_API_MAX_RETRIES', 2))
+
+NEWS_CACHE_DIR = os.getenv('NEWS_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'news_cache'))
 
+# Number of distinct stories returned for a city
+HEADLINES_LIMIT = 5
+
+# Headlines whose word shingles overlap at least this much (Jaccard) are variants of
+# the same story; only the first one is kept
+HEADLINE_SIMILARITY_THRESHOLD = float(os.getenv('HEADLINE_SIMILARITY_THRESHOLD', 0.5))
+
+# Trailing publisher names such as " - BBC News" or " | Reuters"
+HEADLINE_SOURCE_PATTERN = re.compile(r"\s+[-|–—]\s+[^-|–—]{1,40}$")
+HEADLINE_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+HEADLINE_STOPWORDS = {"a", "an", "the", "and", "or", "of", "in", "on", "at", "to", "for", "by", "with", "from", "as", "is", "are", "after", "over"}
+
+def build_news_query(city_name):
     api_key = os.getenv('NEWS_API_KEY')
     if not api_key:
         raise Exception("API key not found. Please set the NEWS_API_KEY environment variable.")
-    query_params = {
+    return {
         "sortBy": "relevancy",
         "q": city_name,
         "apiKey": api_key,
         "language": "en",
     }
 
-    api_url = "https://newsapi.org/v2/everything"
-    
-    response = requests.get(api_url, params=query_params)
-    news_data = response.json()
-    
+# Function to reduce a headline to its words without the publisher, stopwords and
+# common suffixes, so syndicated rewrites of a story share most of them
+def headline_shingles(headline):
+    words = HEADLINE_WORD_PATTERN.findall(HEADLINE_SOURCE_PATTERN.sub("", headline).lower())
+    shingles = set()
+    for word in words:
+        if word in HEADLINE_STOPWORDS:
+            continue
+        for suffix in ("ing", "ed", "es", "s"):
+            if len(word) > len(suffix) + 3 and word.endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+        shingles.add(word)
+    return shingles
+
+def _jaccard(first, second):
+    union = len(first | second)
+    return len(first & second) / union if union else 1.0
+
+# Function to keep one headline per story: titles are clustered greedily in the order
+# given and each joins the first kept headline it is similar enough to. Later articles
+# backfill the dropped variants until `limit` distinct headlines are found.
+def distinct_headlines(titles, limit=HEADLINES_LIMIT, threshold=None):
+    if threshold is None:
+        threshold = HEADLINE_SIMILARITY_THRESHOLD
+    kept, kept_shingles = [], []
+    for title in titles:
+        if len(kept) >= limit:
+            break
+        # NewsAPI lists deleted articles with the title "[Removed]"
+        if not title or title == "[Removed]":
+            continue
+        shingles = headline_shingles(title)
+        if any(_jaccard(shingles, other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(title)
+        kept_shingles.append(shingles)
+    return kept
+
+def parse_headlines(news_data):
     if news_data.get('status') == 'ok':
-        articles = news_data.get('articles', [])[:5]
-        headlines = [article['title'] for article in articles]
-        return headlines
+        articles = news_data.get('articles', [])
+        return distinct_headlines(article.get('title') for article in articles)
     else:
         raise Exception("Failed to fetch news topics")
 
+def fetch_top_news_topic(city_name ):
+    query_params = build_news_query(city_name)
+
+    scheduler = get_scheduler()
+    with stage("fetch_news"):
+        for attempt in range(NEWS_API_MAX_RETRIES + 1):
+            scheduler.acquire("newsapi")
+            started = time.perf_counter()
+            response = requests.get(NEWS_API_URL, params=query_params, timeout=NEWS_API_TIMEOUT)
+            record_upstream("newsapi", response.status_code, time.perf_counter() - started)
+            scheduler.record_response("newsapi", response.status_code, response.headers)
+            if response.status_code != 429:
+                break
+        news_data = response.json()
+
+        return parse_headlines(news_data)
+
+# One keep-alive async client per running event loop
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(timeout=NEWS_API_TIMEOUT)
+        _async_clients[loop] = client
+    return client
+
+# Async counterpart of fetch_top_news_topic, used by the async views
+async def afetch_top_news_topic(city_name):
+    query_params = build_news_query(city_name)
+
+    scheduler = get_scheduler()
+    with stage("fetch_news"):
+        for attempt in range(NEWS_API_MAX_RETRIES + 1):
+            await scheduler.aacquire("newsapi")
+            started = time.perf_counter()
+            response = await get_async_client().get(NEWS_API_URL, params=query_params)
+            record_upstream("newsapi", response.status_code, time.perf_counter() - started)
+            scheduler.record_response("newsapi", response.status_code, response.headers)
+            if response.status_code != 429:
+                break
+        news_data = response.json()
+
+        return parse_headlines(news_data)
+
+# Function to store the topics through the Django models
+def save_topics_to_db(topics, city_name):
+    setup_django()
+    from app import store
+    store.save_topics(city_name, topics)
+
+# Function to normalize a city name into the key used for files and caches
+def normalize_city_name(city_name):
+    return city_name.strip().replace(" ", "_").lower()
+
 def save_topics_to_file(topics, city_name):
-    sanitized_city_name = city_name.replace(" ", "_").lower()
+    sanitized_city_name = normalize_city_name(city_name)
     filename = f"data/{sanitized_city_name}.json"
     with open(filename, 'w') as f:
         json.dump(topics, f, indent=4)
 
+
+class NewsCache:
+    """Per-city headline cache with a TTL, stale-while-revalidate and coalesced refreshes.
+
+    Entries are kept in memory and mirrored to one JSON file per city so the CLI
+    and the API share them.
+    """
+
+    def __init__(self, fetch=None, afetch=None, cache_dir=NEWS_CACHE_DIR, ttl=NEWS_CACHE_TTL, stale_ttl=NEWS_CACHE_STALE_TTL):
+        self.fetch = fetch
+        self.afetch = afetch
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="news-refresh")
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json") if self.cache_dir else None
+
+    def _load(self, key):
+        entry = self._entries.get(key)
+        if entry is None and self._path(key) and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key)) as f:
+                    entry = json.load(f)
+                self._entries[key] = entry
+            except (OSError, ValueError):
+                entry = None
+        return entry
+
+    def _store(self, key, headlines):
+        entry = {"fetched_at": time.time(), "headlines": headlines}
+        self._entries[key] = entry
+        path = self._path(key)
+        if path:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(path, 'w') as f:
+                    json.dump(entry, f, indent=4)
+            except OSError as e:
+                print(f"Error writing news cache for '{key}': {e}")
+
+    # Claims the refresh for a city unless one is already running; returns the shared
+    # future and whether the caller has to run the fetch
+    def _claim_refresh(self, key):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+        return future, True
+
+    def _complete_refresh(self, key, future, headlines=None, error=None):
+        with self._lock:
+            if error is None:
+                self._store(key, headlines)
+            self._inflight.pop(key, None)
+        if error is None:
+            future.set_result(headlines)
+        else:
+            future.set_exception(error)
+
+    def _run_refresh(self, key, city_name, future):
+        try:
+            headlines = (self.fetch or fetch_top_news_topic)(city_name)
+        except Exception as e:
+            self._complete_refresh(key, future, error=e)
+        else:
+            self._complete_refresh(key, future, headlines)
+
+    # Returns the cached entry for key and its age in seconds, or (None, None)
+    def _lookup(self, key, force_refresh):
+        with self._lock:
+            entry = None if force_refresh else self._load(key)
+        return entry, (time.time() - entry["fetched_at"] if entry else None)
+
+    def get(self, city_name, force_refresh=False):
+        key = normalize_city_name(city_name)
+        entry, age = self._lookup(key, force_refresh)
+
+        if entry is not None and age < self.ttl:
+            return entry["headlines"]
+
+        future, owner = self._claim_refresh(key)
+        if entry is not None and age < self.ttl + self.stale_ttl:
+            # Serve the stale list now and revalidate in the background
+            if owner:
+                self._executor.submit(self._run_refresh, key, city_name, future)
+            return entry["headlines"]
+
+        if owner:
+            self._run_refresh(key, city_name, future)
+        return future.result()
+
+    # Async counterpart of get; misses are fetched with the async client and share
+    # in-flight refreshes with threaded callers
+    async def aget(self, city_name, force_refresh=False):
+        key = normalize_city_name(city_name)
+        entry, age = self._lookup(key, force_refresh)
+
+        if entry is not None and age < self.ttl:
+            return entry["headlines"]
+
+        future, owner = self._claim_refresh(key)
+        if entry is not None and age < self.ttl + self.stale_ttl:
+            if owner:
+                self._executor.submit(self._run_refresh, key, city_name, future)
+            return entry["headlines"]
+
+        if owner:
+            try:
+                headlines = await (self.afetch or afetch_top_news_topic)(city_name)
+            except Exception as e:
+                self._complete_refresh(key, future, error=e)
+            else:
+                self._complete_refresh(key, future, headlines)
+        return await asyncio.wrap_future(future)
+
+    # Seconds until the cached headlines of a city go stale; 0 when they are not cached or already stale
+    def seconds_fresh(self, city_name):
+        entry, age = self._lookup(normalize_city_name(city_name), False)
+        return max(0, self.ttl - age) if entry is not None else 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_news_cache = None
+_news_cache_lock = threading.Lock()
+
+def get_news_cache():
+    global _news_cache
+    if _news_cache is None:
+        with _news_cache_lock:
+            if _news_cache is None:
+                _news_cache = NewsCache()
+    return _news_cache
+
+# Function to get the top news topics for a city through the shared headline cache
+def fetch_top_news_topic_cached(city_name, force_refresh=False):
+    return get_news_cache().get(city_name, force_refresh=force_refresh)
+
+async def afetch_top_news_topic_cached(city_name, force_refresh=False):
+    return await get_news_cache().aget(city_name, force_refresh=force_refresh)
+
 if __name__ == "__main__":
     
     city = input("Enter the name of the city: ")
     try:
-        top_news = fetch_top_news_topic(city)
+        top_news = fetch_top_news_topic_cached(city)
         save_topics_to_file(top_news, city)
+        save_topics_to_db(top_news, city)
         print(f"Top 5 news topics in {city}:")
         for index, headline in enumerate(top_news, start=1):
             print(f"{index}. {headline}")
@@ -1,8 +1,48 @@
 import praw
 import json
+import argparse
 from datetime import datetime, timedelta
 import os
-import requests
+import time
+import asyncio
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .openrouter_client import post_chat_completion, apost_chat_completion
+    from .llm_cache import get_cache
+    from .db import setup_django
+    from .ingestion_state import get_ingestion_store
+    from .fetch_news_topic import normalize_city_name, fetch_top_news_topic_cached
+    from .scheduler import get_scheduler, set_default_priority, bind_context, BATCH
+    from .metrics import stage, record_upstream
+except ImportError:
+    from openrouter_client import post_chat_completion, apost_chat_completion
+    from llm_cache import get_cache
+    from db import setup_django
+    from ingestion_state import get_ingestion_store
+    from fetch_news_topic import normalize_city_name, fetch_top_news_topic_cached
+    from scheduler import get_scheduler, set_default_priority, bind_context, BATCH
+    from metrics import stage, record_upstream
+
+# PRAW is blocking, so async callers run Reddit work on this many threads at most
+REDDIT_WORKERS = int(os.getenv('REDDIT_WORKERS', 8))
+
+# JSON file mapping normalized city names to the subreddits searched for them
+CITY_SUBREDDITS_FILE = os.getenv('CITY_SUBREDDITS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'city_subreddits.json'))
+
+# Subreddits searched for cities missing from CITY_SUBREDDITS_FILE
+DEFAULT_SUBREDDITS = [name for name in os.getenv('DEFAULT_SUBREDDITS', 'all').split(',') if name.strip()]
+
+# Number of top-level comments taken from each post
+COMMENTS_PER_POST = 5
+
+# Number of comments returned for a topic unless the caller asks for another limit
+COMMENTS_LIMIT = 5
+
+# Reddit's search time_filter windows, narrowest first, with their length in days
+TIME_FILTERS = [("hour", 1 / 24), ("day", 1), ("week", 7), ("month", 31), ("year", 366)]
 
 def configure_reddit_api():
     client_id = os.getenv('REDDIT_CLIENT_ID')
@@ -22,15 +62,38 @@ def configure_reddit_api():
         missing_vars_str = ', '.join(missing_vars)
         raise EnvironmentError(f"Missing required environment variables: {missing_vars_str}")
     
+    # REDDIT_OAUTH_URL and REDDIT_URL point PRAW at another server, e.g. the benchmark stubs
+    urls = {option: os.getenv(name) for option, name in (('oauth_url', 'REDDIT_OAUTH_URL'), ('reddit_url', 'REDDIT_URL'))
+            if os.getenv(name)}
+
     # If all required variables are present, configure the Reddit API
     reddit = praw.Reddit(
         client_id=client_id,
         client_secret=client_secret,
-        user_agent=user_agent
+        user_agent=user_agent,
+        **urls
     )
     return reddit
 
 
+# PRAW clients are not thread safe, so every thread that talks to Reddit gets its own
+_reddit_clients = threading.local()
+_reddit_client_generation = 0
+
+# Function to get the Reddit client of the calling thread; it is configured and
+# authenticated once per thread on first use and reused by that thread afterwards
+def get_reddit_client():
+    if getattr(_reddit_clients, "generation", None) != _reddit_client_generation:
+        _reddit_clients.client = configure_reddit_api()
+        _reddit_clients.generation = _reddit_client_generation
+    return _reddit_clients.client
+
+# Function to forget the Reddit clients of every thread, e.g. after rotating credentials
+def reset_reddit_client():
+    global _reddit_client_generation
+    _reddit_client_generation += 1
+
+
 # extracting keywords function
 # def extract_keywords(title):
 #     words = re.findall(r'\w+', title.lower())
@@ -40,22 +103,13 @@ def configure_reddit_api():
 #     return ' '.join(keywords)
 
 # rated #2 in translation
-def generate_search_prompt(topic, model="openai/gpt-4o-mini-2024-07-18"):
+def build_search_prompt_payload(topic, model):
     prompt = f"""
 Please generate a JSON object with a single field named "query". The value of this field should be a concise and effective search query for the topic '{topic}' to use on Reddit. Return only the JSON object without any additional text, explanations, or formatting. The output should look exactly like this: 
 {{ "query": "your search query here" }}
 """
 
-    openrouter_api_key = os.getenv('OPENROUTER_API_KEY')
-    if not openrouter_api_key:
-        raise EnvironmentError("Missing required environment variable: OPENROUTER_API_KEY")
-
-    headers = {
-        "Authorization": f"Bearer {openrouter_api_key}",
-        "Content-Type": "application/json"
-    }
-
-    data = {
+    return {
         "model": model,
         "messages": [
             {"role": "user", "content": prompt}
@@ -66,80 +120,294 @@ Please generate a JSON object with a single field named "query". The value of th
         "presence_penalty": 0,
     }
 
-    response = requests.post(
-        url="https://openrouter.ai/api/v1/chat/completions",
-        headers=headers,
-        data=json.dumps(data)
-    )
+def get_openrouter_api_key():
+    openrouter_api_key = os.getenv('OPENROUTER_API_KEY')
+    if not openrouter_api_key:
+        raise EnvironmentError("Missing required environment variable: OPENROUTER_API_KEY")
+    return openrouter_api_key
 
-    if response.status_code == 200:
-        result = response.json()
-        search_prompt = result['choices'][0]['message']['content'].strip()
-        try:
-            # Attempt to parse the JSON response directly
-            search_prompt_json = json.loads(search_prompt)
-            return search_prompt_json['query']
-        except (KeyError, json.JSONDecodeError):
-            raise RuntimeError("Error processing the response: invalid JSON or missing 'query' field.")
-    else:
+def parse_search_prompt(search_prompt):
+    try:
+        # Attempt to parse the JSON response directly
+        search_prompt_json = json.loads(search_prompt)
+        return search_prompt_json['query']
+    except (KeyError, TypeError, json.JSONDecodeError):
+        raise RuntimeError("Error processing the response: invalid JSON or missing 'query' field.")
+
+def read_search_prompt_response(response):
+    if response.status_code != 200:
         raise RuntimeError(f"API call failed with status code {response.status_code}: {response.text}")
+    result = response.json()
+    return result['choices'][0]['message']['content'].strip()
+
+def generate_search_prompt(topic, model="openai/gpt-4o-mini-2024-07-18", bypass_cache=False):
+    openrouter_api_key = get_openrouter_api_key()
+    data = build_search_prompt_payload(topic, model)
+
+    cache = get_cache()
+    with stage("search_prompt"):
+        search_prompt = cache.get(data, bypass=bypass_cache)
+        if search_prompt is not None:
+            return parse_search_prompt(search_prompt)
+
+        search_prompt = read_search_prompt_response(post_chat_completion(data, api_key=openrouter_api_key))
+        query = parse_search_prompt(search_prompt)
+
+    # Only responses that parsed are worth replaying. Hits are not stored again, which
+    # would restart their TTL and keep them from ever being refreshed.
+    cache.set(data, search_prompt)
+    return query
+
+# Async counterpart of generate_search_prompt, used by the async views
+async def agenerate_search_prompt(topic, model="openai/gpt-4o-mini-2024-07-18", bypass_cache=False):
+    openrouter_api_key = get_openrouter_api_key()
+    data = build_search_prompt_payload(topic, model)
+
+    cache = get_cache()
+    with stage("search_prompt"):
+        search_prompt = cache.get(data, bypass=bypass_cache)
+        if search_prompt is not None:
+            return parse_search_prompt(search_prompt)
+
+        search_prompt = read_search_prompt_response(await apost_chat_completion(data, api_key=openrouter_api_key))
+        query = parse_search_prompt(search_prompt)
+    cache.set(data, search_prompt)
+    return query
+
+
+def build_comment_data(search_query, submission, comment, post_age, current_time):
+    return {
+        'newsTopic': search_query.split()[0],  
+        'Subreddit': f"r/{submission.subreddit}",
+        'PostTitle': submission.title,
+        'CommentBody': comment.body,
+        'Author': comment.author.name if comment.author else 'Unknown',
+        'Score': comment.score,
+        'PostAge': post_age.days,
+        'CommentAge': (current_time - datetime.fromtimestamp(comment.created_utc)).days,
+        'CommentId': comment.id,
+        'PostId': submission.id,
+        'PostCreated': submission.created_utc,
+        'CommentCreated': comment.created_utc,
+    }
+
+# Function to pass the quota Reddit reported on its last response to the scheduler
+def _record_reddit_quota():
+    try:
+        limits = get_reddit_client().auth.limits
+        remaining, reset_timestamp = limits.get('remaining'), limits.get('reset_timestamp')
+        reset_in = reset_timestamp - time.time() if reset_timestamp is not None else None
+        get_scheduler().update_quota("reddit", float(remaining) if remaining is not None else None, reset_in)
+    except (AttributeError, TypeError, ValueError):
+        pass
 
+# Function to pick the narrowest search time_filter that still covers max_age_days,
+# so Reddit drops older posts before they are sent
+def time_filter_for_age(max_age_days):
+    for time_filter, days in TIME_FILTERS:
+        if max_age_days <= days:
+            return time_filter
+    return "all"
 
-def fetch_comments_from_reddit(subreddit, search_query, sort, limit, max_age, current_time):
+# Only top-level comments are read, best first, and the search stops as soon as
+# `limit` qualifying comments have been collected.
+# When an IngestionState is given only new work is done: submissions whose comment
+# count is unchanged since the last fetch are skipped and comments already ingested
+# are left out of the result.
+def fetch_comments_from_reddit(subreddit, search_query, sort, limit, max_age, current_time, state=None):
     try:
+        scheduler = get_scheduler()
         comments_data = []
-        reddit_search = subreddit.search(search_query, sort=sort, limit=limit)
+        time_filter = time_filter_for_age(max_age.total_seconds() / 86400)
+        # One listing request for the search, then one per submission whose comments are loaded
+        scheduler.acquire("reddit")
+        with stage("reddit_search"):
+            reddit_search = list(subreddit.search(search_query, sort=sort, time_filter=time_filter, limit=limit))
+        record_upstream("reddit", 200)
         for submission in reddit_search:
-            post_title = submission.title
-            post_id = submission.id
-
             post_time = datetime.fromtimestamp(submission.created_utc)
             post_age = current_time - post_time
 
+            # time_filter windows are coarser than max_age
             if post_age > max_age:
                 continue
 
-            reddit = configure_reddit_api()
+            if state is not None and not state.has_new_comments(submission.id, submission.num_comments):
+                continue
+
+            # The search listing already carries the submission, so its comments
+            # are loaded straight from it instead of refetching it by id. Setting
+            # the sort before the first access makes Reddit return them by score.
+            submission.comment_sort = "top"
+            scheduler.acquire("reddit")
+            with stage("reddit_comments"):
+                submission.comments.replace_more(limit=0)
+            record_upstream("reddit", 200)
+            _record_reddit_quota()
 
-            submission = reddit.submission(id=post_id)
-            submission.comments.replace_more(limit=0)
+            taken = 0
+            for comment in submission.comments:
+                if state is not None and state.is_seen_comment(comment.id):
+                    continue
+                comments_data.append(build_comment_data(search_query, submission, comment, post_age, current_time))
+                taken += 1
+                if taken == COMMENTS_PER_POST:
+                    break
 
-            for comment in submission.comments.list()[:5]:
-                comments_data.append({
-                    'newsTopic': search_query.split()[0],  
-                    'Subreddit': f"r/{submission.subreddit}",
-                    'PostTitle': post_title,
-                    'CommentBody': comment.body,
-                    'Author': comment.author.name if comment.author else 'Unknown',
-                    'Score': comment.score,
-                    'PostAge': post_age.days,
-                    'CommentAge': (current_time - datetime.fromtimestamp(comment.created_utc)).days
-                })
+            if state is not None:
+                state.mark_submission(submission.id, submission.num_comments, submission.created_utc)
+
+            if len(comments_data) >= limit:
+                break
 
         return comments_data
     except Exception as e:
+        # prawcore errors carry the HTTP response
+        record_upstream("reddit", getattr(getattr(e, 'response', None), 'status_code', 'error'))
         print(f"Error fetching from reddit: {e}")
     
 
-def fetch_comments_for_topic(topic, city_name, limit=5, max_age_days=45):
+# Function to get the subreddits searched for a city, in order of preference
+def subreddits_for_city(city_name):
     try:
-        reddit = configure_reddit_api()
-        current_time = datetime.now()
-        max_age = timedelta(days=max_age_days)
-        search_query = f"{generate_search_prompt(topic)} {city_name}"
+        with open(CITY_SUBREDDITS_FILE) as f:
+            city_subreddits = json.load(f)
+    except (OSError, ValueError):
+        city_subreddits = {}
+    return city_subreddits.get(normalize_city_name(city_name)) or DEFAULT_SUBREDDITS
 
-        comments_data = []
 
-        subreddit_name = "all"
-        subreddit = reddit.subreddit(subreddit_name)
+class SubredditStats:
+    """Latency and yield of every subreddit searched since the process started."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, source):
+        with self._lock:
+            totals = self._totals.setdefault(source["subreddit"], {"searches": 0, "failures": 0, "seconds": 0.0,
+                                                                     "comments": 0, "unique_comments": 0})
+            totals["searches"] += 1
+            totals["failures"] += int(source["failed"])
+            totals["seconds"] += source["seconds"]
+            totals["comments"] += source["comments"]
+            totals["unique_comments"] += source["unique_comments"]
+
+    # Per-subreddit averages; a subreddit whose unique yield stays near zero is
+    # not worth querying for that city
+    def report(self):
+        with self._lock:
+            return {name: dict(totals,
+                               avg_seconds=totals["seconds"] / totals["searches"],
+                               unique_comments_per_search=totals["unique_comments"] / totals["searches"])
+                    for name, totals in self._totals.items()}
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+subreddit_stats = SubredditStats()
+
+
+def _timed_search(subreddit_name, search_query, sort, limit, max_age, current_time, state):
+    started = time.perf_counter()
+    subreddit = get_reddit_client().subreddit(subreddit_name)
+    comments_data = fetch_comments_from_reddit(subreddit, search_query, sort, limit, max_age, current_time, state)
+    return comments_data, time.perf_counter() - started
+
+
+# Separate from _reddit_executor, whose threads wait on these searches
+_search_executor = ThreadPoolExecutor(max_workers=REDDIT_WORKERS * 2, thread_name_prefix="reddit-search")
+
+# Searches every subreddit of the city at the same time and merges the results,
+# dropping posts already found in a subreddit earlier in the list. One entry per
+# subreddit with its latency and yield is appended to `sources` when a list is given.
+# Returns the comments and whether any subreddit could be searched.
+def _search_reddit(topic, city_name, limit, max_age_days, search_prompt, state=None, sources=None):
+    current_time = datetime.now()
+    max_age = timedelta(days=max_age_days)
+    if search_prompt is None:
+        search_prompt = generate_search_prompt(topic)
+    search_query = f"{search_prompt} {city_name}"
+
+    subreddit_names = subreddits_for_city(city_name)
+
+    # Relevance results are preferred; hot is only the fallback when they are empty.
+    # Both searches run at the same time so the fallback costs no extra latency.
+    # Once a topic has stored comments there is nothing to fall back for. The hot
+    # searches record what they saw on copies of the state, kept only if used;
+    # the copies are taken before any search starts updating the state.
+    with_hot = state is None or not state.comments
+    hot_states = [state.copy() if state is not None and with_hot else None for _ in subreddit_names]
+
+    searches = []
+    for subreddit_name, hot_state in zip(subreddit_names, hot_states):
+        hot = None
+        if with_hot:
+            hot = _search_executor.submit(bind_context(_timed_search), subreddit_name, search_query, 'hot', limit, max_age, current_time, hot_state)
+        relevance = _search_executor.submit(bind_context(_timed_search), subreddit_name, search_query, 'relevance', limit, max_age, current_time, state)
+        searches.append((subreddit_name, relevance, hot, hot_state))
+
+    comments_data = []
+    seen_posts = set()
+    succeeded = False
+    for subreddit_name, relevance, hot, hot_state in searches:
+        found, seconds = relevance.result()
+        if not found and hot is not None:
+            found, hot_seconds = hot.result()
+            seconds = max(seconds, hot_seconds)
+            if state is not None:
+                state.submissions.update(hot_state.submissions)
+
+        succeeded = succeeded or found is not None
+        unique = [comment for comment in found or [] if comment['PostId'] not in seen_posts]
+        seen_posts.update(comment['PostId'] for comment in found or [])
+        comments_data.extend(unique)
+
+        source = {"subreddit": subreddit_name,
+                  "seconds": seconds,
+                  "failed": found is None,
+                  "comments": len(found or []),
+                  "unique_comments": len(unique)}
+        subreddit_stats.record(source)
+        if sources is not None:
+            sources.append(source)
+
+    return comments_data, succeeded
+
+
+# Function to fetch only what is new on Reddit since the last fetch of this (topic, city)
+# and merge it into the stored comment set. Within the minimum refresh interval the
+# stored set is returned without calling Reddit at all. When every search failed the
+# state is left untouched, so the next request tries Reddit again.
+def _fetch_comments_incrementally(topic, city_name, limit, max_age_days, search_prompt, sources):
+    store = get_ingestion_store()
+    with store.lock(topic, city_name):
+        state = store.load(topic, city_name)
+        if state.is_fresh():
+            return state.top(limit)
+
+        new_comments, succeeded = _search_reddit(topic, city_name, limit, max_age_days, search_prompt, state, sources)
+        if not succeeded:
+            return store.load(topic, city_name).top(limit)
+        state.merge(new_comments)
+        state.prune(timedelta(days=max_age_days).total_seconds())
+        store.save(state)
+        return state.top(limit)
+
+
+# search_prompt can be passed when the caller has already generated it for the topic.
+# With incremental=True submissions and comments seen on earlier fetches are not
+# fetched again (see ingestion_state). Pass a list as `sources` to get the latency
+# and yield of each subreddit searched.
+def fetch_comments_for_topic(topic, city_name, limit=COMMENTS_LIMIT, max_age_days=45, search_prompt=None, incremental=False, sources=None):
+    try:
+        if incremental:
+            return _fetch_comments_incrementally(topic, city_name, limit, max_age_days, search_prompt, sources)
+
+        comments_data, _ = _search_reddit(topic, city_name, limit, max_age_days, search_prompt, sources=sources)
 
-        # First try with relevance
-        comments_data = fetch_comments_from_reddit(subreddit, search_query, 'relevance', limit, max_age, current_time)
-        
-        # If no relevant comments are found, try with hot
-        if not comments_data:
-            comments_data = fetch_comments_from_reddit(subreddit, search_query, 'hot', limit, max_age, current_time)
-        
         # Sort comments by score and return the top comments
         comments_data.sort(key=lambda x: x['Score'], reverse=True)
         return comments_data[:limit]
@@ -147,23 +415,45 @@ def fetch_comments_for_topic(topic, city_name, limit=5, max_age_days=45):
         print(f"Error fetching comments  i am hereee: {e}") 
         return []  # Return an empty list on failure
 
-def save_comments_to_file(comments, filename):
-    with open(filename, 'w') as f:
-        json.dump(comments, f, indent=4)
+_reddit_executor = ThreadPoolExecutor(max_workers=REDDIT_WORKERS, thread_name_prefix="reddit")
 
-def main():
+# Async counterpart of fetch_comments_for_topic: the search prompt is generated with the
+# async OpenRouter client and the blocking PRAW calls run on a bounded thread pool
+async def afetch_comments_for_topic(topic, city_name, limit=COMMENTS_LIMIT, max_age_days=45, incremental=False, sources=None):
+    try:
+        search_prompt = await agenerate_search_prompt(topic)
+    except Exception as e:
+        print(f"Error generating search prompt: {e}")
+        return []
 
-    file_path = 'data/kathmandu.json'
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _reddit_executor,
+        partial(fetch_comments_for_topic, topic, city_name, limit, max_age_days,
+                search_prompt=search_prompt, incremental=incremental, sources=sources)
+    )
 
-    city_name = os.path.basename(file_path).replace('.json', '')
+def main(city_name):
+    setup_django()
+    from app import store
+    # Topics stored for the city, e.g. by the warm_cities command, or its current headlines
+    topics = store.load_topics(city_name)
+    if not topics:
+        topics = fetch_top_news_topic_cached(city_name)
+        store.save_topics(city_name, topics)
 
-    with open(file_path) as f:
-        topics = json.load(f)
-    
     for topic in topics:
-        comments = fetch_comments_for_topic(topic, city_name)
-        save_comments_to_file(comments, f'data/reddit/{topic.replace(" ", "_")}_comments.csv')
-        print(f"Saved comments for topic '{topic}' to data/{topic.replace(' ', '_')}_comments.csv")
+        comments = fetch_comments_for_topic(topic, city_name, incremental=True)
+        store.save_comments(city_name, topic, comments)
+        print(f"Saved {len(comments)} comments for topic '{topic}' in {city_name}")
+
+    for subreddit_name, totals in subreddit_stats.report().items():
+        print(f"r/{subreddit_name}: {totals['searches']} searches, {totals['avg_seconds']:.2f}s avg, "
+              f"{totals['unique_comments_per_search']:.1f} unique comments per search")
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Fetch the reddit discussions about the headlines of a city")
+    parser.add_argument('--city', required=True, help="city whose stored topics, or current headlines, are searched")
+    args = parser.parse_args()
+    set_default_priority(BATCH)
+    main(args.city)
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+
+try:
+    from .fetch_news_topic import normalize_city_name
+except ImportError:
+    from fetch_news_topic import normalize_city_name
+
+INGESTION_STATE_DIR = os.getenv('INGESTION_STATE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ingestion'))
+
+# A (topic, city) fetched more recently than this many seconds is served from its stored set
+MIN_REFRESH_INTERVAL = float(os.getenv('REDDIT_MIN_REFRESH_INTERVAL', 10 * 60))
+
+# Number of top scored comments kept in the stored set of a (topic, city)
+STORED_COMMENTS_LIMIT = int(os.getenv('REDDIT_STORED_COMMENTS_LIMIT', 50))
+
+
+class IngestionState:
+    """What has already been ingested from Reddit for one (topic, city).
+
+    `submissions` maps submission ids to the comment count seen at the last fetch, so
+    a submission whose count has not changed does not need its comment tree refetched.
+    """
+
+    def __init__(self, key, data=None):
+        data = data or {}
+        self.key = key
+        self.submissions = data.get("submissions", {})
+        self.comment_ids = set(data.get("comment_ids", []))
+        self.comments = data.get("comments", [])
+        self.last_fetched = data.get("last_fetched")
+
+    def is_fresh(self, min_interval=MIN_REFRESH_INTERVAL, now=None):
+        if self.last_fetched is None:
+            return False
+        return (now or time.time()) - self.last_fetched < min_interval
+
+    # Seconds until the stored set is due for a refresh; 0 when it is already due
+    def seconds_fresh(self, min_interval=MIN_REFRESH_INTERVAL, now=None):
+        if self.last_fetched is None:
+            return 0
+        return max(0, min_interval - ((now or time.time()) - self.last_fetched))
+
+    def has_new_comments(self, submission_id, num_comments):
+        seen = self.submissions.get(submission_id)
+        return seen is None or num_comments != seen["num_comments"]
+
+    def is_seen_comment(self, comment_id):
+        return comment_id in self.comment_ids
+
+    def mark_submission(self, submission_id, num_comments, created_utc):
+        self.submissions[submission_id] = {"num_comments": num_comments, "created_utc": created_utc}
+
+    # Adds newly fetched comments to the stored set, keeping the top `keep` by score
+    def merge(self, new_comments, keep=STORED_COMMENTS_LIMIT, now=None):
+        for comment in new_comments:
+            if comment.get('CommentId'):
+                self.comment_ids.add(comment['CommentId'])
+        known = {comment.get('CommentId') for comment in self.comments if comment.get('CommentId')}
+        self.comments.extend(c for c in new_comments if not c.get('CommentId') or c['CommentId'] not in known)
+        self.comments.sort(key=lambda x: x['Score'], reverse=True)
+        del self.comments[keep:]
+        self.last_fetched = now or time.time()
+
+    # Forgets submissions older than max_age seconds, and the stored comments on them;
+    # they can no longer pass the age filter. Comments stored without their post's
+    # creation time are kept.
+    def prune(self, max_age, now=None):
+        cutoff = (now or time.time()) - max_age
+        self.submissions = {sid: seen for sid, seen in self.submissions.items() if seen["created_utc"] >= cutoff}
+        kept, expired = [], []
+        for comment in self.comments:
+            (expired if comment.get('PostCreated', cutoff) < cutoff else kept).append(comment)
+        self.comments = kept
+        self.comment_ids.difference_update(c['CommentId'] for c in expired if c.get('CommentId'))
+
+    # Independent copy, for a search whose results may be thrown away
+    def copy(self):
+        return IngestionState(self.key, json.loads(json.dumps(self.to_dict())))
+
+    # The best `limit` stored comments, with PostAge and CommentAge in days as of now
+    def top(self, limit, now=None):
+        now = now or time.time()
+        comments = []
+        for comment in self.comments[:limit]:
+            comment = dict(comment)
+            for age, created in (('PostAge', 'PostCreated'), ('CommentAge', 'CommentCreated')):
+                if comment.get(created) is not None:
+                    comment[age] = int((now - comment[created]) // 86400)
+            comments.append(comment)
+        return comments
+
+    def to_dict(self):
+        return {
+            "submissions": self.submissions,
+            "comment_ids": sorted(self.comment_ids),
+            "comments": self.comments,
+            "last_fetched": self.last_fetched,
+        }
+
+
+class IngestionStore:
+    """Keeps one JSON file of IngestionState per (topic, city)."""
+
+    def __init__(self, state_dir=INGESTION_STATE_DIR):
+        self.state_dir = state_dir
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def key(self, topic, city_name):
+        topic_hash = hashlib.sha1(topic.strip().encode("utf-8")).hexdigest()[:16]
+        return f"{normalize_city_name(city_name)}__{topic_hash}"
+
+    def _path(self, key):
+        return os.path.join(self.state_dir, f"{key}.json")
+
+    # Serializes load/update/save of the same (topic, city) within the process
+    @contextmanager
+    def lock(self, topic, city_name):
+        key = self.key(topic, city_name)
+        with self._locks_lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            yield
+
+    def load(self, topic, city_name):
+        key = self.key(topic, city_name)
+        try:
+            with open(self._path(key)) as f:
+                return IngestionState(key, json.load(f))
+        except (OSError, ValueError):
+            return IngestionState(key)
+
+    def save(self, state):
+        os.makedirs(self.state_dir, exist_ok=True)
+        tmp_path = self._path(state.key) + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state.to_dict(), f)
+        os.replace(tmp_path, self._path(state.key))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_ingestion_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = IngestionStore()
+    return _store
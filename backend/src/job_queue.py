@@ -0,0 +1,97 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .scheduler import use_priority, BATCH
+except ImportError:
+    from scheduler import use_priority, BATCH
+
+# Number of jobs run at the same time
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+
+# Finished jobs are kept this many seconds so clients can poll for the result
+JOB_RESULT_TTL = float(os.getenv('JOB_RESULT_TTL', 60 * 60))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueue:
+    """In-process job store backed by a thread pool.
+
+    `handler` is called with the arguments given to submit(). Submitting the same
+    arguments while an identical job is still queued or running returns that job
+    instead of starting a new one.
+    """
+
+    def __init__(self, handler, max_workers=JOB_WORKERS, result_ttl=JOB_RESULT_TTL):
+        self.handler = handler
+        self.result_ttl = result_ttl
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="job")
+
+    def submit(self, *args):
+        with self._lock:
+            self._prune()
+            job_id = self._active.get(args)
+            if job_id is not None:
+                return dict(self._jobs[job_id])
+
+            job = {
+                "id": uuid.uuid4().hex,
+                "status": QUEUED,
+                "result": None,
+                "error": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+            }
+            self._jobs[job["id"]] = job
+            self._active[args] = job["id"]
+        self._executor.submit(self._run, job["id"], args)
+        return dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def stats(self):
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            return counts
+
+    def _run(self, job_id, args):
+        with self._lock:
+            job = self._jobs[job_id]
+            job["status"] = RUNNING
+            job["started_at"] = time.time()
+        try:
+            # Nobody is waiting on the response, so interactive requests go first
+            with use_priority(BATCH):
+                result = self.handler(*args)
+        except Exception as e:
+            print(f"Error running job {job_id}: {e}")
+            status, result, error = FAILED, None, str(e)
+        else:
+            status, error = SUCCEEDED, None
+        with self._lock:
+            job.update(status=status, result=result, error=error, finished_at=time.time())
+            self._active.pop(args, None)
+
+    # Drops finished jobs older than result_ttl; called with the lock held
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["finished_at"] is not None and job["finished_at"] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
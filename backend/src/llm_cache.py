@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_CACHE_PATH = os.getenv('LLM_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'llm_cache.sqlite3'))
+
+# Entries older than this many seconds are treated as misses
+DEFAULT_TTL = float(os.getenv('LLM_CACHE_TTL', 24 * 60 * 60))
+
+# Least recently used entries are evicted beyond this many rows
+DEFAULT_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 5000))
+
+
+# Function to build the cache key from everything that affects the model output:
+# model, messages and sampling params
+def make_cache_key(payload):
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed cache of chat completion responses keyed by a hash of the request payload."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, enabled=True):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            if self.path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, content TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_accessed ON llm_cache (last_accessed)")
+            self._conn.commit()
+        return self._conn
+
+    # Returns the cached content for payload, or None on a miss, an expired entry or bypass
+    def get(self, payload, bypass=False):
+        if not self.enabled or bypass:
+            return None
+
+        key = make_cache_key(payload)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT content, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                if row is not None:
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    conn.commit()
+                self.misses += 1
+                return None
+            conn.execute("UPDATE llm_cache SET last_accessed = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+            return row[0]
+
+    # Stores content for payload and evicts the least recently used entries over max_entries
+    def set(self, payload, content):
+        if not self.enabled or content is None:
+            return
+
+        key = make_cache_key(payload)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, content, created_at, last_accessed) VALUES (?, ?, ?, ?)",
+                (key, content, now, now)
+            )
+            if self.max_entries is not None:
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    "SELECT key FROM llm_cache ORDER BY last_accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM llm_cache")
+            conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            size = self._connection().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] if self.enabled else 0
+        return {"hits": self.hits, "misses": self.misses, "entries": size}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# Function to get the process-wide cache; LLM_CACHE_DISABLED=1 turns caching off
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache(enabled=os.getenv('LLM_CACHE_DISABLED', '').lower() not in ('1', 'true', 'yes'))
+    return _cache
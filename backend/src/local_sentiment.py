@@ -0,0 +1,151 @@
+import os
+import re
+import numpy as np
+
+try:
+    from .metrics import stage
+except ImportError:
+    from metrics import stage
+
+# Lexicon based sentiment of the fetched comments, computed locally in a few
+# milliseconds. It is the first answer shown while the OpenRouter analysis runs and
+# the sentiment reported when that call fails or times out.
+
+SENTIMENT_LABELS = ("positive", "neutral", "negative")
+
+# Comments (and the whole discussion) scoring within this distance of 0 are neutral
+NEUTRAL_THRESHOLD = float(os.getenv('LOCAL_SENTIMENT_NEUTRAL_THRESHOLD', 0.05))
+
+# Smoothing of the summed word valences into [-1, 1]; larger values need more words to saturate
+NORMALIZATION_ALPHA = 15.0
+
+# A negation flips the valence of this many following words, scaled by NEGATION_FACTOR
+NEGATION_WINDOW = 3
+NEGATION_FACTOR = 0.75
+INTENSIFIER_FACTOR = 1.5
+
+# Number of comments at which the confidence is halved; few comments give little evidence
+CONFIDENCE_PRIOR = 2.0
+
+# Word valences from -3 (very negative) to 3 (very positive), tuned for comments on city news
+LEXICON = {
+    "good": 2, "great": 3, "excellent": 3, "amazing": 3, "awesome": 3, "fantastic": 3, "wonderful": 3,
+    "best": 3, "better": 2, "nice": 2, "love": 3, "loved": 3, "like": 1, "happy": 2, "glad": 2,
+    "proud": 2, "beautiful": 2, "clean": 2, "safe": 2, "safer": 2, "fixed": 2, "improve": 2,
+    "improved": 2, "improvement": 2, "improving": 2, "progress": 2, "success": 2, "successful": 2,
+    "helpful": 2, "efficient": 2, "support": 1, "supported": 1, "welcome": 2, "thanks": 2, "thank": 2,
+    "hope": 1, "hopeful": 2, "benefit": 2, "agree": 1, "finally": 1, "well": 1, "fair": 1, "easy": 1,
+    "right": 1, "useful": 2, "working": 1, "works": 1, "impressive": 3, "reliable": 2, "smooth": 2,
+    "bad": -2, "worse": -2, "worst": -3, "terrible": -3, "awful": -3, "horrible": -3, "poor": -2,
+    "hate": -3, "sad": -2, "angry": -2, "disappointed": -2, "disappointing": -2, "corrupt": -3,
+    "corruption": -3, "dirty": -2, "pollution": -2, "polluted": -2, "broken": -2, "dangerous": -2,
+    "unsafe": -2, "delay": -1, "delayed": -2, "delays": -1, "fail": -2, "failed": -2, "failure": -2,
+    "fails": -2, "problem": -1, "problems": -2, "issue": -1, "issues": -1, "waste": -2, "wasted": -2,
+    "useless": -2, "mess": -2, "chaos": -2, "crisis": -2, "disaster": -3, "shame": -2, "shameful": -3,
+    "ridiculous": -2, "scam": -3, "stupid": -2, "slow": -1, "expensive": -1, "shortage": -2,
+    "lack": -1, "accident": -2, "accidents": -2, "killed": -3, "death": -3, "dead": -3, "died": -3,
+    "worry": -1, "worried": -2, "fear": -2, "blame": -2, "sucks": -2, "pathetic": -3, "joke": -1,
+    "incompetent": -3, "negligence": -3, "suffer": -2, "suffering": -2, "protest": -1, "unfair": -2,
+    "nightmare": -3, "traffic": -1, "congestion": -2, "potholes": -2, "pothole": -2, "flooding": -2,
+}
+
+NEGATORS = {"not", "no", "never", "none", "nothing", "nobody", "neither", "nor", "without", "hardly", "barely"}
+INTENSIFIERS = {"very", "really", "extremely", "so", "too", "totally", "absolutely", "incredibly", "super"}
+
+TOKEN_PATTERN = re.compile(r"[a-z']+")
+
+_VOCABULARY = {word: index for index, word in enumerate(LEXICON)}
+_VALENCES = np.array(list(LEXICON.values()), dtype=float)
+
+
+def _is_negator(token):
+    return token in NEGATORS or token.endswith("n't")
+
+# Function to find the lexicon words of each text. Returns three parallel arrays:
+# the text each hit belongs to, its lexicon index and its negation/intensifier multiplier.
+def _lexicon_hits(texts):
+    text_indices, word_indices, multipliers = [], [], []
+    for text_index, text in enumerate(texts):
+        negated_for = 0
+        intensity = 1.0
+        for token in TOKEN_PATTERN.findall((text or "").lower()):
+            if _is_negator(token):
+                negated_for = NEGATION_WINDOW
+                continue
+            if token in INTENSIFIERS:
+                intensity = INTENSIFIER_FACTOR
+                continue
+            word_index = _VOCABULARY.get(token)
+            if word_index is not None:
+                text_indices.append(text_index)
+                word_indices.append(word_index)
+                multipliers.append(intensity * (-NEGATION_FACTOR if negated_for else 1.0))
+            intensity = 1.0
+            negated_for = max(0, negated_for - 1)
+    return (np.array(text_indices, dtype=np.intp),
+            np.array(word_indices, dtype=np.intp),
+            np.array(multipliers, dtype=float))
+
+
+# Function to score each text from -1 (negative) to 1 (positive)
+def score_texts(texts):
+    text_indices, word_indices, multipliers = _lexicon_hits(texts)
+    totals = np.bincount(text_indices, weights=_VALENCES[word_indices] * multipliers, minlength=len(texts))
+    return totals / np.sqrt(totals * totals + NORMALIZATION_ALPHA)
+
+
+# Function to weight comments by their reddit score: upvoted comments count more,
+# with diminishing returns, and downvoted ones less
+def comment_weights(scores):
+    scores = np.asarray(scores, dtype=float)
+    return np.where(scores >= 0, 1 + np.log1p(np.clip(scores, 0, None)), 1 / (1 + np.log1p(np.clip(-scores, 0, None))))
+
+
+# Function to read a comment's reddit score, 0 when missing or malformed
+def reddit_score(comment):
+    try:
+        return float(comment.get('Score') or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _labels(scores):
+    return np.where(scores >= NEUTRAL_THRESHOLD, 0, np.where(scores <= -NEUTRAL_THRESHOLD, 2, 1))
+
+
+# Function to get the sentiment of a whole discussion: the score-weighted mean of
+# the comment scores, its label and a confidence from 0 to 1 (the weighted share of
+# comments agreeing with the label, reduced when there are only a few comments)
+def score_discussion(comments):
+    with stage("local_sentiment"):
+        return _score_discussion(comments)
+
+def _score_discussion(comments):
+    if not comments:
+        return {"label": "neutral", "score": 0.0, "confidence": 0.0, "comments": 0,
+                "counts": {label: 0 for label in SENTIMENT_LABELS}}
+
+    scores = score_texts([comment.get('CommentBody', '') for comment in comments])
+    weights = comment_weights([reddit_score(comment) for comment in comments])
+    labels = _labels(scores)
+
+    discussion_score = float(np.dot(weights, scores) / weights.sum())
+    label = int(_labels(np.array([discussion_score]))[0])
+    agreement = float(weights[labels == label].sum() / weights.sum())
+    confidence = agreement * len(comments) / (len(comments) + CONFIDENCE_PRIOR)
+    counts = np.bincount(labels, minlength=len(SENTIMENT_LABELS))
+
+    return {"label": SENTIMENT_LABELS[label],
+            "score": round(discussion_score, 4),
+            "confidence": round(confidence, 4),
+            "comments": len(comments),
+            "counts": {name: int(count) for name, count in zip(SENTIMENT_LABELS, counts)}}
+
+
+# Function to render a score_discussion result like the model's answer: the label
+# followed by a short reasoning
+def format_sentiment(result):
+    counts = result["counts"]
+    return (f"{result['label'].capitalize()}. Local estimate from {result['comments']} comments weighted by score "
+            f"(confidence {result['confidence']:.2f}): {counts['positive']} positive, {counts['neutral']} neutral "
+            f"and {counts['negative']} negative.")
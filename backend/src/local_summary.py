@@ -0,0 +1,160 @@
+import os
+import re
+import numpy as np
+
+try:
+    from .compaction import strip_boilerplate
+    from .local_sentiment import comment_weights, reddit_score
+    from .metrics import stage
+except ImportError:
+    from compaction import strip_boilerplate
+    from local_sentiment import comment_weights, reddit_score
+    from metrics import stage
+
+# Extractive summary and actionable needs computed locally from the comments, served
+# instead of the model's answer when OpenRouter misses the latency SLO or fails.
+# Sentences are ranked with TextRank over their TF-IDF cosine similarities, biased
+# towards upvoted comments.
+
+SUMMARY_SENTENCES = int(os.getenv('LOCAL_SUMMARY_SENTENCES', 3))
+ACTIONABLE_NEEDS_LIMIT = int(os.getenv('LOCAL_ACTIONABLE_NEEDS_LIMIT', 5))
+
+# Sentences with fewer words carry too little content to be picked
+MIN_SENTENCE_WORDS = 4
+# Sentences at least this similar to one already picked are skipped
+DUPLICATE_SIMILARITY = 0.8
+
+DAMPING = 0.85
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-6
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+|\n+")
+WORD_PATTERN = re.compile(r"[a-z][a-z']+")
+
+STOPWORDS = {
+    "a", "about", "after", "all", "also", "am", "an", "and", "any", "are", "as", "at", "be", "because", "been",
+    "before", "being", "but", "by", "can", "could", "did", "do", "does", "even", "first", "for", "from", "get",
+    "got", "had", "has", "have", "he", "her", "here", "him", "his", "how", "i", "if", "in", "into", "is", "it",
+    "it's", "its", "just", "like", "many", "me", "more", "much", "must", "my", "no", "not", "now", "of", "on",
+    "one", "only", "or", "other", "our", "out", "should", "so", "some", "still", "such", "than", "that", "the",
+    "their", "them", "then", "there", "these", "they", "this", "those", "to", "too", "up", "us", "very", "was",
+    "we", "were", "what", "when", "where", "which", "who", "why", "will", "with", "would", "yet", "you", "your",
+}
+
+# Phrases that mark a request or recommendation, and verbs that start one in the imperative
+NEED_PATTERN = re.compile(
+    r"\b(should|shouldn't|must|need to|needs to|needed|have to|has to|ought to|please|would be better|"
+    r"why not|why don't|why can't|time to|hope they|it's time|requires?|demand)\b", re.IGNORECASE)
+IMPERATIVE_VERBS = {
+    "fix", "build", "repair", "stop", "start", "make", "ban", "improve", "add", "remove", "increase", "reduce",
+    "hire", "provide", "enforce", "invest", "install", "open", "close", "clean", "plan", "fund", "allow", "let",
+}
+
+
+# Function to split the cleaned comment bodies into sentences, keeping the weight of
+# the comment each sentence comes from
+def split_sentences(comments):
+    sentences, weights = [], []
+    comment_weight = comment_weights([reddit_score(comment) for comment in comments]) if comments else []
+    for comment, weight in zip(comments, comment_weight):
+        for sentence in SENTENCE_PATTERN.split(strip_boilerplate(comment.get('CommentBody') or "")):
+            sentence = sentence.strip()
+            if len(sentence.split()) >= MIN_SENTENCE_WORDS:
+                sentences.append(sentence)
+                weights.append(weight)
+    return sentences, np.array(weights, dtype=float)
+
+
+# Function to build the L2-normalized TF-IDF matrix (sentences x terms) and the vocabulary
+def tfidf_matrix(sentences):
+    vocabulary = {}
+    rows, columns = [], []
+    for row, sentence in enumerate(sentences):
+        for word in WORD_PATTERN.findall(sentence.lower()):
+            if word not in STOPWORDS:
+                rows.append(row)
+                columns.append(vocabulary.setdefault(word, len(vocabulary)))
+
+    counts = np.zeros((len(sentences), len(vocabulary)))
+    np.add.at(counts, (np.array(rows, dtype=np.intp), np.array(columns, dtype=np.intp)), 1)
+    document_frequency = np.count_nonzero(counts, axis=0)
+    idf = np.log((1 + len(sentences)) / (1 + document_frequency)) + 1
+    matrix = counts * idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0), vocabulary
+
+
+# Function to rank sentences with TextRank: a random walk over the similarity graph
+# that restarts at sentences in proportion to `weights`. Returns scores summing to 1.
+def textrank(similarity, weights=None):
+    count = similarity.shape[0]
+    if count == 0:
+        return np.zeros(0)
+    restart = np.ones(count) if weights is None else np.asarray(weights, dtype=float)
+    restart = restart / restart.sum()
+
+    similarity = similarity.copy()
+    np.fill_diagonal(similarity, 0)
+    row_sums = similarity.sum(axis=1, keepdims=True)
+    # Sentences sharing no words with the others jump back to the restart distribution
+    transition = np.where(row_sums > 0, similarity / np.where(row_sums > 0, row_sums, 1), restart)
+
+    rank = restart
+    for _ in range(MAX_ITERATIONS):
+        updated = (1 - DAMPING) * restart + DAMPING * transition.T @ rank
+        if np.abs(updated - rank).sum() < TOLERANCE:
+            return updated
+        rank = updated
+    return rank
+
+
+def _pick(order, similarity, limit):
+    picked = []
+    for index in order:
+        if len(picked) >= limit:
+            break
+        if all(similarity[index, other] < DUPLICATE_SIMILARITY for other in picked):
+            picked.append(index)
+    return picked
+
+
+def _is_need(sentence):
+    words = sentence.split()
+    return bool(NEED_PATTERN.search(sentence)) or (bool(words) and words[0].lower().strip(",:;") in IMPERATIVE_VERBS)
+
+
+# Function to get the local summary and actionable needs of the comments in one pass.
+# Returns {"summary", "actionable_needs", "keywords"}; the text fields are None when
+# the comments have nothing to extract.
+def local_report(comments, summary_sentences=SUMMARY_SENTENCES, needs_limit=ACTIONABLE_NEEDS_LIMIT):
+    with stage("local_summary"):
+        return _local_report(comments, summary_sentences, needs_limit)
+
+def _local_report(comments, summary_sentences, needs_limit):
+    sentences, weights = split_sentences(comments or [])
+    if not sentences:
+        return {"summary": None, "actionable_needs": None, "keywords": []}
+
+    matrix, vocabulary = tfidf_matrix(sentences)
+    # Non-Latin or stopword-only comments leave no terms to rank by
+    if not vocabulary:
+        return {"summary": None, "actionable_needs": None, "keywords": []}
+    similarity = matrix @ matrix.T
+    rank = textrank(similarity, weights)
+    order = np.argsort(-rank, kind="stable")
+
+    summary = " ".join(sentences[index] for index in _pick(order, similarity, summary_sentences))
+
+    # Terms carrying the most weight across the discussion; needs mentioning them rank higher
+    term_weights = (weights * rank) @ matrix
+    words = np.array(list(vocabulary))
+    keywords = [str(word) for word in words[np.argsort(-term_weights, kind="stable")[:10]]]
+
+    needs = np.array([_is_need(sentence) for sentence in sentences])
+    need_scores = np.where(needs, rank * (1 + (matrix > 0) @ (term_weights / (term_weights.max() or 1))), -1)
+    need_order = [index for index in np.argsort(-need_scores, kind="stable") if needs[index]]
+    actionable_needs = [sentences[index] for index in _pick(need_order, similarity, needs_limit)]
+
+    return {"summary": summary or None,
+            "actionable_needs": "\n".join(actionable_needs) or None,
+            "keywords": keywords[:5]}
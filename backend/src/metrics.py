@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+
+# Set METRICS_DISABLED=1 to turn every timer and counter into a no-op
+METRICS_ENABLED = os.getenv('METRICS_DISABLED', '').lower() not in ('1', 'true', 'yes')
+
+# When set, one JSON line with the stage timings of each API request is appended to this file
+TIMING_LOG_FILE = os.getenv('TIMING_LOG_FILE')
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Stage timings of the request being served, collected when the timing log is on
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metrics:
+    """In-process counters and duration histograms, rendered in the Prometheus text format."""
+
+    def __init__(self, enabled=METRICS_ENABLED, buckets=DURATION_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+
+    # Times the block as `stage`; failures are counted in stage_errors_total and
+    # the duration is added to the request timing log when it is on
+    @contextmanager
+    def stage(self, name, **labels):
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            self.observe("stage_duration_seconds", seconds, stage=name, **labels)
+            if failed:
+                self.inc("stage_errors_total", stage=name, **labels)
+            timings = _request_timings.get()
+            if timings is not None:
+                timings.append(dict(labels, stage=name, seconds=round(seconds, 6), error=failed))
+
+    def render(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, dict(value, buckets=list(value["buckets"]))) for key, value in self._histograms.items())
+
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, key), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_format_labels(key)} {value}")
+        for (name, key), histogram in histograms:
+            header(name, "histogram")
+            for bound, count in zip(self.buckets, histogram["buckets"]):
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{name}_sum{_format_labels(key)} {histogram['sum']}")
+            lines.append(f"{name}_count{_format_labels(key)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+metrics = Metrics()
+metrics.describe("stage_duration_seconds", "Time spent in each pipeline stage.")
+metrics.describe("stage_errors_total", "Pipeline stages that raised.")
+metrics.describe("upstream_responses_total", "Responses from NewsAPI, OpenRouter and Reddit by status code.")
+metrics.describe("upstream_request_duration_seconds", "Time from sending an upstream request to its response.")
+metrics.describe("http_requests_total", "API requests by view and status code.")
+metrics.describe("http_request_duration_seconds", "Time to build the response of each API request.")
+
+
+# Function to time a pipeline stage with the shared registry
+def stage(name, **labels):
+    if not metrics.enabled and _request_timings.get() is None:
+        return nullcontext()
+    return metrics.stage(name, **labels)
+
+# Function to count an upstream response and the time it took
+def record_upstream(upstream, status_code, seconds=None):
+    metrics.inc("upstream_responses_total", upstream=upstream, status=status_code)
+    if seconds is not None:
+        metrics.observe("upstream_request_duration_seconds", seconds, upstream=upstream)
+
+
+# Collects the stage timings of one request for the timing log; returns the list the
+# stages are appended to, or None when the log is off
+@contextmanager
+def collect_request_timings():
+    if not TIMING_LOG_FILE:
+        yield None
+        return
+    timings = []
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+_timing_log_lock = threading.Lock()
+
+def write_timing_log(entry):
+    if not TIMING_LOG_FILE:
+        return
+    try:
+        line = json.dumps(entry, default=str)
+        with _timing_log_lock, open(TIMING_LOG_FILE, 'a') as f:
+            f.write(line + "\n")
+    except OSError as e:
+        print(f"Error writing timing log: {e}")
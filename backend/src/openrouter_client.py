@@ -0,0 +1,185 @@
+import os
+import time
+import random
+import asyncio
+import weakref
+import threading
+import json
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from .scheduler import get_scheduler
+    from .metrics import record_upstream
+except ImportError:
+    from scheduler import get_scheduler
+    from metrics import record_upstream
+
+OPENROUTER_API_URL = os.getenv('OPENROUTER_API_URL', "https://openrouter.ai/api/v1/chat/completions")
+
+# Connection pool and timeout settings, all overridable from the environment
+POOL_SIZE = int(os.getenv('OPENROUTER_POOL_SIZE', 10))
+CONNECT_TIMEOUT = float(os.getenv('OPENROUTER_CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.getenv('OPENROUTER_READ_TIMEOUT', 60))
+MAX_RETRIES = int(os.getenv('OPENROUTER_MAX_RETRIES', 3))
+BACKOFF_BASE = float(os.getenv('OPENROUTER_BACKOFF_BASE', 0.5))
+BACKOFF_CAP = float(os.getenv('OPENROUTER_BACKOFF_CAP', 8))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+# httpx.AsyncClient instances are bound to the event loop they were first used on,
+# so one client is kept per running loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+# Function to get the process-wide keep-alive session, created on first use
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+# Function to drop the shared session, e.g. after changing the pool settings
+def reset_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def _backoff_delay(attempt, response=None):
+    # Honour Retry-After when OpenRouter sends it, otherwise use full-jitter exponential backoff
+    if response is not None:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_CAP)
+            except ValueError:
+                pass
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+
+def _headers(api_key):
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+
+# Function to POST a chat completion payload to OpenRouter over the shared session.
+# Every attempt waits for its turn in the shared scheduler. Retries on 429/5xx and
+# connection errors; the last response is returned as-is so callers keep their own
+# status code handling. With stream=True the body is left unread for the caller to iterate.
+def post_chat_completion(payload, api_key=None, timeout=None, max_retries=None, stream=False):
+    if api_key is None:
+        api_key = os.getenv('OPENROUTER_API_KEY')
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    if max_retries is None:
+        max_retries = MAX_RETRIES
+
+    session = get_session()
+    scheduler = get_scheduler()
+    attempt = 0
+    while True:
+        scheduler.acquire("openrouter")
+        started = time.perf_counter()
+        try:
+            response = session.post(OPENROUTER_API_URL, headers=_headers(api_key), json=payload, timeout=timeout, stream=stream)
+        except (requests.ConnectionError, requests.Timeout):
+            record_upstream("openrouter", "error", time.perf_counter() - started)
+            if attempt >= max_retries:
+                raise
+            time.sleep(_backoff_delay(attempt))
+            attempt += 1
+            continue
+
+        record_upstream("openrouter", response.status_code, time.perf_counter() - started)
+        scheduler.record_response("openrouter", response.status_code, response.headers)
+        if response.status_code in RETRY_STATUS_CODES and attempt < max_retries:
+            response.close()
+            time.sleep(_backoff_delay(attempt, response))
+            attempt += 1
+            continue
+        return response
+
+
+# Function to stream a chat completion, yielding content deltas as OpenRouter sends them
+def stream_chat_completion(payload, api_key=None, timeout=None, max_retries=None):
+    response = post_chat_completion(dict(payload, stream=True), api_key=api_key, timeout=timeout, max_retries=max_retries, stream=True)
+    with response:
+        if response.status_code != 200:
+            raise RuntimeError(f"API call failed with status code {response.status_code}: {response.text}")
+        for line in response.iter_lines(decode_unicode=True):
+            # Skip keep-alive comments such as ": OPENROUTER PROCESSING"
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            try:
+                chunk = json.loads(data)
+                content = chunk['choices'][0].get('delta', {}).get('content')
+            except (ValueError, KeyError, IndexError):
+                continue
+            if content:
+                yield content
+
+
+# Function to get the keep-alive async client for the running event loop
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+# Async counterpart of post_chat_completion with the same retry behaviour
+async def apost_chat_completion(payload, api_key=None, timeout=None, max_retries=None):
+    if api_key is None:
+        api_key = os.getenv('OPENROUTER_API_KEY')
+    if timeout is None:
+        timeout = httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+    if max_retries is None:
+        max_retries = MAX_RETRIES
+
+    client = get_async_client()
+    scheduler = get_scheduler()
+    attempt = 0
+    while True:
+        await scheduler.aacquire("openrouter")
+        started = time.perf_counter()
+        try:
+            response = await client.post(OPENROUTER_API_URL, headers=_headers(api_key), json=payload, timeout=timeout)
+        except httpx.TransportError:
+            record_upstream("openrouter", "error", time.perf_counter() - started)
+            if attempt >= max_retries:
+                raise
+            await asyncio.sleep(_backoff_delay(attempt))
+            attempt += 1
+            continue
+
+        record_upstream("openrouter", response.status_code, time.perf_counter() - started)
+        scheduler.record_response("openrouter", response.status_code, response.headers)
+        if response.status_code in RETRY_STATUS_CODES and attempt < max_retries:
+            await asyncio.sleep(_backoff_delay(attempt, response))
+            attempt += 1
+            continue
+        return response
@@ -0,0 +1,84 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .fetch_news_topic import fetch_top_news_topic_cached
+    from .fetch_reddit_discussion import fetch_comments_for_topic
+    from .analyze_gathered_info import getAnalyzedReport, ANALYSIS_SLO
+    from .compaction import compact_discussions
+    from .metrics import stage
+    from .local_sentiment import score_discussion
+except ImportError:
+    from fetch_news_topic import fetch_top_news_topic_cached
+    from fetch_reddit_discussion import fetch_comments_for_topic
+    from analyze_gathered_info import getAnalyzedReport, ANALYSIS_SLO
+    from compaction import compact_discussions
+    from metrics import stage
+    from local_sentiment import score_discussion
+
+# Number of headlines processed at the same time for a city report
+CITY_REPORT_WORKERS = int(os.getenv('CITY_REPORT_WORKERS', 5))
+
+
+# Function to fetch the reddit discussion for a headline and analyze it, returning
+# the payload served by the fetch-comments endpoint. Analyses the model does not return
+# within analysis_timeout seconds are computed locally and listed under "degraded".
+# Stage durations in seconds are recorded into `timings` when a dict is given.
+def run_topic_pipeline(topic, city, mode="concurrent", timings=None, analysis_timeout=ANALYSIS_SLO):
+    if timings is None:
+        timings = {}
+
+    started = time.perf_counter()
+    sources = []
+    with stage("fetch_comments"):
+        comments = fetch_comments_for_topic(topic, city, incremental=True, sources=sources)
+    timings["fetch_comments"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    local_sentiment = score_discussion(comments)
+    discussions, compaction = compact_discussions(comments)
+    degraded = []
+    summary, sentiment, actionable_needs = getAnalyzedReport(discussions, mode=mode, timeout=analysis_timeout, local_sentiment=local_sentiment,
+                                                             comments=comments, degraded=degraded)
+    timings["analysis"] = time.perf_counter() - started
+
+    return {"comments": comments,
+            "summary": summary,
+            "sentiment": sentiment,
+            "local_sentiment": local_sentiment,
+            "actionable_needs": actionable_needs,
+            "degraded": degraded,
+            "compaction": compaction,
+            "sources": sources}
+
+
+def _run_report_topic(topic, city, mode):
+    timings = {}
+    started = time.perf_counter()
+    try:
+        report = run_topic_pipeline(topic, city, mode, timings=timings)
+        report["error"] = None
+    except Exception as e:
+        print(f"Error building report for topic '{topic}': {e}")
+        report = {"comments": [], "summary": None, "sentiment": None, "local_sentiment": None,
+                  "actionable_needs": None, "degraded": [], "error": str(e)}
+    timings["total"] = time.perf_counter() - started
+    return dict(report, topic=topic, timings=timings)
+
+
+# Function to run the whole pipeline for every headline of a city, with at most
+# max_workers headlines in flight. A failing headline is reported with its error
+# instead of failing the whole report.
+def run_city_report(city, mode="concurrent", max_workers=CITY_REPORT_WORKERS):
+    started = time.perf_counter()
+    top_news = fetch_top_news_topic_cached(city)
+    fetch_news_time = time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(top_news) or 1))) as executor:
+        topics = list(executor.map(lambda topic: _run_report_topic(topic, city, mode), top_news))
+
+    return {"city": city,
+            "top_news": top_news,
+            "topics": topics,
+            "timings": {"fetch_news": fetch_news_time, "total": time.perf_counter() - started}}
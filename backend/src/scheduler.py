@@ -0,0 +1,257 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Requests waiting for the same upstream are served in this order
+INTERACTIVE = 0
+BATCH = 1
+
+# Sustained requests per second and burst size allowed for each upstream
+UPSTREAM_LIMITS = {
+    "openrouter": (float(os.getenv('OPENROUTER_RATE_LIMIT', 5)), float(os.getenv('OPENROUTER_BURST', 10))),
+    "reddit": (float(os.getenv('REDDIT_RATE_LIMIT', 1.5)), float(os.getenv('REDDIT_BURST', 10))),
+    "newsapi": (float(os.getenv('NEWS_API_RATE_LIMIT', 1)), float(os.getenv('NEWS_API_BURST', 5))),
+}
+
+# Longest a request waits for its turn before RateLimitTimeout is raised
+SCHEDULER_MAX_WAIT = float(os.getenv('SCHEDULER_MAX_WAIT', 60))
+
+# Longest an async request sleeps before checking the line again
+ASYNC_POLL_INTERVAL = 0.05
+
+# Pause applied after a 429 that says nothing about when to retry
+DEFAULT_THROTTLE_PAUSE = float(os.getenv('SCHEDULER_THROTTLE_PAUSE', 5))
+
+_default_priority = INTERACTIVE
+_priority = contextvars.ContextVar("scheduler_priority", default=None)
+
+
+class RateLimitTimeout(RuntimeError):
+    pass
+
+
+# Function to set the priority used by every request of this process, e.g. BATCH in scripts
+def set_default_priority(priority):
+    global _default_priority
+    _default_priority = priority
+
+def current_priority():
+    priority = _priority.get()
+    return _default_priority if priority is None else priority
+
+# Runs the block with the given priority; work handed to other threads needs bind_context
+@contextmanager
+def use_priority(priority):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+# Function to wrap fn so it runs with the caller's context variables (priority,
+# request timings) when run on another thread
+def bind_context(fn):
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def _header_float(headers, name):
+    try:
+        value = headers.get(name)
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+# Reset headers are sent as seconds from now, epoch seconds or epoch milliseconds
+def _seconds_until(reset, now):
+    if reset > 1e12:
+        return reset / 1000 - now
+    if reset > 1e9:
+        return reset - now
+    return reset
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Seconds until a request may be sent; 0 when it may be sent now
+    def wait_time(self, now=None):
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    # Applies the quota the upstream reported, which may be lower than the bucket's
+    def limit(self, remaining, reset_in=None):
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, remaining)
+        if remaining < 1 and reset_in:
+            self.pause(reset_in)
+
+
+class RateLimitScheduler:
+    """Hands out upstream requests in priority order within each upstream's token bucket.
+
+    Callers block in acquire() until it is their turn; upstreams without a bucket are
+    not limited.
+    """
+
+    def __init__(self, limits=None, max_wait=SCHEDULER_MAX_WAIT):
+        limits = UPSTREAM_LIMITS if limits is None else limits
+        self.max_wait = max_wait
+        self._buckets = {name: TokenBucket(rate, capacity) for name, (rate, capacity) in limits.items()}
+        self._waiting = {name: [] for name in limits}
+        self._stats = {name: {"granted": 0, "throttled": 0, "timeouts": 0, "wait_seconds": 0.0} for name in limits}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    # Function to take a slot for `entry` if it is first in line and the bucket allows
+    # it. Must hold the condition. Returns 0 once the slot is taken, otherwise the
+    # seconds to wait before checking again (None when waiting for the requests ahead).
+    def _try_take(self, upstream, entry, started, deadline, timeout):
+        now = time.monotonic()
+        wait = self._buckets[upstream].wait_time(now) if self._waiting[upstream][0] == entry else None
+        if wait == 0:
+            self._buckets[upstream].take()
+            stats = self._stats[upstream]
+            stats["granted"] += 1
+            stats["wait_seconds"] += now - started
+            return 0
+        remaining = deadline - now
+        if remaining <= 0:
+            self._stats[upstream]["timeouts"] += 1
+            raise RateLimitTimeout(f"Waited more than {timeout:.0f}s for a {upstream} request slot")
+        return remaining if wait is None else min(wait, remaining)
+
+    def _leave(self, upstream, entry):
+        waiting = self._waiting[upstream]
+        waiting.remove(entry)
+        heapq.heapify(waiting)
+        self._condition.notify_all()
+
+    def acquire(self, upstream, priority=None, timeout=None):
+        if upstream not in self._buckets:
+            return
+        priority = current_priority() if priority is None else priority
+        timeout = self.max_wait if timeout is None else timeout
+        started = time.monotonic()
+        entry = (priority, next(self._sequence))
+
+        with self._condition:
+            heapq.heappush(self._waiting[upstream], entry)
+            try:
+                while True:
+                    wait = self._try_take(upstream, entry, started, started + timeout, timeout)
+                    if wait == 0:
+                        return
+                    self._condition.wait(wait)
+            finally:
+                self._leave(upstream, entry)
+
+    # Async counterpart of acquire. It queues in the same line but waits on the event
+    # loop, checking again at least every ASYNC_POLL_INTERVAL seconds since it cannot
+    # be woken by the condition, so no thread is held while the upstream is throttled.
+    async def aacquire(self, upstream, priority=None, timeout=None):
+        if upstream not in self._buckets:
+            return
+        priority = current_priority() if priority is None else priority
+        timeout = self.max_wait if timeout is None else timeout
+        started = time.monotonic()
+        entry = (priority, next(self._sequence))
+
+        with self._condition:
+            heapq.heappush(self._waiting[upstream], entry)
+        try:
+            while True:
+                with self._condition:
+                    wait = self._try_take(upstream, entry, started, started + timeout, timeout)
+                if wait == 0:
+                    return
+                await asyncio.sleep(min(wait, ASYNC_POLL_INTERVAL))
+        finally:
+            with self._condition:
+                self._leave(upstream, entry)
+
+    # Function to apply the quota an upstream reported: `remaining` requests until
+    # `reset_in` seconds from now. Unknown values are None.
+    def update_quota(self, upstream, remaining=None, reset_in=None):
+        bucket = self._buckets.get(upstream)
+        if bucket is None or remaining is None:
+            return
+        with self._condition:
+            bucket.limit(remaining, reset_in)
+            self._condition.notify_all()
+
+    # Function to read the X-RateLimit-* and Retry-After headers of a response and
+    # to back off the upstream when it answered 429
+    def record_response(self, upstream, status_code, headers):
+        bucket = self._buckets.get(upstream)
+        if bucket is None:
+            return
+        now = time.time()
+        remaining = _header_float(headers, 'X-RateLimit-Remaining')
+        reset = _header_float(headers, 'X-RateLimit-Reset')
+        reset_in = _seconds_until(reset, now) if reset is not None else None
+        self.update_quota(upstream, remaining, reset_in)
+
+        if status_code == 429:
+            pause = _header_float(headers, 'Retry-After') or reset_in or DEFAULT_THROTTLE_PAUSE
+            with self._condition:
+                bucket.pause(pause)
+                self._stats[upstream]["throttled"] += 1
+                self._condition.notify_all()
+
+    def queue_depth(self):
+        with self._condition:
+            return {name: len(waiting) for name, waiting in self._waiting.items()}
+
+    def stats(self):
+        with self._condition:
+            return {name: dict(stats, queued=len(self._waiting[name])) for name, stats in self._stats.items()}
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+# Function to get the scheduler shared by every outbound call of the process
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = RateLimitScheduler()
+    return _scheduler
+
+def reset_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = None
@@ -0,0 +1,133 @@
+import uuid
+import asyncio
+import threading
+from concurrent.futures import Future
+
+try:
+    from .metrics import metrics
+except ImportError:
+    from metrics import metrics
+
+# Roles counted in single_flight_requests_total: the request that did the work, one
+# that shared a call running in this process and one answered by another process
+LEADER = "leader"
+FOLLOWER = "follower"
+SHARED_FOLLOWER = "shared_follower"
+
+metrics.describe("single_flight_requests_total", "Coalesced requests by flight and role; followers are duplicate work avoided.")
+
+
+class SharedFlightError(RuntimeError):
+    """Raised to a caller whose flight failed in another process."""
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers with the same key share its result.
+
+    Within a process the callers wait on the first caller's future. With `shared`, an
+    object with claim(key, owner), finish(key, owner, result, error) and wait(key), the
+    first caller in each process also has to claim the key there, so callers in other
+    worker processes wait for the same call instead of starting their own.
+    Followers receive the leader's result object itself, which must not be mutated.
+    """
+
+    def __init__(self, name, shared=None):
+        self.name = name
+        self.shared = shared
+        self._inflight = {}
+        self._counts = {LEADER: 0, FOLLOWER: 0, SHARED_FOLLOWER: 0}
+        self._lock = threading.Lock()
+
+    def _count(self, role):
+        with self._lock:
+            self._counts[role] += 1
+        metrics.inc("single_flight_requests_total", flight=self.name, role=role)
+
+    # Returns the future of the call running for key and whether the caller has to run it
+    def _claim(self, key):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+        return future, True
+
+    def _complete(self, key, future, result=None, error=None):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def _shared_key(self, key):
+        return f"{self.name}:{key!r}"
+
+    # Function to run fn as the leader of the other processes as well, or to wait for
+    # the process that holds the key. A holder that never finishes loses the key once
+    # its lease expires and the next waiter runs fn itself.
+    def _run_shared(self, key, fn):
+        shared_key = self._shared_key(key)
+        owner = uuid.uuid4().hex
+        while True:
+            if self.shared.claim(shared_key, owner):
+                self._count(LEADER)
+                try:
+                    result = fn()
+                except Exception as e:
+                    self.shared.finish(shared_key, owner, error=str(e) or type(e).__name__)
+                    raise
+                self.shared.finish(shared_key, owner, result=result)
+                return result
+
+            flight = self.shared.wait(shared_key)
+            if flight is not None:
+                self._count(SHARED_FOLLOWER)
+                if flight["error"]:
+                    raise SharedFlightError(flight["error"])
+                return flight["result"]
+
+    def _lead(self, key, fn):
+        if self.shared is not None:
+            return self._run_shared(key, fn)
+        self._count(LEADER)
+        return fn()
+
+    def do(self, key, fn):
+        future, leader = self._claim(key)
+        if not leader:
+            self._count(FOLLOWER)
+            return future.result()
+        try:
+            result = self._lead(key, fn)
+        except BaseException as e:
+            self._complete(key, future, error=e)
+            raise
+        self._complete(key, future, result)
+        return result
+
+    # Async counterpart of do for coroutine functions; flights are shared with threaded
+    # callers, and the shared backend is used from a worker thread
+    async def ado(self, key, afn):
+        future, leader = self._claim(key)
+        if not leader:
+            self._count(FOLLOWER)
+            return await asyncio.wrap_future(future)
+        try:
+            if self.shared is not None:
+                loop = asyncio.get_running_loop()
+                result = await asyncio.to_thread(self._run_shared, key,
+                                                 lambda: asyncio.run_coroutine_threadsafe(afn(), loop).result())
+            else:
+                self._count(LEADER)
+                result = await afn()
+        except BaseException as e:
+            self._complete(key, future, error=e)
+            raise
+        self._complete(key, future, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, inflight=len(self._inflight))
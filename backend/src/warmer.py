@@ -0,0 +1,168 @@
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    from .fetch_news_topic import fetch_top_news_topic_cached, NEWS_CACHE_TTL
+    from .pipeline import run_topic_pipeline
+    from .analyze_gathered_info import ANALYSIS_TIMEOUT
+    from .scheduler import get_scheduler, bind_context
+except ImportError:
+    from fetch_news_topic import fetch_top_news_topic_cached, NEWS_CACHE_TTL
+    from pipeline import run_topic_pipeline
+    from analyze_gathered_info import ANALYSIS_TIMEOUT
+    from scheduler import get_scheduler, bind_context
+
+# Keeps the data of a watchlist of cities warm: headlines, reddit comments and analyses
+# are refreshed ahead of the dashboard requests and written to the database, the
+# headline cache and the ingestion state the views read from.
+
+WATCHLIST_FILE = os.getenv('WARM_CITIES_WATCHLIST', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'watchlist.json'))
+
+# Number of topics warmed at the same time, across all cities of a cycle
+WARM_WORKERS = int(os.getenv('WARM_WORKERS', 3))
+
+# Seconds between two refreshes of a city that sets no interval of its own
+DEFAULT_WARM_INTERVAL = float(os.getenv('WARM_INTERVAL', NEWS_CACHE_TTL))
+
+# Seconds before a city that got nothing, e.g. because NewsAPI failed, is tried again
+WARM_RETRY_DELAY = float(os.getenv('WARM_RETRY_DELAY', 60))
+
+# Longest sleep between two checks for due cities in the loop
+MAX_IDLE_SLEEP = 60
+
+
+# Function to read the watchlist: a list of city names or of {"city", "interval"}
+# objects, or an object mapping city names to intervals. Returns {city: interval}.
+def load_watchlist(path=WATCHLIST_FILE, default_interval=DEFAULT_WARM_INTERVAL):
+    with open(path) as f:
+        entries = json.load(f)
+    if isinstance(entries, dict):
+        entries = [{"city": city, "interval": interval} for city, interval in entries.items()]
+
+    watchlist = {}
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"city": entry}
+        watchlist[entry["city"]] = float(entry.get("interval") or default_interval)
+    return watchlist
+
+
+class UpstreamBudget:
+    """Caps the requests each upstream is granted by the shared scheduler during one cycle.
+
+    The counts are checked before a topic starts, so topics already running may go
+    over by the requests they still make.
+    """
+
+    def __init__(self, limits=None, scheduler=None):
+        self.limits = limits or {}
+        self.scheduler = scheduler or get_scheduler()
+        self._start = {}
+
+    def _granted(self):
+        return {name: stats["granted"] for name, stats in self.scheduler.stats().items()}
+
+    def start_cycle(self):
+        self._start = self._granted()
+
+    def used(self):
+        granted = self._granted()
+        return {name: granted.get(name, 0) - self._start.get(name, 0) for name in self.limits}
+
+    # Function to list the upstreams whose budget for this cycle is used up
+    def exhausted(self):
+        return sorted(name for name, used in self.used().items() if used >= self.limits[name])
+
+
+class CityWarmer:
+    """Refreshes the cities of a watchlist, each when its interval has passed, or after
+    retry_delay seconds when its last refresh failed without warming anything.
+
+    `save_topics(city, titles)` and `save_report(city, topic, report, mode)` write the
+    results, e.g. app.store.save_topics and app.store.save_topic_report.
+    """
+
+    def __init__(self, watchlist, save_topics, save_report, mode="concurrent", max_workers=WARM_WORKERS, budget=None,
+                 retry_delay=WARM_RETRY_DELAY):
+        self.watchlist = watchlist
+        self.save_topics = save_topics
+        self.save_report = save_report
+        self.mode = mode
+        self.max_workers = max(1, max_workers)
+        self.budget = budget or UpstreamBudget()
+        self.retry_delay = retry_delay
+        self._next_due = {city: 0.0 for city in watchlist}
+
+    def due_cities(self, now=None):
+        now = time.time() if now is None else now
+        return [city for city, due in self._next_due.items() if due <= now]
+
+    def seconds_until_due(self, now=None):
+        now = time.time() if now is None else now
+        return max(0.0, min(self._next_due.values(), default=MAX_IDLE_SLEEP) - now)
+
+    def _warm_topic(self, city, topic):
+        exhausted = self.budget.exhausted()
+        if exhausted:
+            return "skipped", f"budget used up for {', '.join(exhausted)}"
+        return "ran", run_topic_pipeline(topic, city, self.mode, analysis_timeout=ANALYSIS_TIMEOUT)
+
+    # Function to refresh the given cities (all due ones by default): their headlines,
+    # then all their topics on the worker pool. Results are saved from the calling
+    # thread as topics finish. Returns one summary per city.
+    def run_cycle(self, cities=None, now=None):
+        cities = self.due_cities(now) if cities is None else cities
+        self.budget.start_cycle()
+
+        summaries = {}
+        work = []
+        for city in cities:
+            summaries[city] = {"city": city, "topics": 0, "warmed": 0, "degraded": 0, "skipped": 0, "failed": 0, "errors": []}
+            try:
+                # Bypass the cache: a stale entry would be served as is and only revalidated later
+                topics = fetch_top_news_topic_cached(city, force_refresh=True)
+                self.save_topics(city, topics)
+            except Exception as e:
+                print(f"Error fetching headlines for {city}: {e}")
+                summaries[city]["failed"] += 1
+                summaries[city]["errors"].append(str(e))
+                continue
+            summaries[city]["topics"] = len(topics)
+            work += [(city, topic) for topic in topics]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="warm") as executor:
+            futures = {executor.submit(bind_context(self._warm_topic), city, topic): (city, topic) for city, topic in work}
+            for future in as_completed(futures):
+                city, topic = futures[future]
+                error = None
+                try:
+                    outcome, result = future.result()
+                    if outcome == "ran":
+                        self.save_report(city, topic, result, self.mode)
+                        outcome = "degraded" if result.get("degraded") else "warmed"
+                    else:
+                        error = result
+                except Exception as e:
+                    print(f"Error warming topic '{topic}' in {city}: {e}")
+                    outcome, error = "failed", str(e)
+                summaries[city][outcome] += 1
+                if error:
+                    summaries[city]["errors"].append(f"{topic}: {error}")
+
+        finished = time.time() if now is None else now
+        for city, summary in summaries.items():
+            interval = self.watchlist.get(city, DEFAULT_WARM_INTERVAL)
+            if summary["failed"] and not (summary["warmed"] or summary["degraded"]):
+                interval = min(interval, self.retry_delay)
+            self._next_due[city] = finished + interval
+        return list(summaries.values())
+
+    # Function to keep warming until stop() returns True, sleeping until the next city is due
+    def run_forever(self, report=print, stop=lambda: False, sleep=time.sleep):
+        while not stop():
+            for summary in self.run_cycle():
+                report(summary)
+            sleep(min(MAX_IDLE_SLEEP, self.seconds_until_due()))
+
@@ -1,9 +1,13 @@
 import unittest
-from unittest.mock import patch
-import os
+from unittest.mock import patch, AsyncMock
+import asyncio
+import time
+import threading
 
 # Adjust the import path based on your file structure
-from backend.src.analyze_gathered_info import getAnalyzedReport
+from backend.src.analyze_gathered_info import getAnalyzedReport, agetAnalyzedReport, parse_fused_analysis, stream_analyzed_report
+from backend.src.analyze_gathered_info import compute_fingerprint
+from backend.src.local_sentiment import score_discussion
 
 class TestGetAnalyzedReport(unittest.TestCase):
 
@@ -54,3 +58,326 @@ class TestGetAnalyzedReport(unittest.TestCase):
             getAnalyzedReport(discussions)
         
         self.assertTrue("Failed to summarize discussion" in str(context.exception))
+
+
+class TestGetAnalyzedReportConcurrent(unittest.TestCase):
+
+    @patch('backend.src.analyze_gathered_info.summarize_discussion')
+    @patch('backend.src.analyze_gathered_info.analyze_sentiment')
+    @patch('backend.src.analyze_gathered_info.identify_actionable_needs')
+    def test_concurrent_analysis(self, mock_identify_actionable_needs, mock_analyze_sentiment, mock_summarize_discussion):
+        mock_summarize_discussion.return_value = "Summary"
+        mock_analyze_sentiment.return_value = "Positive"
+        mock_identify_actionable_needs.return_value = "Needs"
+
+        discussions = ["This is a great initiative!"]
+        result = getAnalyzedReport(discussions, mode="concurrent")
+
+        self.assertEqual(result, ("Summary", "Positive", "Needs"))
+        mock_summarize_discussion.assert_called_once_with(discussions)
+        mock_analyze_sentiment.assert_called_once_with(discussions)
+        mock_identify_actionable_needs.assert_called_once_with(discussions)
+
+    @patch('backend.src.analyze_gathered_info.summarize_discussion', return_value="Summary")
+    @patch('backend.src.analyze_gathered_info.analyze_sentiment', side_effect=Exception("Failed to analyze sentiment"))
+    @patch('backend.src.analyze_gathered_info.identify_actionable_needs', return_value="Needs")
+    def test_partial_results_on_failure(self, mock_identify_actionable_needs, mock_analyze_sentiment, mock_summarize_discussion):
+        summary, sentiment, actionable_needs = getAnalyzedReport(["Comment"], mode="concurrent")
+
+        self.assertEqual(summary, "Summary")
+        self.assertIsNone(sentiment)
+        self.assertEqual(actionable_needs, "Needs")
+
+    @patch('backend.src.analyze_gathered_info.summarize_discussion', return_value="Summary")
+    @patch('backend.src.analyze_gathered_info.analyze_sentiment', return_value="Positive")
+    @patch('backend.src.analyze_gathered_info.identify_actionable_needs')
+    def test_timeout_returns_partial_results(self, mock_identify_actionable_needs, mock_analyze_sentiment, mock_summarize_discussion):
+        release = threading.Event()
+        mock_identify_actionable_needs.side_effect = lambda discussions: release.wait(5)
+
+        try:
+            summary, sentiment, actionable_needs = getAnalyzedReport(["Comment"], mode="concurrent", timeout=0.1)
+        finally:
+            release.set()
+
+        self.assertEqual(summary, "Summary")
+        self.assertEqual(sentiment, "Positive")
+        self.assertIsNone(actionable_needs)
+
+
+class TestFusedAnalysis(unittest.TestCase):
+
+    def test_parse_valid_response(self):
+        content = '```json\n{"summary": "People want safer hospitals.", "sentiment": {"label": "Negative", "reasoning": "Anger at the crime."}, "actionable_needs": ["Improve night shift security", "Faster investigations"]}\n```'
+
+        summary, sentiment, actionable_needs = parse_fused_analysis(content)
+
+        self.assertEqual(summary, "People want safer hospitals.")
+        self.assertEqual(sentiment, "Negative. Anger at the crime.")
+        self.assertEqual(actionable_needs, "Improve night shift security\nFaster investigations")
+
+    def test_parse_invalid_response(self):
+        self.assertIsNone(parse_fused_analysis(None))
+        self.assertIsNone(parse_fused_analysis("The discussion is positive."))
+        self.assertIsNone(parse_fused_analysis('{"summary": "S", "sentiment": {"label": "great", "reasoning": "R"}, "actionable_needs": []}'))
+        self.assertIsNone(parse_fused_analysis('{"summary": "S", "sentiment": "positive", "actionable_needs": []}'))
+
+    @patch('backend.src.analyze_gathered_info.summarize_discussion')
+    @patch('backend.src.analyze_gathered_info.call_openrouter_api')
+    def test_fused_mode_makes_one_request(self, mock_call_openrouter_api, mock_summarize_discussion):
+        mock_call_openrouter_api.return_value = '{"summary": "S", "sentiment": {"label": "neutral", "reasoning": "R"}, "actionable_needs": ["N"]}'
+
+        result = getAnalyzedReport(["Comment"], mode="fused")
+
+        self.assertEqual(result, ("S", "Neutral. R", "N"))
+        mock_call_openrouter_api.assert_called_once()
+        mock_summarize_discussion.assert_not_called()
+
+    @patch('backend.src.analyze_gathered_info.summarize_discussion', return_value="Summary")
+    @patch('backend.src.analyze_gathered_info.analyze_sentiment', return_value="Positive")
+    @patch('backend.src.analyze_gathered_info.identify_actionable_needs', return_value="Needs")
+    @patch('backend.src.analyze_gathered_info.analyze_discussion_fused', return_value="not json")
+    def test_fused_mode_falls_back_to_three_calls(self, mock_fused, mock_identify_actionable_needs, mock_analyze_sentiment, mock_summarize_discussion):
+        result = getAnalyzedReport(["Comment"], mode="fused")
+
+        self.assertEqual(result, ("Summary", "Positive", "Needs"))
+        mock_fused.assert_called_once()
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            getAnalyzedReport(["Comment"], mode="parallel")
+
+
+class TestAsyncAnalyzedReport(unittest.TestCase):
+
+    @patch('backend.src.analyze_gathered_info.asummarize_discussion', new_callable=AsyncMock, return_value="Summary")
+    @patch('backend.src.analyze_gathered_info.aanalyze_sentiment', new_callable=AsyncMock, side_effect=Exception("Failed to analyze sentiment"))
+    @patch('backend.src.analyze_gathered_info.aidentify_actionable_needs', new_callable=AsyncMock, return_value="Needs")
+    def test_partial_results_on_failure(self, mock_identify_actionable_needs, mock_analyze_sentiment, mock_summarize_discussion):
+        result = asyncio.run(agetAnalyzedReport(["Comment"]))
+
+        self.assertEqual(result, ("Summary", None, "Needs"))
+
+    @patch('backend.src.analyze_gathered_info.asummarize_discussion', new_callable=AsyncMock, return_value="Summary")
+    @patch('backend.src.analyze_gathered_info.aanalyze_sentiment', new_callable=AsyncMock, return_value="Positive")
+    @patch('backend.src.analyze_gathered_info.aidentify_actionable_needs')
+    def test_timeout_returns_partial_results(self, mock_identify_actionable_needs, mock_analyze_sentiment, mock_summarize_discussion):
+        async def slow(discussions):
+            await asyncio.sleep(5)
+
+        mock_identify_actionable_needs.side_effect = slow
+
+        result = asyncio.run(agetAnalyzedReport(["Comment"], timeout=0.1))
+
+        self.assertEqual(result, ("Summary", "Positive", None))
+
+    @patch('backend.src.analyze_gathered_info.asummarize_discussion', new_callable=AsyncMock)
+    @patch('backend.src.analyze_gathered_info.acall_openrouter_api', new_callable=AsyncMock)
+    def test_fused_mode(self, mock_acall_openrouter_api, mock_summarize_discussion):
+        mock_acall_openrouter_api.return_value = '{"summary": "S", "sentiment": {"label": "positive", "reasoning": "R"}, "actionable_needs": []}'
+
+        result = asyncio.run(agetAnalyzedReport(["Comment"], mode="fused"))
+
+        self.assertEqual(result, ("S", "Positive. R", ""))
+        mock_summarize_discussion.assert_not_called()
+
+
+class TestStreamAnalyzedReport(unittest.TestCase):
+
+    @patch('backend.src.analyze_gathered_info.call_openrouter_api_stream')
+    def test_tokens_then_final_values(self, mock_stream):
+        def fake_stream(prompt, on_token, **params):
+            if prompt.startswith("Analyze the sentiment"):
+                return None
+            on_token("Part 1")
+            on_token(" Part 2")
+            return "Part 1 Part 2"
+
+        mock_stream.side_effect = fake_stream
+
+        events = list(stream_analyzed_report(["Comment"]))
+
+        finals = {event: data["value"] for event, data in events if event != "token"}
+        self.assertEqual(finals, {"summary": "Part 1 Part 2", "sentiment": None, "actionable_needs": "Part 1 Part 2"})
+        tokens = [data for event, data in events if event == "token"]
+        self.assertEqual(len(tokens), 4)
+        # Every token of a field arrives before that field's final event
+        for field in ("summary", "actionable_needs"):
+            last_token = max(i for i, (event, data) in enumerate(events) if event == "token" and data["field"] == field)
+            self.assertLess(last_token, [event for event, _ in events].index(field))
+
+    @patch('backend.src.analyze_gathered_info.call_openrouter_api_stream')
+    def test_timeout_closes_pending_fields(self, mock_stream):
+        release = threading.Event()
+
+        def fake_stream(prompt, on_token, **params):
+            if prompt.startswith("Summarize"):
+                return "Summary"
+            release.wait(5)
+
+        mock_stream.side_effect = fake_stream
+        try:
+            events = list(stream_analyzed_report(["Comment"], timeout=0.2))
+        finally:
+            release.set()
+
+        self.assertEqual(dict(events), {
+            "summary": {"field": "summary", "value": "Summary"},
+            "sentiment": {"field": "sentiment", "value": None},
+            "actionable_needs": {"field": "actionable_needs", "value": None},
+        })
+
+
+class TestLocalSentimentFallback(unittest.TestCase):
+
+    def setUp(self):
+        self.local = score_discussion([{"CommentBody": "Great work, well done", "Score": 10}] * 5)
+
+    @patch('backend.src.analyze_gathered_info.summarize_discussion', return_value="Summary")
+    @patch('backend.src.analyze_gathered_info.analyze_sentiment', side_effect=Exception("OpenRouter is down"))
+    @patch('backend.src.analyze_gathered_info.identify_actionable_needs', return_value="Needs")
+    def test_failed_sentiment_uses_local_estimate(self, mock_identify_actionable_needs, mock_analyze_sentiment, mock_summarize_discussion):
+        summary, sentiment, actionable_needs = getAnalyzedReport(["Comment"], mode="concurrent", local_sentiment=self.local)
+
+        self.assertTrue(sentiment.startswith("Positive. Local estimate"))
+        self.assertEqual((summary, actionable_needs), ("Summary", "Needs"))
+
+    @patch('backend.src.analyze_gathered_info.asummarize_discussion', new_callable=AsyncMock, return_value="Summary")
+    @patch('backend.src.analyze_gathered_info.aanalyze_sentiment', new_callable=AsyncMock, return_value=None)
+    @patch('backend.src.analyze_gathered_info.aidentify_actionable_needs', new_callable=AsyncMock, return_value="Needs")
+    def test_async_fallback(self, mock_identify_actionable_needs, mock_analyze_sentiment, mock_summarize_discussion):
+        _, sentiment, _ = asyncio.run(agetAnalyzedReport(["Comment"], local_sentiment=self.local))
+
+        self.assertTrue(sentiment.startswith("Positive. Local estimate"))
+
+    @patch('backend.src.analyze_gathered_info.SENTIMENT_LLM_MIN_CONFIDENCE', 0.5)
+    @patch('backend.src.analyze_gathered_info.summarize_discussion', return_value="Summary")
+    @patch('backend.src.analyze_gathered_info.analyze_sentiment', return_value="Neutral. From the model")
+    @patch('backend.src.analyze_gathered_info.identify_actionable_needs', return_value="Needs")
+    def test_confident_estimate_skips_the_call(self, mock_identify_actionable_needs, mock_analyze_sentiment, mock_summarize_discussion):
+        for mode in ("sequential", "concurrent"):
+            _, sentiment, _ = getAnalyzedReport(["Comment"], mode=mode, local_sentiment=self.local)
+            self.assertTrue(sentiment.startswith("Positive. Local estimate"))
+        mock_analyze_sentiment.assert_not_called()
+
+        unsure = dict(self.local, confidence=0.2)
+        _, sentiment, _ = getAnalyzedReport(["Comment"], mode="concurrent", local_sentiment=unsure)
+        self.assertEqual(sentiment, "Neutral. From the model")
+
+    @patch('backend.src.analyze_gathered_info.call_openrouter_api_stream')
+    def test_stream_sends_local_estimate_first(self, mock_stream):
+        mock_stream.side_effect = lambda prompt, on_token, **params: None if prompt.startswith("Analyze the sentiment") else "Done"
+
+        events = list(stream_analyzed_report(["Comment"], local_sentiment=self.local))
+
+        self.assertEqual(events[0][0], "local_sentiment")
+        self.assertEqual(events[0][1]["label"], "positive")
+        self.assertEqual(dict(events)["sentiment"]["value"], events[0][1]["value"])
+
+
+class TestDegradedAnalysis(unittest.TestCase):
+
+    comments = [{"CommentBody": "The council should repair the bridge before the rains come.", "Score": 5},
+                {"CommentBody": "The bridge has been unsafe for two years now.", "Score": 2}]
+
+    @patch('backend.src.analyze_gathered_info.summarize_discussion')
+    @patch('backend.src.analyze_gathered_info.analyze_sentiment', return_value="Negative")
+    @patch('backend.src.analyze_gathered_info.identify_actionable_needs', return_value=None)
+    def test_slow_calls_answered_locally(self, mock_identify_actionable_needs, mock_analyze_sentiment, mock_summarize_discussion):
+        release = threading.Event()
+        mock_summarize_discussion.side_effect = lambda discussions: release.wait(5)
+        degraded = []
+
+        try:
+            summary, sentiment, actionable_needs = getAnalyzedReport(["Comment"], mode="concurrent", timeout=0.1,
+                                                                     comments=self.comments, degraded=degraded)
+        finally:
+            release.set()
+
+        self.assertIn("bridge", summary)
+        self.assertEqual(sentiment, "Negative")
+        self.assertEqual(actionable_needs, "The council should repair the bridge before the rains come.")
+        self.assertEqual(degraded, ["summary", "actionable_needs"])
+
+    @patch('backend.src.analyze_gathered_info.summarize_discussion', return_value="Summary")
+    @patch('backend.src.analyze_gathered_info.analyze_sentiment')
+    @patch('backend.src.analyze_gathered_info.identify_actionable_needs', return_value="Needs")
+    def test_sequential_mode_keeps_the_deadline(self, mock_identify_actionable_needs, mock_analyze_sentiment, mock_summarize_discussion):
+        release = threading.Event()
+        mock_analyze_sentiment.side_effect = lambda discussions: release.wait(5)
+        degraded = []
+
+        started = time.monotonic()
+        try:
+            report = getAnalyzedReport(["Comment"], mode="sequential", timeout=0.2,
+                                       local_sentiment=score_discussion(self.comments), comments=self.comments, degraded=degraded)
+        finally:
+            release.set()
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(report[0], "Summary")
+        self.assertEqual(degraded, ["sentiment", "actionable_needs"])
+        mock_identify_actionable_needs.assert_not_called()
+
+    @patch('backend.src.analyze_gathered_info.summarize_discussion', return_value="Summary")
+    @patch('backend.src.analyze_gathered_info.analyze_sentiment', return_value="Negative")
+    @patch('backend.src.analyze_gathered_info.identify_actionable_needs', return_value="Needs")
+    @patch('backend.src.analyze_gathered_info.analyze_discussion_fused')
+    def test_fused_fallback_gets_only_the_rest_of_the_deadline(self, mock_fused, mock_identify_actionable_needs,
+                                                               mock_analyze_sentiment, mock_summarize_discussion):
+        release = threading.Event()
+        mock_fused.side_effect = lambda discussions: release.wait(5) and None
+        degraded = []
+
+        started = time.monotonic()
+        try:
+            report = getAnalyzedReport(["Comment"], mode="fused", timeout=0.2, comments=self.comments, degraded=degraded)
+        finally:
+            release.set()
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertIn("bridge", report[0])
+        self.assertEqual(degraded, ["summary", "actionable_needs"])
+        mock_summarize_discussion.assert_not_called()
+
+        # An invalid fused answer still falls back to the separate calls within the deadline
+        mock_fused.side_effect = None
+        mock_fused.return_value = "not json"
+        self.assertEqual(getAnalyzedReport(["Comment"], mode="fused", timeout=5), ("Summary", "Negative", "Needs"))
+
+    @patch('backend.src.analyze_gathered_info.summarize_discussion', return_value="Summary")
+    @patch('backend.src.analyze_gathered_info.analyze_sentiment', return_value="Negative")
+    @patch('backend.src.analyze_gathered_info.identify_actionable_needs', return_value="Needs")
+    def test_complete_report_not_degraded(self, mock_identify_actionable_needs, mock_analyze_sentiment, mock_summarize_discussion):
+        degraded = []
+
+        report = getAnalyzedReport(["Comment"], mode="concurrent", comments=self.comments, degraded=degraded)
+
+        self.assertEqual(report, ("Summary", "Negative", "Needs"))
+        self.assertEqual(degraded, [])
+
+    @patch('backend.src.analyze_gathered_info.call_openrouter_api_stream')
+    def test_stream_marks_local_fields(self, mock_stream):
+        mock_stream.side_effect = lambda prompt, on_token, **params: "Model answer" if prompt.startswith("Analyze the sentiment") else None
+
+        finals = {event: data for event, data in stream_analyzed_report(["Comment"], comments=self.comments) if event != "token"}
+
+        self.assertTrue(finals["summary"]["degraded"])
+        self.assertIn("bridge", finals["summary"]["value"])
+        self.assertEqual(finals["sentiment"], {"field": "sentiment", "value": "Model answer"})
+
+
+class TestIncrementalAnalysis(unittest.TestCase):
+
+    comments = [
+        {'newsTopic': 'T', 'PostTitle': 'P', 'CommentBody': 'First comment', 'Score': 2},
+        {'newsTopic': 'T', 'PostTitle': 'P', 'CommentBody': 'Second comment', 'Score': 1},
+    ]
+
+    def test_fingerprint_ignores_order_and_tracks_prompt_version(self):
+        fingerprint = compute_fingerprint(self.comments)
+
+        self.assertEqual(fingerprint, compute_fingerprint(list(reversed(self.comments))))
+        self.assertNotEqual(fingerprint, compute_fingerprint(self.comments[:1]))
+        with patch('backend.src.analyze_gathered_info.PROMPT_VERSION', 'next'):
+            self.assertNotEqual(fingerprint, compute_fingerprint(self.comments))
@@ -0,0 +1,50 @@
+import json
+import unittest
+import requests
+from backend.benchmarks.run import percentile, summarize, compare
+from backend.benchmarks.stubs import StubServer, StubConfig
+
+
+class TestBenchmarkReport(unittest.TestCase):
+
+    def test_nearest_rank_percentiles(self):
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 50.0)
+        self.assertEqual(percentile(values, 95), 95.0)
+        self.assertEqual(percentile(values, 99), 99.0)
+        self.assertIsNone(percentile([], 50))
+
+    def test_summary_counts_errors_in_throughput(self):
+        summary = summarize([0.1, 0.2, 0.3], errors=1, elapsed=2.0)
+        self.assertEqual(summary["iterations"], 4)
+        self.assertEqual(summary["throughput"], 2.0)
+        self.assertEqual(summary["p50"], 0.2)
+
+    def test_compare_flags_regressions_beyond_tolerance(self):
+        baseline = {"results": {"stage": {"p95": 1.0, "throughput": 10.0}}}
+        self.assertEqual(compare({"stage": {"p95": 1.2, "throughput": 9.0}}, baseline, tolerance=0.25), [])
+
+        regressions = compare({"stage": {"p95": 1.5, "throughput": 5.0}, "new": {"p95": 9.0, "throughput": 1.0}}, baseline, tolerance=0.25)
+        self.assertEqual([(r["benchmark"], r["metric"]) for r in regressions], [("stage", "p95"), ("stage", "throughput")])
+
+
+class TestStubServer(unittest.TestCase):
+
+    def test_news_and_chat_completion_endpoints(self):
+        with StubServer(StubConfig(latency=0)) as server:
+            news = requests.get(server.environ()["NEWS_API_URL"], params={"q": "Kathmandu"}).json()
+            completion = requests.post(server.environ()["OPENROUTER_API_URL"],
+                                       json={"messages": [{"role": "user", "content": 'Return { "query": "..." }'}]}).json()
+
+        self.assertEqual(news["status"], "ok")
+        self.assertEqual(len(news["articles"]), 16)
+        self.assertIn("query", json.loads(completion["choices"][0]["message"]["content"]))
+
+    def test_error_rate(self):
+        with StubServer(StubConfig(latency=0, error_rate=1.0)) as server:
+            response = requests.get(server.environ()["NEWS_API_URL"])
+        self.assertEqual(response.status_code, 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+from backend.src.compaction import compact_discussions, strip_boilerplate, estimate_tokens
+
+
+def make_comment(body, score, post_title="Plane crash in Kathmandu", news_topic="Plane"):
+    return {
+        'newsTopic': news_topic,
+        'Subreddit': 'r/Nepal',
+        'PostTitle': post_title,
+        'CommentBody': body,
+        'Author': 'Author',
+        'Score': score,
+        'PostAge': 1,
+        'CommentAge': 1,
+    }
+
+
+class TestStripBoilerplate(unittest.TestCase):
+
+    def test_links_quotes_and_bot_footers_removed(self):
+        body = "> quoted text\nSee [the report](https://example.com/report) at https://example.com\n\n*I am a bot, and this action was performed automatically.*"
+
+        self.assertEqual(strip_boilerplate(body), "See the report at")
+
+
+class TestCompactDiscussions(unittest.TestCase):
+
+    def test_headers_appear_once_per_post(self):
+        comments = [
+            make_comment("The runway is too short for these planes", 10),
+            make_comment("Pilots need better training on this route", 5),
+            make_comment("Weather reports should be shared faster", 3, post_title="Another post"),
+        ]
+
+        discussions, stats = compact_discussions(comments)
+
+        text = " ".join(discussions)
+        self.assertEqual(text.count("Main News Topic: Plane"), 1)
+        self.assertEqual(text.count("Reddit-Post on this news: Plane crash in Kathmandu"), 1)
+        self.assertEqual(len(discussions), 2)
+        self.assertEqual(stats["comments_kept"], 3)
+        self.assertGreater(stats["tokens_saved"], 0)
+
+    def test_duplicates_and_removed_comments_dropped(self):
+        comments = [
+            make_comment("The airport needs a longer runway for safety", 10),
+            make_comment("The airport needs a longer runway for safety!", 8),
+            make_comment("the airport needs a longer runway for safety reasons", 7),
+            make_comment("[deleted]", 6),
+            make_comment("Condolences to the families", 1),
+        ]
+
+        discussions, stats = compact_discussions(comments)
+
+        self.assertEqual(stats["comments_kept"], 2)
+        self.assertEqual(stats["comments_dropped"], 3)
+        self.assertIn("The airport needs a longer runway for safety ||", discussions[0])
+        self.assertNotIn("[deleted]", discussions[0])
+
+    def test_highest_scores_kept_within_budget(self):
+        comments = [make_comment(f"comment number {i} " + "word " * 40, i) for i in range(10)]
+
+        discussions, stats = compact_discussions(comments, token_budget=150)
+
+        self.assertLessEqual(stats["compacted_tokens"], 150)
+        self.assertIn("comment number 9", discussions[0])
+        self.assertNotIn("comment number 0", discussions[0])
+        self.assertEqual(stats["comments_kept"] + stats["comments_dropped"], 10)
+
+    def test_empty_input(self):
+        self.assertEqual(compact_discussions([]), ([], {
+            "original_tokens": 0, "compacted_tokens": 0, "tokens_saved": 0, "comments_kept": 0, "comments_dropped": 0,
+        }))
+        self.assertEqual(estimate_tokens(""), 0)
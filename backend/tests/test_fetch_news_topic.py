@@ -1,7 +1,11 @@
 import unittest
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, AsyncMock
+import asyncio
 import os
-from backend.src.fetch_news_topic import fetch_top_news_topic
+import time
+import tempfile
+import threading
+from backend.src.fetch_news_topic import fetch_top_news_topic, NewsCache, distinct_headlines, parse_headlines, NEWS_API_TIMEOUT
 
 class TestFetchTopNewsTopic(unittest.TestCase):
     
@@ -36,6 +40,7 @@ class TestFetchTopNewsTopic(unittest.TestCase):
             
             # Assert the correct output
             self.assertEqual(headlines, ['Headline 1', 'Headline 2', 'Headline 3', 'Headline 4', 'Headline 5'])
+            self.assertEqual(mock_get.call_args.kwargs['timeout'], NEWS_API_TIMEOUT)
 
     @patch('backend.src.fetch_news_topic.requests.get')
     def test_api_failure_response(self, mock_get):
@@ -51,3 +56,117 @@ class TestFetchTopNewsTopic(unittest.TestCase):
                 fetch_top_news_topic('New York')
             self.assertIn("Failed to fetch news topics", str(context.exception))
 
+
+
+class TestDistinctHeadlines(unittest.TestCase):
+
+    def test_syndicated_variants_collapsed_and_backfilled(self):
+        titles = [
+            "Kathmandu metro project approved by cabinet - The Kathmandu Post",
+            "Cabinet approves Kathmandu metro project | Reuters",
+            "Floods kill 20 in Kathmandu valley",
+            "Nepal: Floods in Kathmandu valley kill 20",
+            "[Removed]",
+            "Kathmandu mayor bans plastic bags",
+            "Tourists return to Kathmandu",
+            "Air pollution in Kathmandu worsens",
+            "Schools close in Kathmandu due to smog",
+        ]
+
+        self.assertEqual(distinct_headlines(titles), [
+            "Kathmandu metro project approved by cabinet - The Kathmandu Post",
+            "Floods kill 20 in Kathmandu valley",
+            "Kathmandu mayor bans plastic bags",
+            "Tourists return to Kathmandu",
+            "Air pollution in Kathmandu worsens",
+        ])
+
+    def test_threshold_is_configurable(self):
+        titles = ["Floods kill 20 in Kathmandu valley", "Floods in Kathmandu valley leave 20 dead"]
+
+        self.assertEqual(len(distinct_headlines(titles, threshold=0.5)), 1)
+        self.assertEqual(len(distinct_headlines(titles, threshold=0.9)), 2)
+
+    def test_parse_reads_past_the_first_five_articles(self):
+        articles = [{"title": "Budget approved"}] * 6 + [{"title": "Road reopened"}, {"title": None}]
+
+        self.assertEqual(parse_headlines({"status": "ok", "articles": articles}), ["Budget approved", "Road reopened"])
+
+
+class TestNewsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.fetch = Mock(return_value=['Headline 1'])
+        self.cache = NewsCache(fetch=self.fetch, cache_dir=None, ttl=60, stale_ttl=600)
+
+    def test_fresh_entry_served_from_cache(self):
+        self.assertEqual(self.cache.get('New York'), ['Headline 1'])
+        self.assertEqual(self.cache.get('new york'), ['Headline 1'])
+        self.fetch.assert_called_once_with('New York')
+
+    def test_seconds_fresh_counts_down_to_the_ttl(self):
+        self.assertEqual(self.cache.seconds_fresh('Kathmandu'), 0)
+        with patch('backend.src.fetch_news_topic.time.time', return_value=1000):
+            self.cache.get('Kathmandu')
+        with patch('backend.src.fetch_news_topic.time.time', return_value=1045):
+            self.assertEqual(self.cache.seconds_fresh('kathmandu'), 15)
+        with patch('backend.src.fetch_news_topic.time.time', return_value=1100):
+            self.assertEqual(self.cache.seconds_fresh('Kathmandu'), 0)
+
+    def test_stale_entry_served_while_refreshing(self):
+        with patch('backend.src.fetch_news_topic.time.time', return_value=1000):
+            self.cache.get('Kathmandu')
+
+        self.fetch.return_value = ['Headline 2']
+        with patch('backend.src.fetch_news_topic.time.time', return_value=1100):
+            self.assertEqual(self.cache.get('Kathmandu'), ['Headline 1'])
+        self.cache._executor.shutdown(wait=True)
+
+        self.assertEqual(self.cache._entries['kathmandu']['headlines'], ['Headline 2'])
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_expired_entry_refetched(self):
+        with patch('backend.src.fetch_news_topic.time.time', return_value=1000):
+            self.cache.get('Kathmandu')
+
+        self.fetch.return_value = ['Headline 2']
+        with patch('backend.src.fetch_news_topic.time.time', return_value=2000):
+            self.assertEqual(self.cache.get('Kathmandu'), ['Headline 2'])
+
+    def test_concurrent_refreshes_coalesced(self):
+        release = threading.Event()
+
+        def slow_fetch(city_name):
+            release.wait(5)
+            return ['Headline 1']
+
+        self.fetch.side_effect = slow_fetch
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.cache.get('Kathmandu'))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [['Headline 1']] * 5)
+        self.fetch.assert_called_once()
+
+    def test_entries_shared_through_cache_dir(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            NewsCache(fetch=self.fetch, cache_dir=cache_dir).get('New York')
+            other = NewsCache(fetch=Mock(), cache_dir=cache_dir)
+
+            self.assertEqual(other.get('New York'), ['Headline 1'])
+            self.assertTrue(os.path.exists(os.path.join(cache_dir, 'new_york.json')))
+            other.fetch.assert_not_called()
+
+    def test_async_miss_uses_async_fetch(self):
+        afetch = AsyncMock(return_value=['Headline 2'])
+        cache = NewsCache(fetch=self.fetch, afetch=afetch, cache_dir=None, ttl=60, stale_ttl=600)
+
+        self.assertEqual(asyncio.run(cache.aget('Kathmandu')), ['Headline 2'])
+        self.assertEqual(cache.get('Kathmandu'), ['Headline 2'])
+        afetch.assert_awaited_once_with('Kathmandu')
+        self.fetch.assert_not_called()
@@ -1,20 +1,45 @@
 import unittest
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, MagicMock
 import os
 from backend.src.fetch_reddit_discussion import generate_search_prompt
 from backend.src.fetch_reddit_discussion import fetch_comments_for_topic
+from backend.src.fetch_reddit_discussion import get_reddit_client, reset_reddit_client, time_filter_for_age
+from backend.src.fetch_reddit_discussion import subreddits_for_city, SubredditStats
+from backend.src.llm_cache import LLMCache
+from backend.src.ingestion_state import IngestionState, IngestionStore
+from backend.src.scheduler import RateLimitScheduler
+import tempfile
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Reddit requests are not rate limited in these tests
+_scheduler_patcher = patch('backend.src.fetch_reddit_discussion.get_scheduler', return_value=RateLimitScheduler(limits={}))
+
+def setUpModule():
+    _scheduler_patcher.start()
+
+def tearDownModule():
+    _scheduler_patcher.stop()
 
 
 class TestGenerateSearchPrompt(unittest.TestCase):
 
-    @patch('backend.src.fetch_reddit_discussion.requests.post')
+    def setUp(self):
+        # Use a private in-memory cache so responses do not leak between tests
+        self.cache = LLMCache(path=":memory:")
+        patcher = patch('backend.src.fetch_reddit_discussion.get_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('backend.src.fetch_reddit_discussion.post_chat_completion')
     def test_missing_openrouter_api_key(self, mock_post):
         with patch.dict(os.environ, {}, clear=True):
             with self.assertRaises(EnvironmentError) as context:
                 generate_search_prompt('Test Topic')
             self.assertIn("Missing required environment variable: OPENROUTER_API_KEY", str(context.exception))
 
-    @patch('backend.src.fetch_reddit_discussion.requests.post')
+    @patch('backend.src.fetch_reddit_discussion.post_chat_completion')
     def test_successful_api_call(self, mock_post):
         with patch.dict(os.environ, {'OPENROUTER_API_KEY': 'dummy_key'}):
             # Mock the response from the API
@@ -30,7 +55,7 @@ class TestGenerateSearchPrompt(unittest.TestCase):
             query = generate_search_prompt('Test Topic')
             self.assertEqual(query, "search query for Test Topic")
 
-    @patch('backend.src.fetch_reddit_discussion.requests.post')
+    @patch('backend.src.fetch_reddit_discussion.post_chat_completion')
     def test_invalid_json_response(self, mock_post):
         with patch.dict(os.environ, {'OPENROUTER_API_KEY': 'dummy_key'}):
             # Mock a response with invalid JSON
@@ -47,7 +72,7 @@ class TestGenerateSearchPrompt(unittest.TestCase):
                 generate_search_prompt('Test Topic')
             self.assertIn("Error processing the response: invalid JSON or missing 'query' field", str(context.exception))
 
-    @patch('backend.src.fetch_reddit_discussion.requests.post')
+    @patch('backend.src.fetch_reddit_discussion.post_chat_completion')
     def test_api_call_failure(self, mock_post):
         with patch.dict(os.environ, {'OPENROUTER_API_KEY': 'dummy_key'}):
             # Mock a failed API call
@@ -60,10 +85,38 @@ class TestGenerateSearchPrompt(unittest.TestCase):
                 generate_search_prompt('Test Topic')
             self.assertIn("API call failed with status code 500", str(context.exception))
 
+    @patch('backend.src.fetch_reddit_discussion.post_chat_completion')
+    def test_repeated_topic_served_from_cache(self, mock_post):
+        with patch.dict(os.environ, {'OPENROUTER_API_KEY': 'dummy_key'}):
+            mock_response = Mock()
+            mock_response.status_code = 200
+            mock_response.json.return_value = {
+                'choices': [
+                    {'message': {'content': '{"query": "search query for Test Topic"}'}}
+                ]
+            }
+            mock_post.return_value = mock_response
+
+            self.assertEqual(generate_search_prompt('Test Topic'), "search query for Test Topic")
+            # A hit is not stored again, which would restart its TTL
+            with patch.object(self.cache, 'set') as mock_set:
+                self.assertEqual(generate_search_prompt('Test Topic'), "search query for Test Topic")
+            mock_set.assert_not_called()
+            mock_post.assert_called_once()
+
+            # bypass_cache forces a fresh request
+            generate_search_prompt('Test Topic', bypass_cache=True)
+            self.assertEqual(mock_post.call_count, 2)
+
 
 
 class TestFetchCommentsFromReddit(unittest.TestCase):
 
+    def setUp(self):
+        # Each test configures its own mock client
+        reset_reddit_client()
+        self.addCleanup(reset_reddit_client)
+
     # issue here, as mock is not able to loop saying not subscriptable
 
     # @patch('backend.src.fetch_reddit_discussion.configure_reddit_api')
@@ -199,3 +252,233 @@ class TestFetchCommentsFromReddit(unittest.TestCase):
             self.fail(f"fetch_comments_for_topic raised an exception: {e}")
 
 
+class TestRedditClientReuse(unittest.TestCase):
+
+    def setUp(self):
+        reset_reddit_client()
+        self.addCleanup(reset_reddit_client)
+
+    @patch('backend.src.fetch_reddit_discussion.configure_reddit_api')
+    def test_client_configured_once(self, mock_reddit_api):
+        mock_reddit_api.return_value = Mock()
+
+        first = get_reddit_client()
+        second = get_reddit_client()
+
+        self.assertIs(first, second)
+        mock_reddit_api.assert_called_once()
+
+    @patch('backend.src.fetch_reddit_discussion.configure_reddit_api')
+    def test_client_per_thread(self, mock_reddit_api):
+        mock_reddit_api.side_effect = lambda: Mock()
+        main_client = get_reddit_client()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            thread_clients = [executor.submit(get_reddit_client).result() for _ in range(2)]
+
+        self.assertIsNot(thread_clients[0], main_client)
+        self.assertIs(thread_clients[0], thread_clients[1])
+        self.assertEqual(mock_reddit_api.call_count, 2)
+
+        reset_reddit_client()
+        self.assertIsNot(get_reddit_client(), main_client)
+
+    @patch('backend.src.fetch_reddit_discussion.generate_search_prompt', return_value="query")
+    @patch('backend.src.fetch_reddit_discussion.configure_reddit_api')
+    def test_submissions_hydrated_from_search_listing(self, mock_reddit_api, mock_search_prompt):
+        mock_reddit = Mock()
+        mock_subreddit = Mock()
+        mock_reddit.subreddit.return_value = mock_subreddit
+        mock_reddit_api.return_value = mock_reddit
+
+        mock_comment = Mock(body="Test Comment", score=3, created_utc=datetime.now().timestamp())
+        mock_comment.author.name = "TestAuthor"
+        mock_submission = Mock(title="Test Post Title", subreddit="all", created_utc=(datetime.now() - timedelta(days=1)).timestamp())
+        mock_submission.comments = MagicMock()
+        mock_submission.comments.__iter__.return_value = [mock_comment]
+        mock_subreddit.search.return_value = [mock_submission]
+
+        fetch_comments_for_topic("Test Topic", "Test City")
+        comments = fetch_comments_for_topic("Test Topic", "Test City")
+
+        self.assertEqual(len(comments), 1)
+        self.assertEqual(comments[0]['CommentBody'], "Test Comment")
+        self.assertEqual(comments[0]['Author'], "TestAuthor")
+        mock_reddit.submission.assert_not_called()
+
+
+class TestIncrementalIngestion(unittest.TestCase):
+
+    def setUp(self):
+        reset_reddit_client()
+        self.addCleanup(reset_reddit_client)
+
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        self.store = IngestionStore(state_dir.name)
+        patchers = [
+            patch('backend.src.fetch_reddit_discussion.get_ingestion_store', return_value=self.store),
+            patch('backend.src.fetch_reddit_discussion.generate_search_prompt', return_value="query"),
+            patch('backend.src.fetch_reddit_discussion.configure_reddit_api'),
+        ]
+        mock_reddit_api = [patcher.start() for patcher in patchers][-1]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+        self.mock_subreddit = mock_reddit_api.return_value.subreddit.return_value
+
+    def make_comment(self, comment_id, score):
+        comment = Mock(id=comment_id, body=f"Comment {comment_id}", score=score, created_utc=datetime.now().timestamp())
+        comment.author.name = "TestAuthor"
+        return comment
+
+    def make_submission(self, comments):
+        submission = Mock(id="post1", title="Test Post Title", subreddit="all", num_comments=len(comments),
+                          created_utc=(datetime.now() - timedelta(days=1)).timestamp())
+        submission.comments = MagicMock()
+        submission.comments.__iter__.side_effect = lambda: iter(comments)
+        return submission
+
+    def test_only_new_comments_are_added(self):
+        first = [self.make_comment("c1", 5), self.make_comment("c2", 3)]
+        self.mock_subreddit.search.return_value = [self.make_submission(first)]
+        comments = fetch_comments_for_topic("Test Topic", "Test City", incremental=True)
+        self.assertEqual([c['CommentId'] for c in comments], ["c1", "c2"])
+
+        # Expire the refresh interval; one new comment appears on the same post
+        state = self.store.load("Test Topic", "Test City")
+        state.last_fetched -= 24 * 3600
+        self.store.save(state)
+        self.mock_subreddit.search.return_value = [self.make_submission(first + [self.make_comment("c3", 9)])]
+
+        comments = fetch_comments_for_topic("Test Topic", "Test City", incremental=True)
+        self.assertEqual([c['CommentId'] for c in comments], ["c3", "c1", "c2"])
+
+    def test_unchanged_submission_is_not_refetched(self):
+        submission = self.make_submission([self.make_comment("c1", 5)])
+        self.mock_subreddit.search.return_value = [submission]
+        fetch_comments_for_topic("Test Topic", "Test City", incremental=True)
+        loads = submission.comments.replace_more.call_count
+
+        state = self.store.load("Test Topic", "Test City")
+        state.last_fetched -= 24 * 3600
+        self.store.save(state)
+
+        comments = fetch_comments_for_topic("Test Topic", "Test City", incremental=True)
+        self.assertEqual([c['CommentId'] for c in comments], ["c1"])
+        self.assertEqual(submission.comments.replace_more.call_count, loads)
+
+    def test_stored_comments_age_out(self):
+        day = 24 * 3600
+        state = IngestionState("key")
+        state.mark_submission("old", 1, 0)
+        state.mark_submission("new", 1, 5 * day)
+        state.merge([{'CommentId': "c1", 'Score': 9, 'PostCreated': 0, 'CommentCreated': 0, 'PostAge': 0, 'CommentAge': 0},
+                     {'CommentId': "c2", 'Score': 1, 'PostCreated': 5 * day, 'CommentCreated': 6 * day,
+                      'PostAge': 0, 'CommentAge': 0}], now=6 * day)
+
+        state.prune(3 * day, now=7 * day)
+
+        self.assertEqual(list(state.submissions), ["new"])
+        self.assertFalse(state.is_seen_comment("c1"))
+        comment, = state.top(5, now=9 * day)
+        self.assertEqual((comment['CommentId'], comment['PostAge'], comment['CommentAge']), ("c2", 4, 3))
+
+    def test_recent_fetch_served_without_reddit(self):
+        self.mock_subreddit.search.return_value = [self.make_submission([self.make_comment("c1", 5)])]
+        fetch_comments_for_topic("Test Topic", "Test City", incremental=True)
+        searches = self.mock_subreddit.search.call_count
+        fetch_comments_for_topic("Test Topic", "Test City", incremental=True)
+
+        self.assertEqual(self.mock_subreddit.search.call_count, searches)
+
+    def test_failed_searches_do_not_mark_the_topic_fresh(self):
+        self.mock_subreddit.search.side_effect = Exception("503 Service Unavailable")
+        self.assertEqual(fetch_comments_for_topic("Test Topic", "Test City", incremental=True), [])
+        self.assertIsNone(self.store.load("Test Topic", "Test City").last_fetched)
+
+        # Reddit is tried again on the next request
+        self.mock_subreddit.search.side_effect = None
+        self.mock_subreddit.search.return_value = [self.make_submission([self.make_comment("c1", 5)])]
+        comments = fetch_comments_for_topic("Test Topic", "Test City", incremental=True)
+        self.assertEqual([c['CommentId'] for c in comments], ["c1"])
+
+
+class TestSearchShortcuts(unittest.TestCase):
+
+    def setUp(self):
+        reset_reddit_client()
+        self.addCleanup(reset_reddit_client)
+
+    def test_time_filter_covers_max_age(self):
+        self.assertEqual(time_filter_for_age(1), "day")
+        self.assertEqual(time_filter_for_age(2), "week")
+        self.assertEqual(time_filter_for_age(45), "year")
+        self.assertEqual(time_filter_for_age(400), "all")
+
+    def make_submission(self, post_id, scores):
+        comments = []
+        for score in scores:
+            comment = Mock(id=f"{post_id}-{score}", body=f"Comment {score}", score=score, created_utc=datetime.now().timestamp())
+            comment.author.name = "TestAuthor"
+            comments.append(comment)
+        submission = Mock(id=post_id, title=f"Post {post_id}", subreddit="all", created_utc=(datetime.now() - timedelta(days=1)).timestamp())
+        submission.comments = MagicMock()
+        submission.comments.__iter__.return_value = comments
+        return submission
+
+    @patch('backend.src.fetch_reddit_discussion.generate_search_prompt', return_value="query")
+    @patch('backend.src.fetch_reddit_discussion.configure_reddit_api')
+    def test_search_stops_once_enough_comments(self, mock_reddit_api, mock_search_prompt):
+        mock_subreddit = mock_reddit_api.return_value.subreddit.return_value
+        first = self.make_submission("p1", [9, 8, 7, 6, 5, 4])
+        second = self.make_submission("p2", [10])
+        mock_subreddit.search.return_value = [first, second]
+
+        comments = fetch_comments_for_topic("Test Topic", "Test City", limit=5, max_age_days=45)
+
+        self.assertEqual([c['Score'] for c in comments], [9, 8, 7, 6, 5])
+        self.assertEqual(first.comment_sort, "top")
+        second.comments.replace_more.assert_not_called()
+        for call in mock_subreddit.search.call_args_list:
+            self.assertEqual(call.kwargs['time_filter'], "year")
+        self.assertEqual({call.kwargs['sort'] for call in mock_subreddit.search.call_args_list}, {"relevance", "hot"})
+
+
+class TestSubredditFanOut(unittest.TestCase):
+
+    def setUp(self):
+        reset_reddit_client()
+        self.addCleanup(reset_reddit_client)
+
+    def make_submission(self, post_id, score):
+        comment = Mock(id=f"{post_id}-c", body=f"Comment on {post_id}", score=score, created_utc=datetime.now().timestamp())
+        comment.author.name = "TestAuthor"
+        submission = Mock(id=post_id, title=f"Post {post_id}", subreddit="Kathmandu", created_utc=(datetime.now() - timedelta(days=1)).timestamp())
+        submission.comments = MagicMock()
+        submission.comments.__iter__.return_value = [comment]
+        return submission
+
+    def test_configured_city_subreddits(self):
+        self.assertEqual(subreddits_for_city(" Kathmandu "), ["Kathmandu", "Nepal", "all"])
+        self.assertEqual(subreddits_for_city("Test City"), ["all"])
+
+    @patch('backend.src.fetch_reddit_discussion.subreddit_stats', new_callable=SubredditStats)
+    @patch('backend.src.fetch_reddit_discussion.subreddits_for_city', return_value=["Kathmandu", "all"])
+    @patch('backend.src.fetch_reddit_discussion.generate_search_prompt', return_value="query")
+    @patch('backend.src.fetch_reddit_discussion.configure_reddit_api')
+    def test_results_merged_without_duplicate_posts(self, mock_reddit_api, mock_search_prompt, mock_subreddits, mock_stats):
+        local = Mock()
+        local.search.return_value = [self.make_submission("p1", 4)]
+        everything = Mock()
+        everything.search.return_value = [self.make_submission("p1", 4), self.make_submission("p2", 7)]
+        mock_reddit_api.return_value.subreddit.side_effect = lambda name: {"Kathmandu": local, "all": everything}[name]
+
+        sources = []
+        comments = fetch_comments_for_topic("Test Topic", "Kathmandu", sources=sources)
+
+        self.assertEqual([c['PostId'] for c in comments], ["p2", "p1"])
+        self.assertEqual([(s['subreddit'], s['comments'], s['unique_comments']) for s in sources],
+                         [("Kathmandu", 1, 1), ("all", 2, 1)])
+        report = mock_stats.report()
+        self.assertEqual(report["all"]["searches"], 1)
+        self.assertEqual(report["all"]["unique_comments_per_search"], 1)
@@ -0,0 +1,48 @@
+import unittest
+import threading
+from unittest.mock import Mock
+from backend.src.job_queue import JobQueue, SUCCEEDED, FAILED
+
+
+class TestJobQueue(unittest.TestCase):
+
+    def wait_for(self, queue, job_id):
+        queue._executor.shutdown(wait=True)
+        return queue.get(job_id)
+
+    def test_job_result_stored(self):
+        queue = JobQueue(Mock(return_value={"summary": "S"}), max_workers=1)
+
+        job = queue.submit("Topic", "Kathmandu", "concurrent")
+        finished = self.wait_for(queue, job["id"])
+
+        self.assertEqual(finished["status"], SUCCEEDED)
+        self.assertEqual(finished["result"], {"summary": "S"})
+        queue.handler.assert_called_once_with("Topic", "Kathmandu", "concurrent")
+
+    def test_job_failure_recorded(self):
+        queue = JobQueue(Mock(side_effect=Exception("Reddit API failure")), max_workers=1)
+
+        job = queue.submit("Topic", "Kathmandu", "concurrent")
+        finished = self.wait_for(queue, job["id"])
+
+        self.assertEqual(finished["status"], FAILED)
+        self.assertEqual(finished["error"], "Reddit API failure")
+
+    def test_identical_pending_jobs_deduplicated(self):
+        release = threading.Event()
+        handler = Mock(side_effect=lambda *args: release.wait(5))
+        queue = JobQueue(handler, max_workers=2)
+
+        first = queue.submit("Topic", "Kathmandu", "concurrent")
+        second = queue.submit("Topic", "Kathmandu", "concurrent")
+        other = queue.submit("Other Topic", "Kathmandu", "concurrent")
+        release.set()
+        self.wait_for(queue, first["id"])
+
+        self.assertEqual(first["id"], second["id"])
+        self.assertNotEqual(first["id"], other["id"])
+        self.assertEqual(handler.call_count, 2)
+
+    def test_unknown_job(self):
+        self.assertIsNone(JobQueue(Mock()).get("missing"))
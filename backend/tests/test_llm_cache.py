@@ -0,0 +1,61 @@
+import unittest
+from unittest.mock import patch
+from backend.src.llm_cache import LLMCache, make_cache_key
+
+
+def make_payload(prompt, temperature=0):
+    return {
+        "model": "test-model",
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": temperature,
+    }
+
+
+class TestLLMCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LLMCache(path=":memory:", ttl=60, max_entries=2)
+
+    def test_hit_and_miss_counters(self):
+        self.assertIsNone(self.cache.get(make_payload("a")))
+        self.cache.set(make_payload("a"), "answer a")
+
+        self.assertEqual(self.cache.get(make_payload("a")), "answer a")
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "entries": 1})
+
+    def test_key_depends_on_sampling_params(self):
+        self.assertEqual(make_cache_key(make_payload("a")), make_cache_key(make_payload("a")))
+        self.assertNotEqual(make_cache_key(make_payload("a")), make_cache_key(make_payload("a", temperature=0.5)))
+
+        self.cache.set(make_payload("a"), "answer a")
+        self.assertIsNone(self.cache.get(make_payload("a", temperature=0.5)))
+
+    def test_expired_entries_are_misses(self):
+        with patch('backend.src.llm_cache.time.time', return_value=1000):
+            self.cache.set(make_payload("a"), "answer a")
+        with patch('backend.src.llm_cache.time.time', return_value=1061):
+            self.assertIsNone(self.cache.get(make_payload("a")))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_least_recently_used_entry_evicted(self):
+        with patch('backend.src.llm_cache.time.time', return_value=1000):
+            self.cache.set(make_payload("a"), "answer a")
+        with patch('backend.src.llm_cache.time.time', return_value=1001):
+            self.cache.set(make_payload("b"), "answer b")
+        with patch('backend.src.llm_cache.time.time', return_value=1002):
+            self.cache.get(make_payload("a"))
+        with patch('backend.src.llm_cache.time.time', return_value=1003):
+            self.cache.set(make_payload("c"), "answer c")
+
+        with patch('backend.src.llm_cache.time.time', return_value=1004):
+            self.assertEqual(self.cache.get(make_payload("a")), "answer a")
+            self.assertIsNone(self.cache.get(make_payload("b")))
+            self.assertEqual(self.cache.get(make_payload("c")), "answer c")
+
+    def test_bypass_and_disabled(self):
+        self.cache.set(make_payload("a"), "answer a")
+        self.assertIsNone(self.cache.get(make_payload("a"), bypass=True))
+
+        disabled = LLMCache(path=":memory:", enabled=False)
+        disabled.set(make_payload("a"), "answer a")
+        self.assertIsNone(disabled.get(make_payload("a")))
@@ -0,0 +1,75 @@
+import unittest
+
+from backend.src.local_sentiment import score_texts, comment_weights, score_discussion, format_sentiment
+
+
+def comment(body, score=1):
+    return {"CommentBody": body, "Score": score}
+
+
+class TestScoreTexts(unittest.TestCase):
+
+    def test_polarity(self):
+        scores = score_texts(["The new road is great, really well done", "Terrible traffic and corrupt officials",
+                              "The meeting is on Tuesday", ""])
+
+        self.assertGreater(scores[0], 0.05)
+        self.assertLess(scores[1], -0.05)
+        self.assertEqual(scores[2], 0)
+        self.assertEqual(scores[3], 0)
+        self.assertTrue(all(-1 <= score <= 1 for score in scores))
+
+    def test_negation_and_intensifiers(self):
+        plain, negated, contraction, intensified = score_texts(["it is good", "it is not good", "it isn't good at all", "it is very good"])
+
+        self.assertLess(negated, 0)
+        self.assertLess(contraction, 0)
+        self.assertGreater(intensified, plain)
+
+    def test_weights_favour_upvoted_comments(self):
+        weights = comment_weights([-10, 0, 1, 100])
+
+        self.assertLess(weights[0], weights[1])
+        self.assertEqual(weights[1], 1)
+        self.assertTrue(weights[1] < weights[2] < weights[3])
+
+
+class TestScoreDiscussion(unittest.TestCase):
+
+    def test_label_follows_upvoted_comments(self):
+        comments = [comment("This is a terrible waste of money", score=500),
+                    comment("Great work, I love it", score=1),
+                    comment("Great job", score=2)]
+
+        result = score_discussion(comments)
+
+        self.assertEqual(result["label"], "negative")
+        self.assertEqual(result["counts"], {"positive": 2, "neutral": 0, "negative": 1})
+        self.assertEqual(result["comments"], 3)
+
+    def test_confidence_grows_with_agreement_and_comments(self):
+        agreeing = score_discussion([comment("Great progress, well done")] * 10)
+        split = score_discussion([comment("Great progress")] * 5 + [comment("Terrible mess")] * 4)
+        single = score_discussion([comment("Great progress, well done")])
+
+        self.assertEqual(agreeing["label"], "positive")
+        self.assertGreater(agreeing["confidence"], split["confidence"])
+        self.assertGreater(agreeing["confidence"], single["confidence"])
+        self.assertLessEqual(agreeing["confidence"], 1)
+
+    def test_empty_and_bad_scores(self):
+        self.assertEqual(score_discussion([])["label"], "neutral")
+        self.assertEqual(score_discussion([])["confidence"], 0)
+
+        result = score_discussion([{"CommentBody": "Nice", "Score": None}, {"CommentBody": None, "Score": "n/a"}])
+        self.assertEqual(result["comments"], 2)
+
+    def test_format_reads_like_the_model_answer(self):
+        text = format_sentiment(score_discussion([comment("Great work")] * 3))
+
+        self.assertTrue(text.startswith("Positive. "))
+        self.assertIn("3 positive", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import numpy as np
+
+from backend.src.local_summary import local_report, split_sentences, tfidf_matrix, textrank
+
+
+COMMENTS = [
+    {"CommentBody": "The road near Kalanki has been broken for months. The government should fix the potholes before the monsoon.", "Score": 50},
+    {"CommentBody": "Potholes everywhere on the ring road, someone will get hurt on these potholes soon.", "Score": 20},
+    {"CommentBody": "lol this city", "Score": 1},
+    {"CommentBody": "Fix the drainage first, the road keeps breaking because water collects there. Please add street lights too.", "Score": 12},
+    {"CommentBody": "I agree, the government should fix the potholes before the monsoon.", "Score": 3},
+]
+
+
+class TestRanking(unittest.TestCase):
+
+    def test_short_sentences_dropped(self):
+        sentences, weights = split_sentences(COMMENTS)
+
+        self.assertNotIn("lol this city", sentences)
+        self.assertEqual(len(sentences), len(weights))
+
+    def test_tfidf_rows_normalized(self):
+        matrix, vocabulary = tfidf_matrix(["potholes on the road", "the road is fine", "the the the"])
+
+        self.assertIn("potholes", vocabulary)
+        self.assertNotIn("the", vocabulary)
+        np.testing.assert_allclose(np.linalg.norm(matrix, axis=1), [1, 1, 0])
+
+    def test_textrank_prefers_central_and_weighted_sentences(self):
+        similarity = np.array([[1, 0.5, 0.5], [0.5, 1, 0], [0.5, 0, 1]])
+
+        rank = textrank(similarity)
+        self.assertAlmostEqual(rank.sum(), 1)
+        self.assertEqual(int(np.argmax(rank)), 0)
+
+        weighted = textrank(similarity, weights=[1, 10, 1])
+        self.assertGreater(weighted[1], rank[1])
+
+
+class TestLocalReport(unittest.TestCase):
+
+    def test_summary_and_needs(self):
+        report = local_report(COMMENTS, summary_sentences=2)
+
+        self.assertIn("potholes", report["summary"].lower())
+        needs = report["actionable_needs"].split("\n")
+        self.assertIn("Please add street lights too.", needs)
+        self.assertTrue(any(need.startswith("The government should fix the potholes") for need in needs))
+        # The repeated request is only listed once
+        self.assertEqual(sum("should fix the potholes" in need for need in needs), 1)
+        self.assertIn("potholes", report["keywords"])
+
+    def test_nothing_to_extract(self):
+        self.assertEqual(local_report([]), {"summary": None, "actionable_needs": None, "keywords": []})
+        self.assertIsNone(local_report([{"CommentBody": "Nice road today, looks good", "Score": 1}])["actionable_needs"])
+
+    def test_no_rankable_terms(self):
+        empty = {"summary": None, "actionable_needs": None, "keywords": []}
+        self.assertEqual(local_report([{"CommentBody": "काठमाडौंमा ट्राफिक जाम धेरै नै छ।", "Score": 3}]), empty)
+        self.assertEqual(local_report([{"CommentBody": "it is what it is", "Score": 1}]), empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
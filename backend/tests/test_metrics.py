@@ -0,0 +1,51 @@
+import unittest
+from unittest.mock import patch
+from backend.src import metrics as metrics_module
+from backend.src.metrics import Metrics, collect_request_timings
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_counters_and_histograms_rendered(self):
+        registry = Metrics(enabled=True, buckets=(0.1, 1))
+        registry.describe("upstream_responses_total", "Responses.")
+        registry.inc("upstream_responses_total", upstream="openrouter", status=200)
+        registry.inc("upstream_responses_total", upstream="openrouter", status=200)
+        registry.observe("stage_duration_seconds", 0.5, stage="analysis")
+
+        text = registry.render()
+
+        self.assertIn("# HELP upstream_responses_total Responses.", text)
+        self.assertIn('upstream_responses_total{status="200",upstream="openrouter"} 2', text)
+        self.assertIn('stage_duration_seconds_bucket{stage="analysis",le="0.1"} 0', text)
+        self.assertIn('stage_duration_seconds_bucket{stage="analysis",le="1"} 1', text)
+        self.assertIn('stage_duration_seconds_bucket{stage="analysis",le="+Inf"} 1', text)
+        self.assertIn('stage_duration_seconds_count{stage="analysis"} 1', text)
+
+    def test_failed_stage_counted_and_reraised(self):
+        registry = Metrics(enabled=True)
+        with self.assertRaises(ValueError):
+            with registry.stage("reddit_search"):
+                raise ValueError("boom")
+        self.assertIn('stage_errors_total{stage="reddit_search"} 1', registry.render())
+
+    def test_disabled_registry_records_nothing(self):
+        registry = Metrics(enabled=False)
+        registry.inc("upstream_responses_total", upstream="reddit", status=200)
+        with registry.stage("analysis"):
+            pass
+        self.assertEqual(registry.render(), "\n")
+
+    def test_request_timings_collected_when_log_enabled(self):
+        with patch.object(metrics_module, 'TIMING_LOG_FILE', '/tmp/unused.log'):
+            with collect_request_timings() as timings:
+                with metrics_module.stage("search_prompt"):
+                    pass
+        self.assertEqual([timing["stage"] for timing in timings], ["search_prompt"])
+
+        with collect_request_timings() as timings:
+            self.assertIsNone(timings)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+from unittest.mock import patch, Mock
+import requests
+from backend.src import openrouter_client
+from backend.src.openrouter_client import post_chat_completion, stream_chat_completion
+
+
+def make_response(status_code, headers=None):
+    response = Mock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    return response
+
+
+class TestPostChatCompletion(unittest.TestCase):
+
+    def setUp(self):
+        self.session = Mock()
+        patcher = patch('backend.src.openrouter_client.get_session', return_value=self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sleep_patcher = patch('backend.src.openrouter_client.time.sleep')
+        self.mock_sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+        self.scheduler = Mock()
+        scheduler_patcher = patch('backend.src.openrouter_client.get_scheduler', return_value=self.scheduler)
+        scheduler_patcher.start()
+        self.addCleanup(scheduler_patcher.stop)
+
+    def test_successful_call_uses_shared_session_with_timeout(self):
+        self.session.post.return_value = make_response(200)
+
+        response = post_chat_completion({"model": "m"}, api_key="dummy_key")
+
+        self.assertEqual(response.status_code, 200)
+        self.session.post.assert_called_once()
+        _, kwargs = self.session.post.call_args
+        self.assertEqual(kwargs['json'], {"model": "m"})
+        self.assertEqual(kwargs['headers']['Authorization'], "Bearer dummy_key")
+        self.assertEqual(kwargs['timeout'], (openrouter_client.CONNECT_TIMEOUT, openrouter_client.READ_TIMEOUT))
+        self.mock_sleep.assert_not_called()
+
+    def test_retries_on_rate_limit_then_succeeds(self):
+        self.session.post.side_effect = [make_response(429, {'Retry-After': '1'}), make_response(503), make_response(200)]
+
+        response = post_chat_completion({"model": "m"}, api_key="dummy_key", max_retries=3)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.session.post.call_count, 3)
+        self.assertEqual(self.mock_sleep.call_args_list[0].args[0], 1.0)
+        # Every attempt waits for a scheduler slot and reports its response
+        self.assertEqual(self.scheduler.acquire.call_count, 3)
+        self.scheduler.record_response.assert_any_call("openrouter", 429, {'Retry-After': '1'})
+
+    def test_returns_last_response_when_retries_exhausted(self):
+        self.session.post.return_value = make_response(500)
+
+        response = post_chat_completion({"model": "m"}, api_key="dummy_key", max_retries=2)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.session.post.call_count, 3)
+
+    def test_does_not_retry_client_errors(self):
+        self.session.post.return_value = make_response(401)
+
+        response = post_chat_completion({"model": "m"}, api_key="dummy_key")
+
+        self.assertEqual(response.status_code, 401)
+        self.session.post.assert_called_once()
+
+    def test_connection_error_raised_after_retries(self):
+        self.session.post.side_effect = requests.ConnectionError("connection refused")
+
+        with self.assertRaises(requests.ConnectionError):
+            post_chat_completion({"model": "m"}, api_key="dummy_key", max_retries=1)
+        self.assertEqual(self.session.post.call_count, 2)
+
+
+class TestGetSession(unittest.TestCase):
+
+    def test_session_is_shared(self):
+        openrouter_client.reset_session()
+        self.addCleanup(openrouter_client.reset_session)
+        self.assertIs(openrouter_client.get_session(), openrouter_client.get_session())
+
+
+class TestStreamChatCompletion(unittest.TestCase):
+
+    @patch('backend.src.openrouter_client.post_chat_completion')
+    def test_yields_content_deltas(self, mock_post):
+        response = make_response(200)
+        response.__enter__ = Mock(return_value=response)
+        response.__exit__ = Mock(return_value=False)
+        response.iter_lines.return_value = [
+            ": OPENROUTER PROCESSING",
+            'data: {"choices": [{"delta": {"content": "Hello"}}]}',
+            "",
+            'data: {"choices": [{"delta": {"content": " world"}}]}',
+            "data: [DONE]",
+        ]
+        mock_post.return_value = response
+
+        tokens = list(stream_chat_completion({"model": "m"}, api_key="dummy_key"))
+
+        self.assertEqual(tokens, ["Hello", " world"])
+        payload = mock_post.call_args.args[0]
+        self.assertTrue(payload["stream"])
+        self.assertTrue(mock_post.call_args.kwargs["stream"])
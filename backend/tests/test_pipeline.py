@@ -0,0 +1,47 @@
+import unittest
+import threading
+from unittest.mock import patch
+from backend.src.pipeline import run_topic_pipeline, run_city_report
+
+
+class TestRunTopicPipeline(unittest.TestCase):
+
+    @patch('backend.src.pipeline.getAnalyzedReport', return_value=("Summary", "Positive", "Needs"))
+    @patch('backend.src.pipeline.fetch_comments_for_topic')
+    def test_payload_and_timings(self, mock_fetch_comments, mock_report):
+        mock_fetch_comments.return_value = [{'newsTopic': 'T', 'PostTitle': 'P', 'CommentBody': 'C', 'Score': 1}]
+        timings = {}
+
+        result = run_topic_pipeline("T", "Kathmandu", mode="fused", timings=timings)
+
+        self.assertEqual(result["summary"], "Summary")
+        self.assertEqual(len(result["comments"]), 1)
+        self.assertEqual(set(timings), {"fetch_comments", "analysis"})
+        self.assertEqual(mock_report.call_args.kwargs["mode"], "fused")
+
+
+class TestRunCityReport(unittest.TestCase):
+
+    @patch('backend.src.pipeline.fetch_top_news_topic_cached', return_value=["Headline 1", "Headline 2", "Headline 3"])
+    @patch('backend.src.pipeline.run_topic_pipeline')
+    def test_topics_run_in_parallel_and_errors_reported(self, mock_run_topic, mock_fetch_news):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def fake_run_topic(topic, city, mode, timings):
+            # Only passes when all three headlines are in flight together
+            barrier.wait()
+            if topic == "Headline 2":
+                raise Exception("Reddit API failure")
+            return {"comments": [], "summary": f"Summary of {topic}", "sentiment": None, "actionable_needs": None}
+
+        mock_run_topic.side_effect = fake_run_topic
+
+        report = run_city_report("Kathmandu", max_workers=3)
+
+        self.assertEqual(report["top_news"], ["Headline 1", "Headline 2", "Headline 3"])
+        self.assertEqual([topic["topic"] for topic in report["topics"]], report["top_news"])
+        self.assertEqual(report["topics"][0]["summary"], "Summary of Headline 1")
+        self.assertIsNone(report["topics"][0]["error"])
+        self.assertEqual(report["topics"][1]["error"], "Reddit API failure")
+        self.assertIn("total", report["topics"][1]["timings"])
+        self.assertIn("fetch_news", report["timings"])
@@ -0,0 +1,107 @@
+import time
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from backend.src.scheduler import RateLimitScheduler, RateLimitTimeout, TokenBucket, INTERACTIVE, BATCH, use_priority, current_priority
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=2, capacity=2)
+        now = bucket.updated
+        for _ in range(2):
+            self.assertEqual(bucket.wait_time(now), 0)
+            bucket.take()
+        self.assertAlmostEqual(bucket.wait_time(now), 0.5)
+        self.assertEqual(bucket.wait_time(now + 0.5), 0)
+
+    def test_reported_quota_caps_tokens(self):
+        bucket = TokenBucket(rate=1, capacity=10)
+        bucket.limit(0, reset_in=30)
+        self.assertGreater(bucket.wait_time(), 29)
+
+
+class TestRateLimitScheduler(unittest.TestCase):
+
+    def test_unknown_upstream_not_limited(self):
+        RateLimitScheduler(limits={}).acquire("anything")
+
+    def test_times_out_when_no_slot(self):
+        scheduler = RateLimitScheduler(limits={"api": (0.01, 1)})
+        scheduler.acquire("api")
+        with self.assertRaises(RateLimitTimeout):
+            scheduler.acquire("api", timeout=0.05)
+        self.assertEqual(scheduler.stats()["api"]["timeouts"], 1)
+
+    def test_interactive_served_before_batch(self):
+        scheduler = RateLimitScheduler(limits={"api": (5, 1)})
+        scheduler.acquire("api")
+        order = []
+
+        def request(name, priority):
+            scheduler.acquire("api", priority=priority)
+            order.append(name)
+
+        batch = threading.Thread(target=request, args=("batch", BATCH))
+        batch.start()
+        while scheduler.queue_depth()["api"] < 1:
+            time.sleep(0.001)
+        interactive = threading.Thread(target=request, args=("interactive", INTERACTIVE))
+        interactive.start()
+        batch.join()
+        interactive.join()
+
+        self.assertEqual(order, ["interactive", "batch"])
+
+    def test_throttled_response_pauses_upstream(self):
+        scheduler = RateLimitScheduler(limits={"api": (100, 100)})
+        scheduler.record_response("api", 429, {'Retry-After': '0.2'})
+
+        started = time.monotonic()
+        scheduler.acquire("api")
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+        self.assertEqual(scheduler.stats()["api"]["throttled"], 1)
+
+    def test_async_waits_hold_no_executor_thread(self):
+        scheduler = RateLimitScheduler(limits={"api": (100, 100)})
+        scheduler.record_response("api", 429, {'Retry-After': '0.3'})
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+            started = time.monotonic()
+            waits = asyncio.gather(*(scheduler.aacquire("api") for _ in range(3)))
+            await asyncio.sleep(0.05)
+            # The only default executor thread stays free while the requests wait
+            probe_started = time.monotonic()
+            await loop.run_in_executor(None, lambda: None)
+            executor_free_after = time.monotonic() - probe_started
+            await waits
+            return executor_free_after, time.monotonic() - started
+
+        executor_free_after, waited = asyncio.run(main())
+
+        self.assertLess(executor_free_after, 0.2)
+        self.assertGreaterEqual(waited, 0.25)
+        self.assertEqual(scheduler.stats()["api"]["granted"], 3)
+        self.assertEqual(scheduler.queue_depth()["api"], 0)
+
+    def test_async_times_out_when_no_slot(self):
+        scheduler = RateLimitScheduler(limits={"api": (0.01, 1)})
+        scheduler.acquire("api")
+        with self.assertRaises(RateLimitTimeout):
+            asyncio.run(scheduler.aacquire("api", timeout=0.05))
+        self.assertEqual(scheduler.queue_depth()["api"], 0)
+
+    def test_priority_context(self):
+        self.assertEqual(current_priority(), INTERACTIVE)
+        with use_priority(BATCH):
+            self.assertEqual(current_priority(), BATCH)
+        self.assertEqual(current_priority(), INTERACTIVE)
+
+
+if __name__ == '__main__':
+    unittest.main()
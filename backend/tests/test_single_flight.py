@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.src.single_flight import SingleFlight, SharedFlightError
+
+
+class OtherProcess:
+    """Shared backend where another process already holds every key."""
+
+    def __init__(self, flight):
+        self.flight = flight
+        self.claims = []
+
+    def claim(self, key, owner):
+        self.claims.append(key)
+        return False
+
+    def finish(self, key, owner, result=None, error=None):
+        raise AssertionError("finish called for a flight that was not claimed")
+
+    def wait(self, key):
+        return self.flight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight("test")
+        release = threading.Event()
+        calls = []
+
+        def work():
+            calls.append(1)
+            release.wait(5)
+            return {"value": 42}
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(flight.do, "key", work) for _ in range(4)]
+            while flight.stats()["follower"] < 3:
+                threading.Event().wait(0.01)
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(flight.stats(), {"leader": 1, "follower": 3, "shared_follower": 0, "inflight": 0})
+
+    def test_errors_reach_followers_and_the_key_is_released(self):
+        flight = SingleFlight("test")
+        started = threading.Event()
+        release = threading.Event()
+
+        def failing():
+            started.set()
+            release.wait(5)
+            raise ValueError("upstream down")
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(flight.do, "key", failing)
+            started.wait(5)
+            follower = executor.submit(flight.do, "key", lambda: "not called")
+            while flight.stats()["follower"] < 1:
+                threading.Event().wait(0.01)
+            release.set()
+            for future in (leader, follower):
+                with self.assertRaises(ValueError):
+                    future.result()
+
+        self.assertEqual(flight.do("key", lambda: "fresh"), "fresh")
+
+    def test_different_keys_and_later_calls_run_separately(self):
+        flight = SingleFlight("test")
+
+        self.assertEqual([flight.do(key, lambda key=key: key) for key in ("a", "b", "a")], ["a", "b", "a"])
+        self.assertEqual(flight.stats()["leader"], 3)
+
+    def test_async_callers_share_one_call(self):
+        flight = SingleFlight("test")
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def main():
+            return await asyncio.gather(*(flight.ado("key", work) for _ in range(3)))
+
+        self.assertEqual(asyncio.run(main()), ["result"] * 3)
+        self.assertEqual(len(calls), 1)
+
+    def test_result_from_another_process(self):
+        shared = OtherProcess({"result": {"top_news": ["A"]}, "error": ""})
+        flight = SingleFlight("test", shared=shared)
+
+        self.assertEqual(flight.do("key", lambda: self.fail("ran locally")), {"top_news": ["A"]})
+        self.assertEqual(flight.stats()["shared_follower"], 1)
+        self.assertEqual(len(shared.claims), 1)
+
+        shared.flight = {"result": None, "error": "upstream down"}
+        with self.assertRaises(SharedFlightError):
+            flight.do("key", lambda: None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from backend.src.warmer import CityWarmer, UpstreamBudget, load_watchlist
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.granted = {"openrouter": 0, "reddit": 0}
+
+    def stats(self):
+        return {name: {"granted": granted} for name, granted in self.granted.items()}
+
+
+class TestLoadWatchlist(unittest.TestCase):
+
+    def _write(self, data):
+        handle, path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(handle, "w") as f:
+            json.dump(data, f)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_accepts_names_objects_and_mappings(self):
+        path = self._write(["Kathmandu", {"city": "Pokhara", "interval": 600}])
+        self.assertEqual(load_watchlist(path, default_interval=1800), {"Kathmandu": 1800.0, "Pokhara": 600.0})
+
+        path = self._write({"Lalitpur": 900})
+        self.assertEqual(load_watchlist(path), {"Lalitpur": 900.0})
+
+
+class TestCityWarmer(unittest.TestCase):
+
+    def _warmer(self, watchlist, budget=None, saved=None):
+        saved = [] if saved is None else saved
+        return CityWarmer(watchlist,
+                          save_topics=lambda city, titles: saved.append(("topics", city, tuple(titles))),
+                          save_report=lambda city, topic, report, mode: saved.append(("report", city, topic)),
+                          max_workers=2,
+                          budget=budget or UpstreamBudget(scheduler=FakeScheduler()))
+
+    @patch('backend.src.warmer.run_topic_pipeline')
+    @patch('backend.src.warmer.fetch_top_news_topic_cached')
+    def test_cycle_warms_every_topic_and_stores_it(self, mock_fetch_news, mock_pipeline):
+        mock_fetch_news.side_effect = lambda city, force_refresh: [f"{city} news 1", f"{city} news 2"]
+        mock_pipeline.side_effect = lambda topic, city, mode, analysis_timeout: {"degraded": ["summary"] if topic.endswith("2") else []}
+        saved = []
+
+        summaries = self._warmer({"Kathmandu": 600, "Pokhara": 600}, saved=saved).run_cycle(now=1000)
+
+        self.assertEqual([(s["city"], s["topics"], s["warmed"], s["degraded"]) for s in summaries],
+                         [("Kathmandu", 2, 1, 1), ("Pokhara", 2, 1, 1)])
+        self.assertIn(("topics", "Kathmandu", ("Kathmandu news 1", "Kathmandu news 2")), saved)
+        mock_fetch_news.assert_any_call("Kathmandu", force_refresh=True)
+        self.assertEqual(sorted(entry[2] for entry in saved if entry[0] == "report"),
+                         ["Kathmandu news 1", "Kathmandu news 2", "Pokhara news 1", "Pokhara news 2"])
+
+    @patch('backend.src.warmer.run_topic_pipeline', return_value={"degraded": []})
+    @patch('backend.src.warmer.fetch_top_news_topic_cached', return_value=["Topic"])
+    def test_cities_are_due_again_after_their_interval(self, mock_fetch_news, mock_pipeline):
+        warmer = self._warmer({"Kathmandu": 600, "Pokhara": 60})
+        self.assertEqual(warmer.due_cities(now=0), ["Kathmandu", "Pokhara"])
+
+        warmer.run_cycle(now=1000)
+
+        self.assertEqual(warmer.due_cities(now=1059), [])
+        self.assertEqual(warmer.due_cities(now=1060), ["Pokhara"])
+        self.assertEqual(warmer.seconds_until_due(now=1030), 30)
+
+    @patch('backend.src.warmer.run_topic_pipeline', return_value={"degraded": []})
+    @patch('backend.src.warmer.fetch_top_news_topic_cached')
+    def test_city_that_got_nothing_is_retried_sooner(self, mock_fetch_news, mock_pipeline):
+        def fetch_news(city, force_refresh):
+            if city == "Kathmandu":
+                raise Exception("NewsAPI down")
+            return ["Topic"]
+        mock_fetch_news.side_effect = fetch_news
+        warmer = self._warmer({"Kathmandu": 1800, "Pokhara": 1800})
+        warmer.retry_delay = 60
+
+        summaries = warmer.run_cycle(now=1000)
+
+        self.assertEqual([(s["city"], s["failed"], s["warmed"]) for s in summaries], [("Kathmandu", 1, 0), ("Pokhara", 0, 1)])
+        self.assertEqual(warmer.due_cities(now=1060), ["Kathmandu"])
+        self.assertEqual(warmer.due_cities(now=2800), ["Kathmandu", "Pokhara"])
+
+    @patch('backend.src.warmer.run_topic_pipeline')
+    @patch('backend.src.warmer.fetch_top_news_topic_cached', return_value=["One", "Two", "Three"])
+    def test_topics_are_skipped_once_the_budget_is_used_up(self, mock_fetch_news, mock_pipeline):
+        scheduler = FakeScheduler()
+        scheduler.granted["openrouter"] = 50
+
+        def pipeline(topic, city, mode, analysis_timeout):
+            scheduler.granted["openrouter"] += 3
+            return {"degraded": []}
+        mock_pipeline.side_effect = pipeline
+
+        warmer = self._warmer({"Kathmandu": 600}, budget=UpstreamBudget({"openrouter": 3}, scheduler=scheduler))
+        warmer.max_workers = 1
+        summary, = warmer.run_cycle(now=0)
+
+        self.assertEqual((summary["warmed"], summary["skipped"]), (1, 2))
+        self.assertEqual(mock_pipeline.call_count, 1)
+
+    @patch('backend.src.warmer.run_topic_pipeline', side_effect=Exception("upstream down"))
+    @patch('backend.src.warmer.fetch_top_news_topic_cached', return_value=["Topic"])
+    def test_failing_topic_is_reported(self, mock_fetch_news, mock_pipeline):
+        summary, = self._warmer({"Kathmandu": 600}).run_cycle(now=0)
+
+        self.assertEqual(summary["failed"], 1)
+        self.assertEqual(summary["errors"], ["Topic: upstream down"])
+
+
+if __name__ == '__main__':
+    unittest.main()